@@ -55,6 +55,7 @@ def main():
     """
     app = QApplication(sys.argv)
     window = MainWindow()
+    app.aboutToQuit.connect(window.data.close)
     window.show()
     app.exec()
 
@@ -0,0 +1,89 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# the running sum is rebuilt from the dates of the window after this many updates to avoid round-off drift
+RESUM_INTERVAL = 500
+
+
+class RunningAmplitudeAverage:
+    """
+    This class averages linear amplitude over a sliding window of dates with a running sum.
+
+    Only the sum of the frames of the dates inside the window and the number of finite values per pixel are kept in
+    memory. When the window moves, the dates entering the window are read and added, and the dates leaving it are
+    read again and subtracted. Stepping the window by one date therefore reads two frames, the entering one and the
+    leaving one, instead of one frame per date in the window. Keeping the frames would save the second read at the
+    memory of one frame per date in the window.
+
+    NaN values are left out of the sum and the count, so a NaN frame does not spoil the average of the other dates,
+    also after it left the window. Pixels without a finite value in the window are NaN.
+    """
+
+    def __init__(self):
+        self.key = None
+        self.ind = set()
+        self.sum = None
+        self.count = None  # number of finite values per pixel
+        self.n_updates = 0
+        self.n_reads = 0
+
+    def reset(self, key=None):
+        """
+        Drop the running sum.
+
+        :param key: Identifier of the image region the sum belongs to.
+        """
+        self.key = key
+        self.ind = set()
+        self.sum = None
+        self.count = None
+        self.n_updates = 0
+
+    def _readFrame(self, read_frame, i: int):
+        """
+        :return: tuple (frame with 0 instead of NaN, numpy.ndarray bool of the finite values)
+        """
+        self.n_reads += 1
+        frame = np.asarray(read_frame(i), dtype=np.float32)
+        finite = np.isfinite(frame)
+        return np.where(finite, frame, 0), finite
+
+    def average(self, ind, read_frame, key=None):
+        """
+        Return the mean linear amplitude of the dates in ind.
+
+        :param ind: Date indices of the averaging window.
+        :param read_frame: Function returning the linear amplitude frame of one date index. It must return the
+                           same frame when called again for a date, which is then subtracted from the sum.
+        :param key: Identifier of the image region, e.g. the full image or a window of the pyramid.
+                    The running sum is reset when it changes.
+
+        :return: numpy.ndarray
+        """
+        ind = set(int(i) for i in np.atleast_1d(ind))
+        if not ind:
+            raise ValueError("no date index to average")
+        leaving, entering = self.ind - ind, ind - self.ind
+        # rebuilding reads len(ind) frames, updating reads one frame per date entering or leaving the window
+        if (key != self.key or self.sum is None or len(leaving) + len(entering) >= len(ind) or
+                (self.n_updates + 1) % RESUM_INTERVAL == 0):
+            self.reset(key)
+            leaving, entering = set(), ind
+        for i in sorted(leaving):
+            frame, finite = self._readFrame(read_frame, i)
+            self.sum -= frame
+            self.count -= finite
+        for i in sorted(entering):
+            frame, finite = self._readFrame(read_frame, i)
+            if self.sum is None:
+                self.sum = frame.astype(np.float64)
+                self.count = finite.astype(np.int32)
+            else:
+                self.sum += frame
+                self.count += finite
+        self.ind = ind
+        self.n_updates += 1
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (self.sum / self.count).astype(np.float32)
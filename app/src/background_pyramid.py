@@ -0,0 +1,216 @@
+import os
+import sys
+import argparse
+import logging
+import warnings
+import h5py as h5
+import numpy as np
+from .sidecar import fileIdentity, identityMatches
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND_PYRAMID_FILE = "background_pyramid.h5"
+PYRAMID_N_LEVELS_DEFAULT = 5  # overview factors 2, 4, 8, 16, 32
+PYRAMID_CHUNK_SIZE = 256
+
+
+def _groupName(product: str):
+    return product.replace(" ", "_")
+
+
+def downsample(image, factor: int):
+    """
+    Reduce the resolution of the last two axes of an image by averaging blocks of factor x factor pixels.
+    Blocks at the image border are averaged over the available pixels. NaN values are ignored.
+
+    :param image: numpy.ndarray with shape (..., lines, pixels)
+    :param factor: Block size.
+
+    :return: numpy.ndarray with shape (..., ceil(lines / factor), ceil(pixels / factor))
+    """
+    n_lines, n_pixels = image.shape[-2:]
+    n_lines_out, n_pixels_out = -(-n_lines // factor), -(-n_pixels // factor)
+    padded = np.full(image.shape[:-2] + (n_lines_out * factor, n_pixels_out * factor), np.nan, dtype=np.float32)
+    padded[..., :n_lines, :n_pixels] = image
+    blocks = padded.reshape(image.shape[:-2] + (n_lines_out, factor, n_pixels_out, factor))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)  # all-NaN blocks
+        return np.nanmean(blocks, axis=(-3, -1)).astype(np.float32)
+
+
+def _createLevels(group, image, factors):
+    """
+    Write the full resolution and overview levels of a 2-D image into a hdf5 group.
+    """
+    chunks = tuple(min(PYRAMID_CHUNK_SIZE, n) for n in image.shape)
+    group.create_dataset("level_1", data=image.astype(np.float32), chunks=chunks)
+    for factor in factors:
+        level = downsample(image, factor)
+        chunks = tuple(min(PYRAMID_CHUNK_SIZE, n) for n in level.shape)
+        group.create_dataset(f"level_{factor}", data=level, chunks=chunks)
+
+
+def createBackgroundPyramid(data, out_file: str, n_levels: int = PYRAMID_N_LEVELS_DEFAULT, progress=None):
+    """
+    Write the overview pyramid of the map backgrounds of a dataset.
+
+    For every available product, the overviews are stored with factors 2, 4, ... 2**n_levels.
+    Mean amplitude and temporal coherence are also stored at full resolution, chunked for window reads.
+    Amplitude is stored per date as linear amplitude, without full resolution which is read from the slcStack.
+    It is written date by date, so only one slc frame is kept in memory.
+    The file is written to a temporary name first and renamed when complete.
+
+    :param data: Data class instance.
+    :param out_file: Path to the pyramid file.
+    :param n_levels: Number of overview levels.
+    :param progress: Optional function called with (number of written dates, number of dates). Writing is cancelled
+                     if it returns False.
+
+    :return: True if the pyramid was written, False if cancelled
+    """
+    factors = [2 ** i for i in range(1, n_levels + 1)]
+    tmp_file = out_file + ".tmp"
+    completed = False
+    try:
+        with h5.File(tmp_file, 'w') as h_file:
+            h_file.attrs["factors"] = factors
+            h_file.attrs["shape"] = data.slc_dimension[1:]
+
+            mean_amplitude = data.readMeanAmplitude()
+            if mean_amplitude is not None:
+                group = h_file.create_group(_groupName("mean amplitude"))
+                _createLevels(group, mean_amplitude, factors)
+                source = data.mean_amplitude_file if data.mean_amplitude_file_exist else data.slc_stack_file
+                group.attrs.update(fileIdentity(source))
+                logger.info("mean amplitude pyramid written")
+
+            temporal_coherence = data.readTemporalCoherence()
+            if temporal_coherence is not None:
+                group = h_file.create_group(_groupName("temporal coherence"))
+                _createLevels(group, temporal_coherence, factors)
+                group.attrs.update(fileIdentity(data.temporal_coherence_file))
+                logger.info("temporal coherence pyramid written")
+
+            if data.slc_stack_file_exist:
+                group = h_file.create_group(_groupName("amplitude"))
+                slc = data.h5_pool.dataset(data.slc_stack_file, 'slc')
+                n_dates = slc.shape[0]
+                levels = {}
+                for factor in factors:
+                    shape = (n_dates, -(-slc.shape[1] // factor), -(-slc.shape[2] // factor))
+                    chunks = (1,) + tuple(min(PYRAMID_CHUNK_SIZE, n) for n in shape[1:])
+                    levels[factor] = group.create_dataset(f"level_{factor}", shape=shape, dtype=np.float32,
+                                                          chunks=chunks)
+                for ind in range(n_dates):
+                    amplitude = np.abs(slc[ind, :, :])
+                    for factor in factors:
+                        levels[factor][ind, :, :] = downsample(amplitude, factor)
+                    logger.info(f"amplitude pyramid: {ind + 1}/{n_dates} dates")
+                    if progress is not None and progress(ind + 1, n_dates) is False:
+                        logger.info("background pyramid cancelled")
+                        return False
+                group.attrs.update(fileIdentity(data.slc_stack_file))
+        os.replace(tmp_file, out_file)
+        completed = True
+    finally:
+        if not completed and os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    logger.info(f"background pyramid written to {out_file}")
+    return True
+
+
+class BackgroundPyramid:
+    """
+    This class reads windows of the map backgrounds from the overview pyramid at a selected resolution.
+    """
+
+    def __init__(self, file_path: str, h5_pool, sources: dict):
+        """
+        Initialize the BackgroundPyramid class.
+
+        :param file_path: Path to the pyramid file.
+        :param h5_pool: H5FilePool used to read the pyramid.
+        :param sources: dict {product: source file}. Products whose source changed after writing the pyramid
+                        are not served.
+        """
+        self.file_path = file_path
+        self.h5_pool = h5_pool
+        self.products = {}
+        h_file = self.h5_pool.get(file_path)
+        for product, source in sources.items():
+            group_name = _groupName(product)
+            if group_name not in h_file:
+                continue
+            if source is None or not identityMatches(h_file[group_name].attrs, source):
+                logger.warning(f"{product} pyramid in {file_path} is outdated and is ignored.")
+                continue
+            self.products[product] = sorted(int(name.split("_")[1]) for name in h_file[group_name].keys())
+
+    def hasProduct(self, product: str):
+        return product in self.products
+
+    def factors(self, product: str):
+        """
+        :return: list of the available resolution factors of a product. Factor 1 is the full resolution.
+        """
+        return self.products.get(product, [])
+
+    def selectFactor(self, product: str, pixels_per_screen_pixel: float, full_resolution=True):
+        """
+        Select the coarsest level that still has at least one image pixel per screen pixel.
+
+        :param product: Background product.
+        :param pixels_per_screen_pixel: Number of full resolution pixels shown per screen pixel.
+        :param full_resolution: If False, factor 1 is only returned if it is stored in the pyramid.
+
+        :return: int factor
+        """
+        factors = self.factors(product)
+        if full_resolution and 1 not in factors:
+            factors = [1] + factors
+        candidates = [factor for factor in factors if factor <= pixels_per_screen_pixel]
+        return max(candidates) if candidates else min(factors)
+
+    def readWindow(self, product: str, factor: int, y0: int, y1: int, x0: int, x1: int, ind=None):
+        """
+        Read a window of one level. The window is given in level coordinates.
+
+        :param product: Background product.
+        :param factor: Resolution factor of the level.
+        :param ind: Date indices for the 'amplitude' product.
+
+        :return: numpy.ndarray with shape (lines, pixels) or (dates, lines, pixels) for 'amplitude'
+        """
+        dataset_name = f"{_groupName(product)}/level_{factor}"
+        if ind is None:
+            return self.h5_pool.read(self.file_path, dataset_name, np.s_[y0:y1, x0:x1])
+        return self.h5_pool.read(self.file_path, dataset_name, np.s_[np.unique(ind), y0:y1, x0:x1])
+
+
+def main(iargs=None):
+    """
+    Create the background pyramid of a sarvey processing directory.
+
+    Example:
+        $ cd path/to/sarplotter/app
+        $ python -m src.background_pyramid path/to/sarvey/processing/directory
+    """
+    # imported here, data imports this module
+    from .data import Data
+
+    parser = argparse.ArgumentParser(description="Write the overview pyramid of the map backgrounds.")
+    parser.add_argument("data_path", help="sarvey processing directory")
+    parser.add_argument("--input_path", default=None, help="inputs directory. Default: data_path/inputs")
+    parser.add_argument("--n_levels", type=int, default=PYRAMID_N_LEVELS_DEFAULT,
+                        help="number of overview levels, with factors 2, 4, ... 2**n_levels")
+    args = parser.parse_args(iargs)
+    data = Data(data_path=args.data_path, input_path=args.input_path)
+    try:
+        return 0 if data.createBackgroundPyramid(n_levels=args.n_levels) else 1
+    finally:
+        data.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
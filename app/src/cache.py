@@ -0,0 +1,233 @@
+import logging
+from collections import OrderedDict
+import numpy as np
+from .h5_pool import poolKey
+
+logger = logging.getLogger(__name__)
+
+# tile size (azimuth, range) used for datasets that are not chunked
+TILE_SHAPE_DEFAULT = (64, 64)
+
+
+def estimateNbytes(value):
+    """
+    Estimate the memory footprint of a value in bytes.
+
+    numpy arrays and objects with a 'nbytes' attribute report their own size. Containers and plain objects are
+    summed up recursively. Other values are counted with a small constant.
+
+    :param value: Any python object.
+
+    :return: int
+    """
+    if value is None:
+        return 0
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sum(estimateNbytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(estimateNbytes(item) for item in value)
+    if hasattr(value, "__dict__"):
+        return sum(estimateNbytes(item) for item in vars(value).values())
+    return 64
+
+
+class LruCache:
+    """
+    This class is a least-recently-used cache with a memory budget in bytes.
+    """
+
+    def __init__(self, max_nbytes: int, sizeof=estimateNbytes):
+        """
+        Initialize the LruCache class.
+
+        :param max_nbytes: Memory budget in bytes. The least recently used entries are evicted above it.
+        :param sizeof: Function returning the size of a value in bytes.
+        """
+        self.max_nbytes = max_nbytes
+        self.sizeof = sizeof
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        """
+        Return the cached value and mark it as most recently used.
+
+        :param key: Cache key.
+        :param default: Returned if the key is not cached.
+        """
+        if key not in self.entries:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key][0]
+
+    def put(self, key, value, nbytes: int = None):
+        """
+        Add a value to the cache. Values larger than the whole budget are not cached.
+
+        :param key: Cache key.
+        :param value: Value to cache.
+        :param nbytes: Size of the value in bytes. If None, it is estimated with self.sizeof.
+        """
+        if nbytes is None:
+            nbytes = self.sizeof(value)
+        self.pop(key)
+        if nbytes > self.max_nbytes:
+            logger.debug(f"value of {nbytes} bytes exceeds the cache budget of {self.max_nbytes} bytes")
+            return
+        self.entries[key] = (value, nbytes)
+        self.nbytes += nbytes
+        self._evict()
+
+    def pop(self, key, default=None):
+        """
+        Remove a value from the cache and return it.
+        """
+        if key not in self.entries:
+            return default
+        value, nbytes = self.entries.pop(key)
+        self.nbytes -= nbytes
+        return value
+
+    def resize(self, max_nbytes: int):
+        """
+        Change the memory budget and evict entries if necessary.
+        """
+        self.max_nbytes = max_nbytes
+        self._evict()
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        """
+        :return: dict with the number of entries, used and maximum bytes, hits, misses and hit rate.
+        """
+        n_requests = self.hits + self.misses
+        return {"entries": len(self.entries),
+                "nbytes": self.nbytes,
+                "max_nbytes": self.max_nbytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / n_requests if n_requests else 0.}
+
+    def _evict(self):
+        while self.nbytes > self.max_nbytes and self.entries:
+            _, (_, nbytes) = self.entries.popitem(last=False)
+            self.nbytes -= nbytes
+
+
+class ChunkCache:
+    """
+    This class keeps decoded tiles of pixel-major HDF5 stacks (azimuth, range, ...) in memory.
+
+    The tiles follow the chunk grid of the dataset in azimuth and range and span the full remaining dimensions,
+    so reading neighbouring pixels inside a tile is served from memory without decompressing the chunks again.
+    """
+
+    def __init__(self, h5_pool, max_nbytes: int):
+        """
+        Initialize the ChunkCache class.
+
+        :param h5_pool: H5FilePool used to read the tiles.
+        :param max_nbytes: Memory budget of the decoded tiles in bytes.
+        """
+        self.h5_pool = h5_pool
+        self.tiles = LruCache(max_nbytes)
+        self.tile_shapes = {}
+
+    def tileShape(self, file_path: str, dataset_name: str):
+        """
+        :return: tuple (azimuth, range) size of the tiles of the dataset.
+        """
+        file_path = poolKey(file_path)
+        if (file_path, dataset_name) not in self.tile_shapes:
+            chunks = self.h5_pool.dataset(file_path, dataset_name).chunks
+            self.tile_shapes[(file_path, dataset_name)] = tuple(chunks[:2]) if chunks is not None else TILE_SHAPE_DEFAULT
+        return self.tile_shapes[(file_path, dataset_name)]
+
+    def readTile(self, file_path: str, dataset_name: str, tile_az: int, tile_ra: int):
+        """
+        Read one tile from the cache or from the file.
+
+        :param tile_az: Tile index in azimuth.
+        :param tile_ra: Tile index in range.
+
+        :return: numpy.ndarray, read-only
+        """
+        file_path = poolKey(file_path)
+        key = (file_path, dataset_name, tile_az, tile_ra)
+        tile = self.tiles.get(key)
+        if tile is None:
+            tile_shape = self.tileShape(file_path, dataset_name)
+            az0, ra0 = tile_az * tile_shape[0], tile_ra * tile_shape[1]
+            tile = self.h5_pool.read(file_path, dataset_name,
+                                     np.s_[az0:az0 + tile_shape[0], ra0:ra0 + tile_shape[1]])
+            # the tile is shared by all later reads
+            tile.flags.writeable = False
+            self.tiles.put(key, tile)
+        return tile
+
+    def readPixel(self, file_path: str, dataset_name: str, az: int, ra: int):
+        """
+        Read the values of one pixel along the remaining dimensions.
+
+        :param az: Azimuth coordinate
+        :param ra: Range coordinate
+
+        :return: numpy.ndarray, a copy that the caller can change
+        """
+        tile_shape = self.tileShape(file_path, dataset_name)
+        tile = self.readTile(file_path, dataset_name, az // tile_shape[0], ra // tile_shape[1])
+        return tile[az % tile_shape[0], ra % tile_shape[1]].copy()
+
+    def readWindow(self, file_path: str, dataset_name: str, az: int, ra: int, az2: int, ra2: int):
+        """
+        Read the window [az:az2, ra:ra2] along the remaining dimensions. The window is clipped to the dataset.
+
+        :return: numpy.ndarray
+        """
+        dataset = self.h5_pool.dataset(file_path, dataset_name)
+        az, az2 = np.clip([az, az2], 0, dataset.shape[0])
+        ra, ra2 = np.clip([ra, ra2], 0, dataset.shape[1])
+        tile_shape = self.tileShape(file_path, dataset_name)
+        window = np.empty((az2 - az, ra2 - ra) + dataset.shape[2:], dtype=dataset.dtype)
+        for tile_az in range(az // tile_shape[0], (az2 - 1) // tile_shape[0] + 1):
+            for tile_ra in range(ra // tile_shape[1], (ra2 - 1) // tile_shape[1] + 1):
+                tile = self.readTile(file_path, dataset_name, tile_az, tile_ra)
+                tile_az0, tile_ra0 = tile_az * tile_shape[0], tile_ra * tile_shape[1]
+                a0, a1 = max(az, tile_az0), min(az2, tile_az0 + tile_shape[0])
+                r0, r1 = max(ra, tile_ra0), min(ra2, tile_ra0 + tile_shape[1])
+                window[a0 - az:a1 - az, r0 - ra:r1 - ra] = tile[a0 - tile_az0:a1 - tile_az0,
+                                                                r0 - tile_ra0:r1 - tile_ra0]
+        return window
+
+    def clear(self, file_path: str = None):
+        """
+        Drop the tiles and tile shapes of one file or of all files.
+        """
+        if file_path is None:
+            self.tiles.clear()
+            self.tile_shapes = {}
+            return
+        file_path = poolKey(file_path)
+        for key in [key for key in self.tiles.entries if key[0] == file_path]:
+            self.tiles.pop(key)
+        # the file may be written again with other chunks
+        for key in [key for key in self.tile_shapes if key[0] == file_path]:
+            self.tile_shapes.pop(key)
+
+    def stats(self):
+        return self.tiles.stats()
@@ -0,0 +1,251 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# coarse grid step as a fraction of the shortest period of the coherence function, see aliasingFreeNumSamples
+COARSE_STEP_FRACTION = 0.25
+# the coarse grid has at least this many samples per parameter
+COARSE_MIN_SAMPLES = 11
+
+
+def aliasingFreeNumSamples(design_column, bound_min: float, bound_max: float,
+                           min_samples: int = COARSE_MIN_SAMPLES):
+    """
+    Number of samples of a coarse grid that cannot step over a coherence peak.
+
+    The coherence along one parameter is a sum of exp(-1j * A[k] * x), so its shortest period is 2 * pi / max|A|.
+    Sampling with a step of COARSE_STEP_FRACTION of this period keeps every peak wider than one coarse cell, so
+    the true optimum is always next to a coarse local maximum.
+
+    :param design_column: numpy.ndarray (ifgs,) column of the design matrix.
+    :param bound_min: Lower bound of the parameter.
+    :param bound_max: Upper bound of the parameter.
+    :param min_samples: Minimum number of samples.
+
+    :return: int number of samples
+    """
+    max_frequency = float(np.max(np.abs(design_column)))
+    if max_frequency == 0:
+        return min_samples
+    step = COARSE_STEP_FRACTION * 2 * np.pi / max_frequency
+    return max(min_samples, int(np.ceil((bound_max - bound_min) / step)) + 1)
+
+
+def _localMaxima(grid, num_peaks: int):
+    """
+    Indices (row, column) of the num_peaks largest local maxima of a grid, largest first.
+    """
+    padded = np.pad(grid, 1, mode='constant', constant_values=-np.inf)
+    is_max = np.ones(grid.shape, dtype=bool)
+    for di in (-1, 0, 1):
+        for dj in (-1, 0, 1):
+            if di == 0 and dj == 0:
+                continue
+            is_max &= grid >= padded[1 + di:1 + di + grid.shape[0], 1 + dj:1 + dj + grid.shape[1]]
+    rows, cols = np.nonzero(is_max)
+    order = np.argsort(grid[rows, cols])[::-1][:num_peaks]
+    return list(zip(rows[order], cols[order]))
+
+
+def designExponentials(design_column, values):
+    """
+    Exponentials exp(-1j * A[k] * x) of a design matrix column and the samples of its parameter.
+
+    :param design_column: numpy.ndarray (..., ifgs) column of the design matrix, e.g. one per pixel.
+    :param values: numpy.ndarray (samples,) of the parameter.
+
+    :return: numpy.ndarray (..., ifgs, samples) complex64
+    """
+    design_column = np.asarray(design_column, dtype=np.float64)[..., np.newaxis]
+    return np.exp(-1j * (design_column * np.asarray(values, dtype=np.float64))).astype(np.complex64)
+
+
+def oneDimSearchBatch(obs, exp_demerr, exp_vel):
+    """
+    One-dimensional search of sarvey for a batch of pixels: the parameter with the higher coherence peak on its
+    own is searched first, the other one after removing the phase of the first. The DEM error column of the design
+    matrix depends on the geometry of the pixel, so each pixel has its own DEM error exponentials.
+
+    Every product is a stacked vector-matrix product, so the result of a pixel does not depend on the batch.
+
+    :param obs: numpy.ndarray (pixels, ifgs) complex64 of exp(1j * phase).
+    :param exp_demerr: numpy.ndarray (pixels, ifgs, demerr samples) complex64 of exp(-1j * A[:, 0] * demerr).
+    :param exp_vel: numpy.ndarray (ifgs, velocity samples) complex64 of exp(-1j * A[:, 1] * velocity).
+
+    :return: tuple of numpy.ndarray (pixels,) (demerr index, velocity index, temporal coherence)
+    """
+    obs = obs[:, np.newaxis, :]
+    gamma_demerr = np.abs(np.matmul(obs, exp_demerr)[:, 0, :])
+    gamma_vel = np.abs(np.matmul(obs, exp_vel)[:, 0, :])
+    idx_demerr = np.argmax(gamma_demerr, axis=1)
+    idx_vel = np.argmax(gamma_vel, axis=1)
+    gamma = np.empty(obs.shape[0], dtype=np.float32)
+    vel_first = gamma_vel.max(axis=1) > gamma_demerr.max(axis=1)
+
+    pixels = np.nonzero(vel_first)[0]
+    if pixels.size:
+        weighted = obs[pixels] * exp_vel.T[idx_vel[pixels], np.newaxis, :]
+        gamma_second = np.abs(np.matmul(weighted, exp_demerr[pixels])[:, 0, :])
+        idx_demerr[pixels] = np.argmax(gamma_second, axis=1)
+        gamma[pixels] = gamma_second.max(axis=1)
+    pixels = np.nonzero(~vel_first)[0]
+    if pixels.size:
+        weighted = obs[pixels] * exp_demerr[pixels, :, idx_demerr[pixels]][:, np.newaxis, :]
+        gamma_second = np.abs(np.matmul(weighted, exp_vel)[:, 0, :])
+        idx_vel[pixels] = np.argmax(gamma_second, axis=1)
+        gamma[pixels] = gamma_second.max(axis=1)
+    return idx_demerr, idx_vel, gamma / obs.shape[2]
+
+
+class TemporalCoherenceEngine:
+    """
+    This class evaluates the temporal coherence of the DEM error and velocity search space.
+
+    The model phase A[k, 0] * demerr + A[k, 1] * velocity is separable, so the coherence of the whole grid
+    gamma[v, d] = |sum_k exp(1j * phase[k]) * exp(-1j * A[k, 1] * v) * exp(-1j * A[k, 0] * d)| / num_ifgs
+    is one complex64 matrix product. The exponential matrices and the buffers are kept while the design matrix and
+    the search ranges do not change.
+    """
+
+    def __init__(self):
+        self.design_matrix = None
+        self.demerr_range = None
+        self.vel_range = None
+        self.exp_demerr = None  # (ifgs, demerr samples)
+        self.exp_vel = None  # (ifgs, velocity samples)
+        self._weighted_vel = None
+        self._gamma_cpx = None
+        # state of the last coarseToFineSearch
+        self.coarse_gamma = None
+        self.patches = []  # (demerr samples, velocity samples, gamma) of every refinement, coarse to fine
+        self.resolution = None  # (demerr step, velocity step)
+        self.num_evaluations = 0
+
+    def configure(self, design_matrix, demerr_range, vel_range):
+        """
+        Set the design matrix and the search ranges. The exponential matrices are only computed if they changed.
+
+        :param design_matrix: numpy.ndarray (ifgs, 2) with the DEM error and velocity columns.
+        :param demerr_range: numpy.ndarray of the DEM error samples.
+        :param vel_range: numpy.ndarray of the velocity samples.
+        """
+        if (self.design_matrix is not None and np.array_equal(design_matrix, self.design_matrix) and
+                np.array_equal(demerr_range, self.demerr_range) and np.array_equal(vel_range, self.vel_range)):
+            return
+        self.design_matrix = np.array(design_matrix, dtype=np.float64)
+        self.demerr_range = np.array(demerr_range, dtype=np.float64)
+        self.vel_range = np.array(vel_range, dtype=np.float64)
+        self.exp_demerr = designExponentials(self.design_matrix[:, 0], self.demerr_range)
+        self.exp_vel = designExponentials(self.design_matrix[:, 1], self.vel_range)
+        self._weighted_vel = np.empty((self.vel_range.size, self.design_matrix.shape[0]), dtype=np.complex64)
+        self._gamma_cpx = np.empty((self.vel_range.size, self.demerr_range.size), dtype=np.complex64)
+
+    def _observation(self, ifg_phase):
+        return np.exp(1j * np.asarray(ifg_phase, dtype=np.float32)).astype(np.complex64)
+
+    def gammaGrid(self, ifg_phase):
+        """
+        Temporal coherence of every grid cell.
+
+        :param ifg_phase: numpy.ndarray (ifgs,) of the interferometric phase.
+
+        :return: numpy.ndarray (velocity samples, demerr samples) float32
+        """
+        obs = self._observation(ifg_phase)
+        np.multiply(self.exp_vel.T, obs[np.newaxis, :], out=self._weighted_vel)
+        np.matmul(self._weighted_vel, self.exp_demerr, out=self._gamma_cpx)
+        return (np.abs(self._gamma_cpx) / obs.size).astype(np.float32)
+
+    def oneDimSearch(self, ifg_phase):
+        """
+        One-dimensional search of sarvey on the configured grid: the parameter with the higher coherence peak on its
+        own is searched first, the other one after removing the phase of the first.
+
+        :param ifg_phase: numpy.ndarray (ifgs,) of the interferometric phase.
+
+        :return: tuple (demerr, velocity, temporal coherence)
+        """
+        obs = self._observation(ifg_phase)
+        idx_demerr, idx_vel, gamma = oneDimSearchBatch(obs[np.newaxis, :], self.exp_demerr[np.newaxis],
+                                                       self.exp_vel)
+        return self.demerr_range[idx_demerr[0]], self.vel_range[idx_vel[0]], float(gamma[0])
+
+    def _gammaAt(self, obs, demerr_values, vel_values):
+        exp_demerr = np.exp(-1j * np.outer(self.design_matrix[:, 0], demerr_values)).astype(np.complex64)
+        exp_vel = np.exp(-1j * np.outer(self.design_matrix[:, 1], vel_values)).astype(np.complex64)
+        return (np.abs((exp_vel.T * obs[np.newaxis, :]) @ exp_demerr) / obs.size).astype(np.float32)
+
+    def coarseToFineSearch(self, ifg_phase, num_peaks: int = 3, num_levels: int = 3, refine_factor: int = 4):
+        """
+        Search the coarse grid set with configure and refine the best local maxima.
+
+        Each refinement evaluates (2 * refine_factor + 1)^2 points around the current optimum of a peak with the
+        step divided by refine_factor. Several peaks are refined, so a secondary coarse peak that turns out higher
+        at fine resolution is not missed. The configured grid should be sampled with aliasingFreeNumSamples.
+
+        :param ifg_phase: numpy.ndarray (ifgs,) of the interferometric phase.
+        :param num_peaks: Number of coarse local maxima that are refined.
+        :param num_levels: Number of refinements.
+        :param refine_factor: Step reduction of each refinement.
+
+        :return: tuple (demerr, velocity, temporal coherence)
+        """
+        obs = self._observation(ifg_phase)
+        self.coarse_gamma = self.gammaGrid(ifg_phase)
+        self.patches = []
+        self.num_evaluations = self.coarse_gamma.size
+        step_demerr = (self.demerr_range[-1] - self.demerr_range[0]) / max(self.demerr_range.size - 1, 1)
+        step_vel = (self.vel_range[-1] - self.vel_range[0]) / max(self.vel_range.size - 1, 1)
+        offsets = np.arange(-refine_factor, refine_factor + 1) / refine_factor
+
+        best = None
+        for idx_vel, idx_demerr in _localMaxima(self.coarse_gamma, num_peaks):
+            demerr, vel = self.demerr_range[idx_demerr], self.vel_range[idx_vel]
+            gamma = float(self.coarse_gamma[idx_vel, idx_demerr])
+            level_step_demerr, level_step_vel = step_demerr, step_vel
+            for _ in range(num_levels):
+                demerr_values = np.unique(np.clip(demerr + offsets * level_step_demerr,
+                                                  self.demerr_range[0], self.demerr_range[-1]))
+                vel_values = np.unique(np.clip(vel + offsets * level_step_vel,
+                                               self.vel_range[0], self.vel_range[-1]))
+                gamma_patch = self._gammaAt(obs, demerr_values, vel_values)
+                self.patches.append((demerr_values, vel_values, gamma_patch))
+                self.num_evaluations += gamma_patch.size
+                i, j = np.unravel_index(np.argmax(gamma_patch), gamma_patch.shape)
+                demerr, vel, gamma = demerr_values[j], vel_values[i], float(gamma_patch[i, j])
+                level_step_demerr /= refine_factor
+                level_step_vel /= refine_factor
+            if best is None or gamma > best[2]:
+                best = (demerr, vel, gamma)
+        self.resolution = (step_demerr / refine_factor ** num_levels, step_vel / refine_factor ** num_levels)
+        return best
+
+    def renderSearchSpace(self, demerr_range, vel_range):
+        """
+        Image of the last coarseToFineSearch on a display grid: the coarse grid with the refined patches drawn on
+        top, each sampled at the nearest neighbour.
+
+        :param demerr_range: numpy.ndarray of the DEM error samples of the image.
+        :param vel_range: numpy.ndarray of the velocity samples of the image.
+
+        :return: numpy.ndarray (velocity samples, demerr samples) float32
+        """
+        def _nearest(samples, values):
+            idx = np.clip(np.searchsorted(samples, values), 1, samples.size - 1)
+            return np.where(values - samples[idx - 1] <= samples[idx] - values, idx - 1, idx)
+
+        image = self.coarse_gamma[np.ix_(_nearest(self.vel_range, vel_range),
+                                         _nearest(self.demerr_range, demerr_range))]
+        # wide patches first, so the finest patches stay on top
+        patches = sorted(self.patches, key=lambda patch: patch[0][0] - patch[0][-1])
+        for demerr_values, vel_values, gamma_patch in patches:
+            if demerr_values.size < 2 or vel_values.size < 2:
+                continue
+            in_demerr = np.nonzero((demerr_range >= demerr_values[0]) & (demerr_range <= demerr_values[-1]))[0]
+            in_vel = np.nonzero((vel_range >= vel_values[0]) & (vel_range <= vel_values[-1]))[0]
+            if in_demerr.size and in_vel.size:
+                image[np.ix_(in_vel, in_demerr)] = gamma_patch[np.ix_(_nearest(vel_values, vel_range[in_vel]),
+                                                                      _nearest(demerr_values,
+                                                                               demerr_range[in_demerr]))]
+        return image
@@ -29,6 +29,7 @@ def _configAppParameters(window):
     _configObject(plot.plot_temporal_unwrapping.tu.parms, config["setting_widget"]["temporal_unwrap"])
     _configObject(plot.plot_network.parms, config["setting_widget"]["network"])
     _configObject(plot.parms, config["setting_widget"]["map"])
+    _configData(window.data, config["data"])
 
 
 def _configAppWidgets(window):
@@ -49,6 +50,23 @@ def _configAppWidgets(window):
     configPointsTab(plot.parms, window.points_widget)
 
 
+def _configData(data, config: dict):
+    """
+    set the memory budgets, the geometry decimation and the number of worker processes of the dataset
+    :param data:
+    :param config:
+    :return:
+    """
+    if "chunk_cache_mb" in config:
+        data.setChunkCacheBudget(int(config["chunk_cache_mb"] * 1024 ** 2))
+    if "p2_cache_mb" in config:
+        data.setP2CacheBudget(int(config["p2_cache_mb"] * 1024 ** 2))
+    if "geometry_decimation" in config:
+        data.setGeometryDecimation(config["geometry_decimation"])
+    if "num_workers" in config:
+        data.num_workers = config["num_workers"]
+
+
 def _configObject(obj: object, config: dict, lookup={}):
     """
 
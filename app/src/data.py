@@ -1,14 +1,25 @@
 import os
 import numpy as np
 from sarvey import objects as SarveyObjects
-from sarvey import utils as ut
 import logging
-from scipy.spatial import KDTree
 import h5py as h5
 import numpy as np
 from datetime import datetime
 import glob
+import weakref
 from .dynamic_ifg_network import DynamicIfgNetwork
+from .h5_pool import H5FilePool
+from .cache import ChunkCache, LruCache, TILE_SHAPE_DEFAULT
+from .sidecar import makeCacheDir, fileIdentity, CACHE_DIR_DEFAULT
+from .slc_pixel_major import createPixelMajorSlcStack, isPixelMajorSlcStackValid, SLC_PIXEL_MAJOR_FILE
+from .background_pyramid import BackgroundPyramid, createBackgroundPyramid, BACKGROUND_PYRAMID_FILE
+from .amplitude_average import RunningAmplitudeAverage
+from .lazy_points import LazyPoints
+from .point_index import PixelPointIndex, PointIdCodec
+from .point_tree import PointTree, pointTreeFileName
+from .geometry import GeometryCache
+from .metadata import loadMetadata, METADATA_FILE
+from .p2_parameters import parametersFileName, readParametersSidecar, writeParametersSidecar, estimateParameters
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +34,15 @@ IFG_NETWORK_FILE_DEFAULT = "ifg_network.h5"
 SLC_STACK_FILE = "slcStack.h5"
 IFG_STACK_FILE = "ifg_stack.h5"
 GEOMETRY_RADAR_FILE = "geometryRadar.h5"
+# raw data chunk cache of the files kept open by Data
+H5_RDCC_NBYTES = 64 * 1024 ** 2
+H5_RDCC_NSLOTS = 10007
+# memory budget of the decoded ifg_stack tiles
+CHUNK_CACHE_NBYTES = 256 * 1024 ** 2
+# memory budget of the loaded p2 files kept when switching between them
+P2_CACHE_NBYTES = 1024 ** 3
+# attributes restored from the p2 cache
+P2_PRODUCTS = ("p2", "p2_point_tree", "p2_pixel_index", "p2_velocity", "p2_demerr", "p2_coherence")
 
 
 # class Metadata:
@@ -46,9 +66,13 @@ class Data:
         :param input_path: Optional path to the inputs directory. If not provided, it is set to 'data_path/inputs'.
 
         """
+        # absolute, the file attributes are joined with data_path again when they are read
+        data_path = os.path.abspath(data_path)
         self.data_path = data_path
-        input_path = os.path.join(data_path, 'inputs') if input_path is None else input_path
+        input_path = os.path.join(data_path, 'inputs') if input_path is None else os.path.abspath(input_path)
         self.input_path = input_path
+        # derived products created by SARPlotter
+        self.cache_path = os.path.join(data_path, CACHE_DIR_DEFAULT)
         # backgrounds
         self.mean_amplitude_file = os.path.join(data_path, MEAN_AMPLITUDE_FILE_DEFAULT)
         self.mean_amplitude = None
@@ -58,20 +82,33 @@ class Data:
         self.temporal_coherence = None
         self.temporal_coherence_exist = self._fileExists(self.temporal_coherence_file)
         self.no_background = None
+        # overview pyramid of the backgrounds
+        self.background_pyramid_file = os.path.join(self.cache_path, BACKGROUND_PYRAMID_FILE)
+        self.background_pyramid = None
+        # running sums of the amplitude averaged over a window of dates
+        self.amplitude_average = RunningAmplitudeAverage()
+        self.amplitude_window_average = RunningAmplitudeAverage()
+        self.amplitude_overview_average = RunningAmplitudeAverage()
         # data point p1
         self.p1_file = os.path.join(data_path, P1_FILE_DEFAULT)
         self.p1_file_exist = self._fileExists(self.p1_file)
         self.p1 = None
         self.p1_point_tree = None
+        self.p1_pixel_index = None
         # data point p2
         self.p2_files = os.path.join(data_path, P2_FILES_DEFAULT)
         self.p2_file, self.p2_file_exist = self._checkExistingP2Files()
         # self.p2_file_exist = self._fileExists(self.p2_file)
         self.p2 = None
         self.p2_point_tree = None
+        self.p2_pixel_index = None
         self.p2_velocity = None
         self.p2_demerr = None
         self.p2_coherence = None
+        # worker processes used to estimate the p2 parameters. None: number of cpus
+        self.num_workers = None
+        # loaded p2 files, kept to switch back without reading them again
+        self.p2_cache = LruCache(P2_CACHE_NBYTES, sizeof=self._p2ProductsNbytes)
         # ifg network
         self.ifg_network_file = os.path.join(data_path, IFG_NETWORK_FILE_DEFAULT)
         self.ifg_network_file_exist = self._fileExists(self.ifg_network_file)
@@ -84,20 +121,34 @@ class Data:
         self.slc_stack_file = os.path.join(input_path, SLC_STACK_FILE)
         self.slc_stack_file_exist = self._fileExists(self.slc_stack_file)
         self.slc_dates = None
+        # {network: (slc indices of the reference dates, slc indices of the secondary dates) of the ifgs}
+        self.ifg_slc_indices = weakref.WeakKeyDictionary()
+        # optional pixel-major (time-contiguous) copy of the slc stack
+        self.slc_pixel_major_file = os.path.join(self.cache_path, SLC_PIXEL_MAJOR_FILE)
+        self.slc_pixel_major_file_exist = None
         # radar geometry
         self.geometry_radar_file = os.path.join(input_path, GEOMETRY_RADAR_FILE)
         self.geometry_radar_file_exist = self._fileExists(self.geometry_radar_file)
+        self.geometry = None
         # attributes
         self.wavelength = None
         self.orbit_direction = None
         self.slc_dimension = None
-        self.point_id_image = None
+        self.point_id_codec = None
 
         self.slc_selected_dates = None
+        # snapshot of dates, baselines, dimensions and file identities, shared by all components
+        self.metadata = None
+        # opened hdf5 files, kept open until the dataset is closed
+        self.h5_pool = H5FilePool(rdcc_nbytes=H5_RDCC_NBYTES, rdcc_nslots=H5_RDCC_NSLOTS)
+        self.chunk_cache = ChunkCache(self.h5_pool, max_nbytes=CHUNK_CACHE_NBYTES)
+        if self.geometry_radar_file_exist:
+            self.geometry = GeometryCache(self.geometry_radar_file, self.h5_pool)
+            self.geometry.start()
         self._readMetadata()
         # dynamic ifg network
         self.network_type = 'ifg_stack'
-        self.ifg_dynamic_network = DynamicIfgNetwork(data_path=self.data_path, slc_stack_file=self.slc_stack_file)
+        self.ifg_dynamic_network = DynamicIfgNetwork(metadata=self.metadata)
 
 
     def _fileExists(self, file, data_path=None):
@@ -168,26 +219,102 @@ class Data:
         if self.mean_amplitude is None or ind is not None:
             file_path = self.slc_stack_file
             if self.slc_stack_file_exist:
-                obj = SarveyObjects.slcStack(file_path)
-                obj.open()
-                date_list = obj.dateList
                 if ind is None:  # calculate mean amplitude of a subset
+                    obj = SarveyObjects.slcStack(file_path)
+                    obj.open()
+                    date_list = obj.dateList
                     interval = int(np.ceil(np.prod(obj.get_size()) / 1e8))  # TODO: read this from config
                     min_interval = int(np.ceil(obj.get_size()[0]/5))        # TODO: read this from config
                     if interval > min_interval:
                         interval = min_interval
                     amplitude = np.mean(np.abs(obj.read(date_list[0::interval])), axis=0)
-                else:  # read the ind subset
+                else:  # read the ind subset, only the dates entering or leaving the running average
                     ind = np.array(ind)
-                    ind = ind[(ind < len(date_list)) & (ind >= 0)]
-                    dates_to_read = [date_list[i] for i in ind]
-                    amplitude = np.abs(obj.read(dates_to_read))
-                    if ind.size > 1:
-                        amplitude = np.mean(amplitude, axis=0)
+                    ind = ind[(ind < len(self.slc_dates)) & (ind >= 0)]
+                    amplitude = self.amplitude_average.average(
+                        ind, lambda i: np.abs(self.h5_pool.read(file_path, 'slc', np.s_[i, :, :])), key="full")
                 amplitude = 10*np.log10(amplitude)
                 amplitude[~np.isfinite(amplitude)] = np.nan
         return amplitude, ind
 
+    def readBackgroundPyramid(self):
+        """
+        Open the overview pyramid of the backgrounds if it exists.
+
+        Returns:
+            BackgroundPyramid if the pyramid file exists
+            None if the pyramid file does not exist
+        """
+        if self.background_pyramid is None and os.path.exists(self.background_pyramid_file):
+            if self.mean_amplitude_file_exist:
+                mean_amplitude_source = self.mean_amplitude_file
+            else:
+                mean_amplitude_source = self.slc_stack_file if self.slc_stack_file_exist else None
+            sources = {"mean amplitude": mean_amplitude_source,
+                       "temporal coherence": self.temporal_coherence_file if self.temporal_coherence_exist else None,
+                       "amplitude": self.slc_stack_file if self.slc_stack_file_exist else None}
+            self.background_pyramid = BackgroundPyramid(self.background_pyramid_file, self.h5_pool, sources)
+        return self.background_pyramid
+
+    def createBackgroundPyramid(self, n_levels: int = 5, progress=None):
+        """
+        Write the overview pyramid of mean amplitude, amplitude and temporal coherence to the cache directory.
+        This is a one-time job.
+
+        :param n_levels: Number of overview levels, with factors 2, 4, ... 2**n_levels.
+        :param progress: Optional function called with (number of written dates, number of dates). Writing is
+                         cancelled if it returns False.
+
+        :return: True if the pyramid was written
+        """
+        if not makeCacheDir(self.cache_path):
+            return False
+        self.h5_pool.close(self.background_pyramid_file)
+        self.background_pyramid = None
+        return createBackgroundPyramid(self, self.background_pyramid_file, n_levels=n_levels, progress=progress)
+
+    def readBackgroundWindow(self, product: str, factor: int, y0: int, y1: int, x0: int, x1: int, ind=None,
+                             averager=None):
+        """
+        Read a window of a background at a resolution factor of the pyramid.
+
+        :param product: "mean amplitude", "amplitude" or "temporal coherence"
+        :param factor: Resolution factor. 1 is the full resolution.
+        :param y0, y1, x0, x1: Window in full resolution coordinates.
+        :param ind: Date indices for the "amplitude" product. The amplitude of several dates is averaged.
+        :param averager: RunningAmplitudeAverage for the "amplitude" product. Default is self.amplitude_window_average.
+
+        :return: image and the (y0, y1, x0, x1) window it covers in full resolution coordinates.
+        """
+        level_y0, level_y1 = y0 // factor, -(-y1 // factor)
+        level_x0, level_x1 = x0 // factor, -(-x1 // factor)
+        if product == "amplitude":
+            ind = np.atleast_1d(ind)
+            ind = np.unique(ind[(ind < len(self.slc_dates)) & (ind >= 0)])
+
+            def _readFrame(i):
+                if factor == 1:
+                    return np.abs(self.h5_pool.read(self.slc_stack_file, 'slc', np.s_[i, y0:y1, x0:x1]))
+                return self.background_pyramid.readWindow(product, factor, level_y0, level_y1,
+                                                          level_x0, level_x1, ind=[i])[0]
+
+            averager = self.amplitude_window_average if averager is None else averager
+            amplitude = averager.average(ind, _readFrame, key=(factor, level_y0, level_y1, level_x0, level_x1))
+            with np.errstate(divide="ignore"):
+                image = 10 * np.log10(amplitude)
+            image[~np.isfinite(image)] = np.nan
+        else:
+            image = self.background_pyramid.readWindow(product, factor, level_y0, level_y1, level_x0, level_x1)
+        return image, (level_y0 * factor, level_y1 * factor, level_x0 * factor, level_x1 * factor)
+
+    def readBackgroundOverview(self, product: str, ind=None):
+        """
+        Read the coarsest level of a background for the whole image, e.g. to set the color limits.
+        """
+        factor = max(self.background_pyramid.factors(product))
+        image, _ = self.readBackgroundWindow(product, factor, 0, self.n_lines, 0, self.n_pixels, ind=ind,
+                                             averager=self.amplitude_overview_average)
+        return image
 
     def readP1(self):
         """
@@ -198,8 +325,8 @@ class Data:
         - If the file does not exist, set P1 to -1.
         - If the file exists, initialize P1 using the SarveyObjects.Points class.
 
-        If the P1 point tree is not initialized, create a KDTree for P1 coordinates.
-
+        If the P1 point tree is not initialized, start building the KDTree for P1 coordinates in the background
+        and create the pixel index used for exact hits.
         """
         if self.p1 is None:
             file_path = os.path.join(self.data_path, self.p1_file)
@@ -209,19 +336,25 @@ class Data:
                 self.p1 = SarveyObjects.Points(file_path=file_path, logger=logger)
                 self.p1.open(input_path=self.input_path)
         if self.p1_point_tree is None:
-            self.p1_point_tree = KDTree(self.p1.coord_xy[:, [1, 0]])
+            self.p1_point_tree = self._pointTree(self.p1.coord_xy, os.path.join(self.data_path, self.p1_file))
+        if self.p1_pixel_index is None:
+            self.p1_pixel_index = PixelPointIndex(self.p1.coord_xy, (self.n_lines, self.n_pixels))
 
-    def readP2(self):
+    def readP2(self, progress=None):
         """
         Read and initialize second order (P2) data.
 
         If P2 data is not already loaded:
         - Check if the P2 file exists.
         - If the file does not exist, set P2 to -1.
-        - If the file exists, initialize P2 using the SarveyObjects.Points class.
+        - If the file exists, initialize P2 using the LazyPoints class. Coordinates and per-point scalars are
+          loaded, the phase stays on disk and is read per row or per block.
 
-        If the P2 point tree is not initialized, create a KDTree for P2 coordinates.
+        If the P2 point tree is not initialized, start building the KDTree for P2 coordinates in the background
+        and create the pixel index used for exact hits.
 
+        :param progress: Optional function called with (number of estimated points, number of points) if the
+                         P2 parameters are not in the sidecar and are estimated.
         """
         if not self.p2_file_exist:
             return
@@ -230,12 +363,38 @@ class Data:
             if not os.path.exists(file_path):
                 self.p2 = -1
             else:
-                # TODO: load only parts of p2 that are needed
-                self.p2 = SarveyObjects.Points(file_path=file_path, logger=logger)
+                self.p2 = LazyPoints(file_path=file_path, logger=logger, h5_pool=self.h5_pool)
                 self.p2.open(input_path=self.input_path)
 
-            self.p2_point_tree = KDTree(self.p2.coord_xy[:, [1, 0]])
-            self.readVelocity()
+            self.p2_point_tree = self._pointTree(self.p2.coord_xy, file_path)
+            self.p2_pixel_index = PixelPointIndex(self.p2.coord_xy, (self.n_lines, self.n_pixels))
+            self.readVelocity(progress=progress)
+            self.p2_cache.put(self._p2CacheKey(self.p2_file), {name: getattr(self, name) for name in P2_PRODUCTS})
+
+    def _pointTree(self, coord_xy, points_file: str):
+        """
+        Start building the KDTree of the point coordinates. It is persisted in the cache directory if writable.
+        """
+        tree_file = None
+        if makeCacheDir(self.cache_path):
+            tree_file = os.path.join(self.cache_path, pointTreeFileName(points_file))
+        return PointTree(coord_xy[:, [1, 0]], points_file, tree_file=tree_file)
+
+    def _p2CacheKey(self, p2_file: str):
+        identity = fileIdentity(os.path.join(self.data_path, p2_file))
+        return identity["source_file"], identity["source_size"], identity["source_mtime"]
+
+    @staticmethod
+    def _p2ProductsNbytes(products: dict):
+        """
+        Estimate the memory of the loaded products of a p2 file. The phase on disk is not counted.
+        """
+        nbytes = products["p2"].residentNbytes()
+        nbytes += products["p2_point_tree"].nbytes
+        nbytes += products["p2_pixel_index"].nbytes
+        for name in ("p2_velocity", "p2_demerr", "p2_coherence"):
+            nbytes += products[name].nbytes
+        return nbytes
 
     def _checkExistingP2Files(self):
         p2_files_pattern = os.path.join(self.data_path, self.p2_files)
@@ -254,29 +413,35 @@ class Data:
         if self.p2_file == selected_file:
             return False
         else:
-            # TODO: keep the p2 information for previously seleted files if they are not too large
+            self.h5_pool.close(os.path.join(self.data_path, self.p2_file))
             self.p2_file = selected_file
-            self.p2 = None
-            self.p2_point_tree = None
+            products = self.p2_cache.get(self._p2CacheKey(selected_file))
+            if products is None:
+                products = dict.fromkeys(P2_PRODUCTS)
+            else:
+                logger.info(f"{selected_file} restored from the p2 cache")
+            for name, value in products.items():
+                setattr(self, name, value)
             return True
 
     def readIfgNetwork(self):
         """
         Read the Interferogram (IFG) network.
 
-        If the IFG network is not already loaded, this function attempts to read it from a file specified
-        by `self.ifg_network_file` within the `self.data_path`. If the file does not exist, it sets `self.ifg_network`
-        to -1. Otherwise, it initializes a new `SarveyObjects.IfgNetwork` object and opens the file.
+        If the IFG network is not already loaded, this function creates a `SarveyObjects.IfgNetwork` object from the
+        metadata snapshot, which holds the content of `self.ifg_network_file`. If the file does not exist, it sets
+        `self.ifg_network` to -1.
 
         :return: None
         """
         if self.ifg_network is None:
-            file_path = os.path.join(self.data_path, self.ifg_network_file)
-            if not os.path.exists(file_path):
+            if self.metadata.ifg_network is None:
                 self.ifg_network = -1
             else:
                 self.ifg_network = SarveyObjects.IfgNetwork()
-                self.ifg_network.open(path=file_path)
+                for name, value in self.metadata.ifg_network.items():
+                    setattr(self.ifg_network, name, np.array(value) if isinstance(value, list) and name != 'dates'
+                            else value)
 
     def readDates(self):
         """
@@ -302,37 +467,35 @@ class Data:
 
     def _readMetadata(self):
         """
-        Reads and sets the metadata from either an slc_stack file or an ifg_stack file.
-        If slc_stack file is not available, it will read the metadata from ifg_stack
+        Reads and sets the metadata from the metadata snapshot of the dataset.
+        The snapshot is collected from the slc_stack and ifg_network files once and cached in the cache directory.
         Raises an exception if neither an SLC stack file nor an IFG stack file exist.
         """
-        if self.slc_stack_file_exist: # TODO: read other alternatives if slc is not available
-            h_file = h5.File(os.path.join(self.data_path, self.slc_stack_file))
-        if self.ifg_network_file_exist:
-            h_file_ifg = h5.File(os.path.join(self.data_path, self.ifg_network_file))
-            slc_dates_ts = h_file_ifg['dates'][:]
-            slc_dates_ts = [date.decode('utf-8') for date in slc_dates_ts]
-            self.slc_dates_ts = self.yyyymmddToDates(slc_dates_ts, date_format="%Y-%m-%d")
         if not self.slc_stack_file_exist and not self.ifg_stack_file_exist:
             raise ("input files do not exist!")
         # TODO: fix reading parameters from ifg_stack when slcstack is not available
-        self.wavelength = float(h_file.attrs['WAVELENGTH'])
-        self.orbit_direction = h_file.attrs["ORBIT_DIRECTION"].lower()
-        slc_dates = h_file['date'][:]
-        slc_dates = [date.decode('utf-8') for date in slc_dates]
-        self.slc_dates = self.yyyymmddToDates(slc_dates)
+        cache_file = os.path.join(self.cache_path, METADATA_FILE) if makeCacheDir(self.cache_path) else None
+        # the file attributes already contain data_path
+        ifg_network_file = self.ifg_network_file if os.path.exists(self.ifg_network_file) else None
+        inventory = [self.ifg_stack_file, self.geometry_radar_file, self.mean_amplitude_file,
+                     self.temporal_coherence_file]
+        self.metadata = loadMetadata(cache_file, self.h5_pool, self.slc_stack_file,
+                                     ifg_network_file=ifg_network_file, inventory=inventory)
+        if self.metadata.ifg_network_dates is not None:
+            self.slc_dates_ts = self.yyyymmddToDates(self.metadata.ifg_network_dates, date_format="%Y-%m-%d")
+        self.wavelength = self.metadata.wavelength
+        self.orbit_direction = self.metadata.orbit_direction
+        self.slc_dates = self.yyyymmddToDates(self.metadata.slc_dates)
         self.slc_selected_dates = self.slc_dates.copy()
-        self.slc_dimension = h_file['slc'].shape
-        self.slc_pbase = np.array(h_file['bperp'])
-        self.slc_pbase = np.array(h_file['bperp'])
+        self.slc_dimension = tuple(self.metadata.slc_dimension)
+        self.slc_pbase = np.array(self.metadata.slc_pbase)
         self.n_lines = self.slc_dimension[1]
         self.n_pixels = self.slc_dimension[2]
         self.createPointIds()
         # TODO: alternatively read metadata from ifg_network.h5
-        h_file.close()
 
     def createPointIds(self):
-        self.point_id_image = np.arange(0, self.n_lines * self.n_pixels).reshape((self.n_lines, self.n_pixels))
+        self.point_id_codec = PointIdCodec(self.n_lines, self.n_pixels)
 
     def readTsForIdx(self, idx: int = None, idx_ref: int = None, remove_topo_error=True):
         """
@@ -340,81 +503,168 @@ class Data:
 
         :param remove_topo_error:
         :param idx: Index for the phase data. If provided, read phase data for this index.
-        :param idx_ref: Reference index for the phase data. If provided, read phase data for this reference index.
+        :param idx_ref: Index for the reference phase data. If provided, read phase data for this reference index.
 
         :return: The difference between phase data at the specified index and the reference index.
         """
-        h_file = h5.File(os.path.join(self.data_path, self.p2_file))
-        idx_phase_data = 0 if idx is None else h_file['phase'][idx, :]
-        idx_ref_phase_data = 0 if idx_ref is None else h_file['phase'][idx_ref, :]
-
-        # calculate topo phase
-        phase_topo = 0
-        if idx is not None:
-            phase_topo += (self.p2.ifg_net_obj.pbase / (self.p2.slant_range[idx] *
-                                                        np.sin(self.p2.loc_inc[idx])) * self.p2_demerr[idx])
-        if idx_ref is not None:
-            phase_topo -= (self.p2.ifg_net_obj.pbase / (self.p2.slant_range[idx_ref] *
-                                                        np.sin(self.p2.loc_inc[idx_ref])) * self.p2_demerr[idx_ref])
-        phase_topo *= 4 * np.pi / self.wavelength
-        if not remove_topo_error:
-            phase_topo = 0
-        phase_data = idx_phase_data - idx_ref_phase_data - phase_topo
+        return self.readTsForIdxList([idx], [idx_ref], remove_topo_error=remove_topo_error)[0]
+
+    def readTsForIdxList(self, idx: list, idx_ref: list = None, remove_topo_error=True):
+        """
+        Read phase data for a list of indices and calculate the difference with their reference indices.
+        The rows of all points and reference points are sorted, deduplicated and read in one selection.
+
+        :param idx: List of indices for the phase data. None entries give zero phase.
+        :param idx_ref: List of reference indices with the same length as idx. None entries are not referenced.
+        :param remove_topo_error: Remove the phase of the estimated DEM error.
+
+        :return: numpy.ndarray (points, images) with the differences between the phase data of the indices and
+                 the reference indices.
+        """
+        idx = list(idx)
+        idx_ref = [None] * len(idx) if idx_ref is None else list(idx_ref)
+        rows = np.array(sorted({i for i in idx + idx_ref if i is not None}), dtype=np.int64)
+        if rows.size == 0:
+            return np.zeros((len(idx), self.p2.phase.shape[1]), dtype=np.float32)
+        phase_rows = self.p2.phase.readRows(rows)
+        phase_data = (self._phaseForRows(idx, rows, phase_rows, remove_topo_error) -
+                      self._phaseForRows(idx_ref, rows, phase_rows, remove_topo_error))
         # TODO: phase to cm conversion
         return phase_data
 
+    def _phaseForRows(self, indices: list, rows, phase_rows, remove_topo_error: bool):
+        """
+        Select the phase of the indices from the rows read and remove the phase of the DEM error.
+        """
+        valid = np.array([i is not None for i in indices])
+        idx = np.array([i if i is not None else rows[0] for i in indices], dtype=np.int64)
+        phase_data = phase_rows[np.searchsorted(rows, idx)].astype(np.float64)
+        if remove_topo_error:
+            factor = self.p2.slant_range[idx] * np.sin(self.p2.loc_inc[idx])
+            phase_data -= (4 * np.pi / self.wavelength * self.p2.ifg_net_obj.pbase[np.newaxis, :] *
+                           (self.p2_demerr[idx] / factor)[:, np.newaxis])
+        phase_data[~valid] = 0
+        return phase_data
+
     def readInterferogramPhaseForAzRa(self, ra: int, az: int, ra2: int = None, az2: int = None):
         """
         Retrieve interferometric phase from the ifg_stack file for the specified azimuth (az) and range (ra) indices.
+        The decoded tiles of the ifg_stack are kept in self.chunk_cache.
 
         :param ra: Range coordinate
         :param az: Azimuth coordinate
 
         :return: Interferometric phase
         """
-        h_file = h5.File(os.path.join(self.data_path, self.ifg_stack_file))
+        file_path = self.ifg_stack_file
         if az2 is None and ra2 is None:
-            ifg_cpx = h_file['ifgs'][az, ra, :]
+            ifg_cpx = self.chunk_cache.readPixel(file_path, 'ifgs', az, ra)
         else:
-            ifg_cpx = h_file['ifgs'][az:az2, ra:ra2, :]
+            ifg_cpx = self.chunk_cache.readWindow(file_path, 'ifgs', az, ra, az2, ra2)
         return ifg_cpx
 
-    def calculateInterferogramPhaseForAzRa(self, ra: int, az: int, ra2: int = None, az2: int = None):
+    def calculateInterferogramPhaseForAzRa(self, ra: int, az: int, ra2: int = None, az2: int = None, out=None):
         """
         Calculate interferometric phase from the slc_stack file for the specified azimuth (az) and range (ra) indices.
 
         :param ra: Range coordinate
         :param az: Azimuth coordinate
+        :param out: Optional complex64 buffer with the shape of the result, (ifgs,) or (lines, pixels, ifgs).
 
         :return: Interferometric phase
         """
-        h_file = h5.File(os.path.join(self.data_path, self.slc_stack_file))
-        slc_dates = self.yyyymmddToDates([date.decode("utf-8") for date in h_file['date'][:]], out_format="%Y-%m-%d")
-
-        ifg_list_map_to_slc_stack = [(
-            slc_dates.index(self.ifg_network.dates[baseline[0]]),
-            slc_dates.index(self.ifg_network.dates[baseline[1]]))
-            for baseline in self.ifg_network.ifg_list
-        ]
-        ifg_list = ifg_list_map_to_slc_stack
+        file_path = self.slc_stack_file
+        use_pixel_major = self.slcPixelMajorExists()
+        ifg_ref_index, ifg_sec_index = self.ifgSlcIndices()
 
         if az2 is None and ra2 is None:
-            slc_phase = h_file['slc'][:, az, ra]
-            ifg_cpx = np.array([slc_phase[this_ifg[0]] * np.conjugate(slc_phase[this_ifg[1]])
-                                for this_ifg in ifg_list])
+            if use_pixel_major:
+                slc_phase = self.chunk_cache.readPixel(self.slc_pixel_major_file, 'slc', az, ra)
+            else:
+                slc_phase = self.h5_pool.read(file_path, 'slc', np.s_[:, az, ra])
         else:
-            slc_phase = h_file['slc'][:, az:az2, ra:ra2]
-            ifg_cpx = np.array([slc_phase[this_ifg[0], :, :] * np.conjugate(slc_phase[this_ifg[1], :, :])
-                                for this_ifg in ifg_list]).transpose((1, 2, 0))
-        h_file.close()
-        return ifg_cpx
+            if use_pixel_major:
+                slc_phase = self.chunk_cache.readWindow(self.slc_pixel_major_file, 'slc', az, ra, az2, ra2)
+            else:
+                slc_phase = np.moveaxis(self.h5_pool.read(file_path, 'slc', np.s_[:, az:az2, ra:ra2]), 0, 2)
+        return self._formInterferograms(slc_phase, ifg_ref_index, ifg_sec_index, out=out)
+
+    @staticmethod
+    def _formInterferograms(slc_phase, ifg_ref_index, ifg_sec_index, out=None):
+        """
+        Form the interferograms ref * conj(sec) of slc data with the dates in the last axis.
+        """
+        slc_phase = np.asarray(slc_phase).astype(np.complex64, copy=False)
+        if out is None:
+            out = np.empty(slc_phase.shape[:-1] + (ifg_ref_index.size,), dtype=np.complex64)
+        np.take(slc_phase, ifg_sec_index, axis=-1, out=out)
+        np.conjugate(out, out=out)
+        out *= np.take(slc_phase, ifg_ref_index, axis=-1)
+        return out
+
+    def ifgSlcIndices(self):
+        """
+        Return the slc stack indices of the reference and secondary dates of the interferograms of the network.
+        They are computed once per network and dropped with the network.
+
+        :return: tuple of two numpy.ndarray (ifgs,)
+        """
+        network = self.ifg_network
+        if network not in self.ifg_slc_indices:
+            slc_date_index = {date.strftime("%Y-%m-%d"): i for i, date in enumerate(self.slc_dates)}
+            network_index = np.array([slc_date_index[date] for date in network.dates], dtype=np.int64)
+            ifg_list = np.asarray(network.ifg_list, dtype=np.int64).reshape(-1, 2)
+            self.ifg_slc_indices[network] = (network_index[ifg_list[:, 0]], network_index[ifg_list[:, 1]])
+        return self.ifg_slc_indices[network]
+
+    def interferogramTileShape(self):
+        """
+        Return the chunk size of the file the interferograms of the network are read from. Windows aligned to it
+        are read without reading a chunk twice.
+
+        :return: tuple (azimuth, range)
+        """
+        if self.network_type == "ifg_stack":
+            return self.chunk_cache.tileShape(self.ifg_stack_file, 'ifgs')
+        if self.slcPixelMajorExists():
+            return self.chunk_cache.tileShape(self.slc_pixel_major_file, 'slc')
+        chunks = self.h5_pool.dataset(self.slc_stack_file, 'slc').chunks
+        return tuple(chunks[1:3]) if chunks is not None else TILE_SHAPE_DEFAULT
+
+    def slcPixelMajorExists(self):
+        """
+        Check once if a valid pixel-major copy of the slc stack exists.
+
+        :return: True if calculateInterferogramPhaseForAzRa can read from the pixel-major file, False otherwise.
+        """
+        if self.slc_pixel_major_file_exist is None:
+            self.slc_pixel_major_file_exist = (self.slc_stack_file_exist and
+                                               isPixelMajorSlcStackValid(self.slc_pixel_major_file,
+                                                                         self.slc_stack_file))
+        return self.slc_pixel_major_file_exist
+
+    def createSlcPixelMajor(self, tile_size: int = 32):
+        """
+        Write the pixel-major copy of the slc stack to the cache directory. This is a one-time job.
+        Afterward, calculateInterferogramPhaseForAzRa reads one chunk per pixel instead of one chunk per date.
+
+        :param tile_size: Chunk size in azimuth and range.
+        """
+        if not self.slc_stack_file_exist or not makeCacheDir(self.cache_path):
+            return
+        self.chunk_cache.clear(self.slc_pixel_major_file)
+        self.h5_pool.close(self.slc_pixel_major_file)
+        createPixelMajorSlcStack(self.slc_stack_file, self.slc_pixel_major_file, tile_size=tile_size)
+        self.slc_pixel_major_file_exist = None
 
     def constructDynamicNetwork(self):
-        index = [i for i in range(len(self.slc_dates)) if self.slc_dates[i] in self.slc_selected_dates]
-        dates = np.array(self.slc_dates)[index]
-        self.ifg_dynamic_network.dates = [date.strftime("%Y-%m-%d") for date in dates]
-        self.ifg_dynamic_network.slc_pbase = self.slc_pbase[index]
-        self.ifg_dynamic_network.slc_tbase = np.array([(date - self.slc_dates[0]).days / 365.25 for date in dates])
+        """
+        Set ifg_network to the dynamic network of the selected dates. Networks with unchanged parameters are taken
+        from the cache of DynamicIfgNetwork.
+        """
+        selected_dates = set(self.slc_selected_dates)
+        index = [i for i in range(len(self.slc_dates)) if self.slc_dates[i] in selected_dates]
+        self.ifg_dynamic_network.selectDates(index)
         self.ifg_dynamic_network.construct()
         self.ifg_network = self.ifg_dynamic_network.ifg_network
 
@@ -429,9 +679,7 @@ class Data:
         """
         slant_range = None
         if self.geometry_radar_file_exist:
-            h_file = h5.File(os.path.join(self.data_path, self.geometry_radar_file))
-            slant_range = h_file['slantRangeDistance'][az, ra]
-            h_file.close()
+            slant_range = self.geometry.slantRange(az, ra)
         return slant_range
 
     def readIncidenceAngleForAzRa(self, ra: int, az: int):
@@ -445,13 +693,92 @@ class Data:
         """
         incidence_angle = None
         if self.geometry_radar_file_exist:
-            h_file = h5.File(os.path.join(self.data_path, self.geometry_radar_file))
-            incidence_angle = h_file['incidenceAngle'][az, ra]
-            h_file.close()
+            incidence_angle = self.geometry.incidenceAngle(az, ra)
         return incidence_angle
 
-    def readVelocity(self):
-        self.p2_velocity, self.p2_demerr, _, self.p2_coherence, _, _ = ut.estimateParameters(obj=self.p2, ifg_space=False)
+    def readGeometryFactorForAzRa(self, ra, az):
+        """
+        Retrieve slant_range * sin(incidence angle) for the specified azimuth (az) and range (ra) indices.
+        The indices can be arrays.
+
+        :param ra: Range coordinate(s)
+        :param az: Azimuth coordinate(s)
+
+        :return: Geometry factor of the design matrix
+        """
+        factor = None
+        if self.geometry_radar_file_exist:
+            factor = self.geometry.factorForAzRa(az, ra)
+        return factor
+
+    def setGeometryDecimation(self, decimation: int):
+        """
+        Keep every n-th line and pixel of the slant range and incidence angle in memory and interpolate in between.
+        The geometry is loaded again in the background.
+
+        :param decimation: 1 keeps the full resolution.
+        """
+        if not self.geometry_radar_file_exist or self.geometry.decimation == max(1, int(decimation)):
+            return
+        self.geometry.stop()
+        self.geometry = GeometryCache(self.geometry_radar_file, self.h5_pool, decimation=decimation)
+        self.geometry.start()
+
+    def readVelocity(self, progress=None):
+        """
+        Read velocity, DEM error and temporal coherence of the P2 points from the parameters sidecar.
+        If it is missing or outdated, estimate them in parallel and write the sidecar.
+
+        :param progress: Optional function called with (number of estimated points, number of points).
+        """
+        p2_file = os.path.join(self.data_path, self.p2_file)
+        sidecar_file = os.path.join(self.cache_path, parametersFileName(self.p2_file))
+        parameters = readParametersSidecar(sidecar_file, p2_file)
+        if parameters is None:
+            parameters = estimateParameters(self.p2, num_workers=self.num_workers, progress=progress)
+            if makeCacheDir(self.cache_path):
+                writeParametersSidecar(sidecar_file, p2_file, parameters)
+        self.p2_velocity = parameters["velocity"]
+        self.p2_demerr = parameters["demerr"]
+        self.p2_coherence = parameters["coherence"]
+
+    def ioStatistics(self):
+        """
+        Return the counters of the hdf5 handle pool.
+
+        :return: dict with the number of open files, handle hits, file opens and bytes read.
+        """
+        stats = self.h5_pool.stats()
+        stats["chunk_cache"] = self.chunk_cache.stats()
+        stats["p2_cache"] = self.p2_cache.stats()
+        return stats
+
+    def setChunkCacheBudget(self, max_nbytes: int):
+        """
+        Change the memory budget of the decoded ifg_stack tiles.
+
+        :param max_nbytes: Memory budget in bytes.
+        """
+        self.chunk_cache.tiles.resize(max_nbytes)
+
+    def setP2CacheBudget(self, max_nbytes: int):
+        """
+        Change the memory budget of the loaded p2 files kept when switching between them.
+
+        :param max_nbytes: Memory budget in bytes.
+        """
+        self.p2_cache.resize(max_nbytes)
+
+    def close(self):
+        """
+        Close all hdf5 files kept open by this dataset. Call it before switching to another dataset.
+        """
+        logger.info(f"closing dataset {self.data_path}: {self.ioStatistics()}")
+        if self.geometry is not None:
+            self.geometry.stop()
+        self.chunk_cache.clear()
+        self.p2_cache.clear()
+        self.h5_pool.close()
 
     def phaseToDistance(self, phase, unit="cm"):
         scale_dict = {"mm": 1000, "cm": 100, "dm": 10, "m": 1}
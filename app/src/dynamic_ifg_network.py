@@ -1,7 +1,6 @@
-import os
+from collections import OrderedDict
 import numpy as np
 import logging
-import h5py as h5
 from datetime import datetime
 from sarvey import ifg_network
 from .config.load_config import loadConfig
@@ -10,16 +9,22 @@ config = loadConfig(config_file_name='config.json')
 
 logger = logging.getLogger(__name__)
 
+# number of constructed networks kept to switch back without constructing them again
+NETWORK_CACHE_SIZE = 16
+
 
 class DynamicIfgNetwork:
-    def __init__(self, data_path=None, slc_stack_file="inputs/slcStack.h5"):
-        self.data_path = data_path
-        self.slc_stack_file = slc_stack_file
+    def __init__(self, metadata=None):
+        """
+        Initialize the DynamicIfgNetwork class with all dates of the dataset selected.
+
+        :param metadata: DatasetMetadata snapshot providing the dates and baselines of the slc images.
+        """
+        self.metadata = metadata
         self.slc_pbase = None
         self.slc_tbase = None
         self.dates = None
         self.selected_dates = None
-        # self.loadData()
         self.ifg_network = None
         self.type = "ifg_stack"
         self.max_pbase = np.inf
@@ -28,17 +33,56 @@ class DynamicIfgNetwork:
         self.num_link = 1
         self.max_num_ifgs = np.inf
         self.min_num_ifgs = 0
+        # constructed networks by parameterKey()
+        self.networks = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if metadata is not None:
+            self.selectDates(np.arange(len(metadata.slc_dates)))
+
+    def selectDates(self, index):
+        """
+        Set the dates and baselines of the network to the selected slc images of the metadata snapshot.
 
-    # def loadData(self):
-    #     h_file = h5.File(os.path.join(self.data_path, self.slc_stack_file))
-    #     self.slc_pbase = np.array(h_file['bperp'])
-    #     dates_datetime = [datetime.strptime(this_date.decode('utf-8'), '%Y%m%d') for this_date in
-    #                       np.array(h_file['date'])]
-    #     self.dates = [date.strftime("%Y-%m-%d") for date in dates_datetime]
-    #     self.slc_tbase = np.array([(this_date - dates_datetime[0]).days / 365.25 for this_date in dates_datetime])
-    #     h_file.close()
+        :param index: Indices of the selected slc dates.
+        """
+        index = np.asarray(index, dtype=int)
+        self.dates = [datetime.strptime(self.metadata.slc_dates[i], "%Y%m%d").strftime("%Y-%m-%d") for i in index]
+        self.slc_pbase = np.array(self.metadata.slc_pbase)[index]
+        self.slc_tbase = self.metadata.slcTbase(index)
+
+    def parameterKey(self):
+        """
+        Key of the network parameters. Networks with the same key are identical.
+
+        :return: tuple
+        """
+        ref_idx = self.ref_index if self.ref_index < len(self.dates) else 0
+        return (self.type, tuple(self.dates), np.asarray(self.slc_pbase).tobytes(),
+                np.asarray(self.slc_tbase).tobytes(), ref_idx if self.type == "star" else None,
+                self.num_link if self.type == "sbas" else None, self.max_tbase,
+                self.max_pbase if self.type == "improved" else None,
+                self.max_num_ifgs if self.type == "improved" else None,
+                self.min_num_ifgs if self.type == "improved" else None)
 
     def construct(self):
+        """
+        Set ifg_network to the network of the current parameters.
+        The network is only constructed if it is not in the cache of the recently constructed networks.
+        """
+        key = self.parameterKey()
+        if key in self.networks:
+            self.hits += 1
+            self.networks.move_to_end(key)
+            self.ifg_network = self.networks[key]
+            return
+        self.misses += 1
+        self._construct()
+        self.networks[key] = self.ifg_network
+        if len(self.networks) > NETWORK_CACHE_SIZE:
+            self.networks.popitem(last=False)
+
+    def _construct(self):
 
         # if self.selected_dates is not None:
         #     selected_dates = [date.strftime("%Y-%m-%d") for date in self.selected_dates]
@@ -0,0 +1,263 @@
+import os
+import sys
+import csv
+import argparse
+import logging
+import h5py as h5
+import numpy as np
+from .data import Data
+from .model_fitting import FittingModels
+
+logger = logging.getLogger(__name__)
+
+TS_BATCH_SIZE_DEFAULT = 1000
+TS_FORMATS = ("csv", "h5", "parquet")
+FIT_MODELS = ("poly-1", "poly-2", "poly-3", "exp")
+
+
+def readPointList(file_path: str, point_type: str, codec):
+    """
+    Read the points of a text file. Each line is one point, as in the point list of the GUI:
+    "id" or "id, ref_id" for point_type 'id' and "x, y" or "x, y, x_ref, y_ref" for point_type 'range_azimuth'.
+    Empty lines and lines starting with # are skipped.
+
+    :param file_path: Path to the text file.
+    :param point_type: 'id' or 'range_azimuth'.
+    :param codec: PointIdCodec of the dataset.
+
+    :return: list of (point_id, ref_point_id) with ref_point_id None if not given
+    """
+    points = []
+    with open(file_path, 'r') as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                items = [int(item) for item in line.replace(",", " ").split()]
+                if point_type == "id" and len(items) in [1, 2]:
+                    point = (items[0], items[1] if len(items) == 2 else None)
+                    for point_id in point:
+                        if point_id is not None:
+                            codec.decode(point_id)  # raises IndexError outside of the image
+                elif point_type == "range_azimuth" and len(items) in [2, 4]:
+                    ref_point_id = codec.encode(items[2], items[3]) if len(items) == 4 else None
+                    point = (codec.encode(items[0], items[1]), ref_point_id)
+                else:
+                    raise ValueError(f"expected {point_type}")
+            except (ValueError, IndexError) as e:
+                raise ValueError(f"{file_path}:{line_number}: cannot read '{line}': {e}")
+            points.append(point)
+    return points
+
+
+class CsvWriter:
+    def __init__(self, out_file: str, dates: list):
+        self.file = open(out_file, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(["point_id", "ref_point_id", "x", "y", "series"] + dates)
+
+    def write(self, columns: dict, values):
+        for i in range(values.shape[0]):
+            self.writer.writerow([columns[name][i] for name in ("point_id", "ref_point_id", "x", "y", "series")] +
+                                 [f"{value:.6g}" for value in values[i]])
+
+    def close(self):
+        self.file.close()
+
+
+class H5Writer:
+    def __init__(self, out_file: str, dates: list):
+        self.file = h5.File(out_file, 'w')
+        self.file.create_dataset("date", data=np.array(dates, dtype="S10"))
+        self.datasets = {
+            "point_id": self.file.create_dataset("point_id", shape=(0,), maxshape=(None,), dtype=np.int64),
+            "ref_point_id": self.file.create_dataset("ref_point_id", shape=(0,), maxshape=(None,), dtype=np.int64),
+            "x": self.file.create_dataset("x", shape=(0,), maxshape=(None,), dtype=np.int64),
+            "y": self.file.create_dataset("y", shape=(0,), maxshape=(None,), dtype=np.int64),
+            "series": self.file.create_dataset("series", shape=(0,), maxshape=(None,), dtype=h5.string_dtype()),
+        }
+        self.values = self.file.create_dataset("timeseries", shape=(0, len(dates)), maxshape=(None, len(dates)),
+                                               dtype=np.float32, chunks=(256, len(dates)))
+
+    def write(self, columns: dict, values):
+        n_old = self.values.shape[0]
+        n_new = n_old + values.shape[0]
+        for name, dataset in self.datasets.items():
+            dataset.resize((n_new,))
+            dataset[n_old:n_new] = columns[name]
+        self.values.resize((n_new, values.shape[1]))
+        self.values[n_old:n_new, :] = values
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    def __init__(self, out_file: str, dates: list):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("writing parquet files requires pyarrow. Use --format csv or h5 instead.")
+        self.pa = pyarrow
+        self.dates = dates
+        self.out_file = out_file
+        self.writer = None
+
+    def write(self, columns: dict, values):
+        table = self.pa.table({**{name: columns[name] for name in ("point_id", "ref_point_id", "x", "y", "series")},
+                               **{date: values[:, i] for i, date in enumerate(self.dates)}})
+        if self.writer is None:
+            self.writer = self.pa.parquet.ParquetWriter(self.out_file, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+WRITERS = {"csv": CsvWriter, "h5": H5Writer, "parquet": ParquetWriter}
+
+
+def extractTimeseries(data: Data, points: list, writer, unit: str = "cm", remove_topo_error: bool = True,
+                      fit_models: list = (), fit_seasonal: bool = False, batch_size: int = TS_BATCH_SIZE_DEFAULT):
+    """
+    Read the time series of points batch by batch and write them with a writer.
+
+    Points that are not P2 points are skipped with a warning. The fitted models are written as additional rows
+    with the model name in the 'series' column. A model that cannot be fitted to a point is written as a NaN row.
+
+    :param data: Data instance with the P2 file to read.
+    :param points: list of (point_id, ref_point_id).
+    :param writer: CsvWriter, H5Writer or ParquetWriter.
+    :param unit: Unit of the distance, e.g. 'mm' or 'cm'.
+    :param remove_topo_error: Remove the phase of the estimated DEM error.
+    :param fit_models: Names of the FittingModels models fitted to each time series.
+    :param fit_seasonal: Fit an annual signal in addition to the models.
+    :param batch_size: Number of points read and written at once.
+
+    :return: int number of written points
+    """
+    data.readP2()
+    codec = data.point_id_codec
+    num_written = 0
+    for start in range(0, len(points), batch_size):
+        batch = points[start:start + batch_size]
+        point_ids = np.array([point_id for point_id, _ in batch], dtype=np.int64)
+        ref_point_ids = [ref_point_id for _, ref_point_id in batch]
+        x, y = codec.decode(point_ids)
+        idx = data.p2_pixel_index.lookup(y, x)
+        idx_ref = []
+        for ref_point_id in ref_point_ids:
+            if ref_point_id is None:
+                idx_ref.append(None)
+            else:
+                x_ref, y_ref = codec.decode(ref_point_id)
+                idx_ref.append(data.p2_pixel_index.lookup(y_ref, x_ref))
+        valid = [k for k in range(len(batch)) if idx[k] >= 0 and (idx_ref[k] is None or idx_ref[k] >= 0)]
+        for k in sorted(set(range(len(batch))) - set(valid)):
+            logger.warning(f"point {point_ids[k]} or its reference {ref_point_ids[k]} is not a P2 point, skipped")
+        if not valid:
+            continue
+        ts_phase = data.readTsForIdxList([int(idx[k]) for k in valid], [idx_ref[k] for k in valid],
+                                         remove_topo_error=remove_topo_error)
+        ts_distance = data.phaseToDistance(ts_phase, unit=unit)
+
+        rows = [(k, "timeseries", ts_distance[i]) for i, k in enumerate(valid)]
+        for fit_model in fit_models:
+            series = f"{fit_model}+seasonal" if fit_seasonal else fit_model
+            for i, k in enumerate(valid):
+                try:
+                    fit_y, _, _ = FittingModels(data.slc_dates_ts, ts_distance[i], model=fit_model).fit(
+                        seasonal=fit_seasonal)
+                except (RuntimeError, ValueError) as e:
+                    # curve_fit does not converge or the time series is not finite
+                    logger.warning(f"cannot fit {series} to point {point_ids[k]}: {e}")
+                    fit_y = np.full(ts_distance.shape[1], np.nan)
+                rows.append((k, series, fit_y))
+        rows.sort(key=lambda row: row[0])
+        columns = {"point_id": [int(point_ids[k]) for k, _, _ in rows],
+                   "ref_point_id": [-1 if ref_point_ids[k] is None else int(ref_point_ids[k]) for k, _, _ in rows],
+                   "x": [int(x[k]) for k, _, _ in rows],
+                   "y": [int(y[k]) for k, _, _ in rows],
+                   "series": [series for _, series, _ in rows]}
+        writer.write(columns, np.array([values for _, _, values in rows], dtype=np.float32))
+        num_written += len(valid)
+        logger.info(f"time series extracted: {min(start + batch_size, len(points))}/{len(points)} points")
+    return num_written
+
+
+def main(iargs=None):
+    """
+    Extract the time series of P2 points without the graphical interface.
+
+    Example:
+        $ cd path/to/sarplotter/app
+        $ python -m src.extract_timeseries path/to/sarvey/processing/directory/sbas points.txt -o ts.csv
+    """
+    parser = argparse.ArgumentParser(description="Extract time series of P2 points to csv, h5 or parquet files.")
+    parser.add_argument("data_path", help="sarvey processing directory")
+    parser.add_argument("point_file", help="text file with one point per line: 'id[, ref_id]' or "
+                                           "'x, y[, x_ref, y_ref]' (see --point_type)")
+    parser.add_argument("-o", "--output", required=True, help="output file")
+    parser.add_argument("--input_path", default=None, help="inputs directory. Default: data_path/inputs")
+    parser.add_argument("--p2_file", default=None, help="p2 file name. Default: first p2*_ts.h5 file")
+    parser.add_argument("--point_type", choices=["id", "range_azimuth"], default="id")
+    parser.add_argument("--reference", default=None,
+                        help="reference point for points without their own reference: 'id' or 'x,y'")
+    parser.add_argument("--format", choices=TS_FORMATS, default=None,
+                        help="output format. Default: from the output file extension")
+    parser.add_argument("--unit", choices=["mm", "cm", "dm", "m"], default="cm")
+    parser.add_argument("--keep_topo_error", action="store_true", help="do not remove the DEM error phase")
+    parser.add_argument("--fit", nargs="*", choices=FIT_MODELS, default=[], help="models fitted to the time series")
+    parser.add_argument("--fit_seasonal", action="store_true", help="fit an annual signal with the models")
+    parser.add_argument("--batch_size", type=int, default=TS_BATCH_SIZE_DEFAULT)
+    args = parser.parse_args(iargs)
+
+    out_format = args.format
+    if out_format is None:
+        out_format = os.path.splitext(args.output)[1].lstrip(".").lower()
+        out_format = "h5" if out_format == "hdf5" else out_format
+        if out_format not in TS_FORMATS:
+            parser.error(f"cannot guess the format of {args.output}. Use --format.")
+
+    data = Data(data_path=args.data_path, input_path=args.input_path)
+    try:
+        if not data.p2_file_exist:
+            logger.error(f"no p2 file found in {args.data_path}")
+            return 1
+        if args.p2_file is not None:
+            if args.p2_file not in data.p2_files:
+                logger.error(f"{args.p2_file} not found. Available: {data.p2_files}")
+                return 1
+            data.updateP2File(data.p2_files.index(args.p2_file))
+
+        if data.slc_dates_ts is None:
+            logger.error(f"the dates of the time series are read from the ifg_network file, not found in "
+                         f"{args.data_path}")
+            return 1
+        points = readPointList(args.point_file, args.point_type, data.point_id_codec)
+        if args.reference is not None:
+            items = [int(item) for item in args.reference.replace(",", " ").split()]
+            reference = items[0] if len(items) == 1 else data.point_id_codec.encode(items[0], items[1])
+            points = [(point_id, reference if ref_point_id is None else ref_point_id)
+                      for point_id, ref_point_id in points]
+
+        dates = [date.strftime("%Y-%m-%d") for date in data.slc_dates_ts]
+        writer = WRITERS[out_format](args.output, dates)
+        try:
+            num_written = extractTimeseries(data, points, writer, unit=args.unit,
+                                            remove_topo_error=not args.keep_topo_error, fit_models=args.fit,
+                                            fit_seasonal=args.fit_seasonal, batch_size=args.batch_size)
+        finally:
+            writer.close()
+        logger.info(f"{num_written} time series written to {args.output}")
+    finally:
+        data.close()
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,181 @@
+import logging
+import threading
+import h5py as h5
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# keep every pixel of the geometry. Larger values keep every n-th line and pixel and interpolate bilinearly
+GEOMETRY_DECIMATION_DEFAULT = 1
+# number of lines read at once while loading the geometry
+GEOMETRY_BLOCK_LINES = 1024
+GEOMETRY_DATASETS = ("slantRangeDistance", "incidenceAngle")
+
+
+def _samples(n: int, decimation: int):
+    """
+    Positions of the kept lines or pixels. The last one is always kept, so no extrapolation is needed.
+    """
+    samples = np.arange(0, n, decimation)
+    if samples[-1] != n - 1:
+        samples = np.append(samples, n - 1)
+    return samples
+
+
+def _factor(slant_range, incidence_angle):
+    return (slant_range * np.sin(np.deg2rad(incidence_angle))).astype(np.float32)
+
+
+class GeometryCache:
+    """
+    This class keeps the slant range and incidence angle of the radar geometry in memory.
+
+    The grids are loaded in a background thread, optionally decimated. The factor slant_range * sin(incidence angle)
+    of the design matrix is computed from them on lookup, so it does not need a third grid. Until the grids are
+    ready, lookups read the pixels from the file, so no lookup waits for them.
+    """
+
+    def __init__(self, file_path: str, h5_pool, decimation: int = GEOMETRY_DECIMATION_DEFAULT):
+        """
+        Initialize the GeometryCache class. Call start() to load the grids in the background.
+
+        :param file_path: Path to the geometryRadar.h5 file.
+        :param h5_pool: H5FilePool used for the pixel reads.
+        :param decimation: Keep every n-th line and pixel. 1 keeps the full resolution.
+        """
+        self.file_path = file_path
+        self.h5_pool = h5_pool
+        self.decimation = max(1, int(decimation))
+        self.grids = None  # {dataset name: grid}
+        self.az_samples = None
+        self.ra_samples = None
+        self.full_resolution = True
+        self.error = None  # exception raised while loading the grids
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def nbytes(self):
+        return 0 if self.grids is None else sum(grid.nbytes for grid in self.grids.values())
+
+    def start(self):
+        """
+        Start loading the grids in a background thread.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._load, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stop loading the grids, e.g. when the cache is replaced.
+        """
+        self._stop.set()
+
+    def ready(self):
+        return self._ready.is_set()
+
+    def wait(self, timeout: float = None):
+        """
+        Start loading the grids if necessary and block until they are ready.
+
+        :return: True if the grids are ready, False if the timeout expired or loading them failed.
+        """
+        self.start()
+        self._ready.wait(timeout)
+        return self.grids is not None
+
+    def _load(self):
+        try:
+            # own handle, the pool is used by the calling thread
+            with h5.File(self.file_path, 'r') as h_file:
+                datasets = {name: h_file[name] for name in GEOMETRY_DATASETS}
+                n_lines, n_pixels = datasets['slantRangeDistance'].shape
+                decimation = self.decimation if min(n_lines, n_pixels) > self.decimation else 1
+                az_samples = _samples(n_lines, decimation)
+                ra_samples = _samples(n_pixels, decimation)
+                grids = {name: np.empty((az_samples.size, ra_samples.size), dtype=np.float32)
+                         for name in GEOMETRY_DATASETS}
+                for start in range(0, az_samples.size, GEOMETRY_BLOCK_LINES):
+                    if self._stop.is_set():
+                        return
+                    lines = az_samples[start:start + GEOMETRY_BLOCK_LINES]
+                    rows = np.s_[lines[0]:lines[-1] + 1, :]
+                    for name, dataset in datasets.items():
+                        grids[name][start:start + lines.size, :] = dataset[rows][lines - lines[0]][:, ra_samples]
+            self.az_samples, self.ra_samples = az_samples, ra_samples
+            self.full_resolution = decimation == 1
+            self.grids = grids
+            logger.info(f"geometry loaded with decimation {decimation}: {self.nbytes / 1024 ** 2:.1f} MiB")
+        except Exception as e:
+            self.error = e
+            logger.error(f"cannot load the geometry of {self.file_path}, reading it per pixel: {e}")
+        finally:
+            self._ready.set()
+
+    def _interpolate(self, grid, az, ra):
+        az = np.asarray(az)
+        ra = np.asarray(ra)
+        if self.full_resolution:
+            return grid[az, ra]
+        i = np.clip(np.searchsorted(self.az_samples, az, side='right') - 1, 0, self.az_samples.size - 2)
+        j = np.clip(np.searchsorted(self.ra_samples, ra, side='right') - 1, 0, self.ra_samples.size - 2)
+        wi = (az - self.az_samples[i]) / (self.az_samples[i + 1] - self.az_samples[i])
+        wj = (ra - self.ra_samples[j]) / (self.ra_samples[j + 1] - self.ra_samples[j])
+        return ((1 - wi) * (1 - wj) * grid[i, j] + (1 - wi) * wj * grid[i, j + 1] +
+                wi * (1 - wj) * grid[i + 1, j] + wi * wj * grid[i + 1, j + 1])
+
+    def _readPixels(self, dataset_name: str, az, ra):
+        """
+        Read pixels from the file. Arrays of pixels are read chunk by chunk, each as the bounding box of its pixels
+        in the chunk, so scattered pixels do not read the area between them. Datasets without chunks are read per
+        line.
+        """
+        az = np.asarray(az)
+        ra = np.asarray(ra)
+        if az.ndim == 0:
+            return self.h5_pool.read(self.file_path, dataset_name, np.s_[int(az), int(ra)])
+        dataset = self.h5_pool.dataset(self.file_path, dataset_name)
+        chunk_shape = dataset.chunks or (1, dataset.shape[1])
+        az, ra = np.broadcast_arrays(az, ra)
+        shape = az.shape
+        az, ra = az.ravel(), ra.ravel()
+        values = np.empty(az.size, dtype=dataset.dtype)
+        chunks, chunk_index = np.unique(np.column_stack([az // chunk_shape[0], ra // chunk_shape[1]]), axis=0,
+                                        return_inverse=True)
+        chunk_index = chunk_index.ravel()
+        for i in range(chunks.shape[0]):
+            pixels = np.nonzero(chunk_index == i)[0]
+            az0, ra0 = int(az[pixels].min()), int(ra[pixels].min())
+            window = self.h5_pool.read(self.file_path, dataset_name,
+                                       np.s_[az0:int(az[pixels].max()) + 1, ra0:int(ra[pixels].max()) + 1])
+            values[pixels] = window[az[pixels] - az0, ra[pixels] - ra0]
+        return values.reshape(shape)
+
+    def _lookup(self, dataset_name: str, az, ra):
+        self.start()
+        if self.ready() and self.grids is not None:
+            return self._interpolate(self.grids[dataset_name], az, ra)
+        return self._readPixels(dataset_name, az, ra)
+
+    def slantRange(self, az, ra):
+        """
+        :param az: Azimuth coordinate(s).
+        :param ra: Range coordinate(s).
+
+        :return: slant range for a pixel or an array of pixels
+        """
+        return self._lookup('slantRangeDistance', az, ra)
+
+    def incidenceAngle(self, az, ra):
+        """
+        :return: incidence angle in degree for a pixel or an array of pixels
+        """
+        return self._lookup('incidenceAngle', az, ra)
+
+    def factorForAzRa(self, az, ra):
+        """
+        :return: slant_range * sin(incidence angle) for a pixel or an array of pixels, as used in the design matrix
+        """
+        return _factor(self.slantRange(az, ra), self.incidenceAngle(az, ra))
@@ -0,0 +1,140 @@
+import os
+import logging
+import h5py as h5
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# default raw data chunk cache of each opened file
+RDCC_NBYTES_DEFAULT = 64 * 1024 ** 2
+RDCC_NSLOTS_DEFAULT = 10007  # should be a prime number, ~100 times the number of chunks that fit in rdcc_nbytes
+RDCC_W0_DEFAULT = 0.75
+
+
+def poolKey(file_path: str):
+    """
+    Key of a file in the pool. Relative, joined and unjoined spellings of the same file share one handle.
+
+    :param file_path: Path to the HDF5 file.
+
+    :return: str
+    """
+    return os.path.normcase(os.path.abspath(file_path))
+
+
+class H5FilePool:
+    """
+    This class keeps HDF5 files open for the lifetime of a dataset instead of reopening them for every read.
+
+    Every file gets its own raw data chunk cache (rdcc_nbytes/rdcc_nslots) which can be tuned per file.
+    The pool counts the handle hits, the file opens and the number of bytes read through it.
+    """
+
+    def __init__(self, *, rdcc_nbytes: int = RDCC_NBYTES_DEFAULT, rdcc_nslots: int = RDCC_NSLOTS_DEFAULT,
+                 rdcc_w0: float = RDCC_W0_DEFAULT):
+        """
+        Initialize the H5FilePool class.
+
+        :param rdcc_nbytes: Default size of the raw data chunk cache of each file in bytes.
+        :param rdcc_nslots: Default number of chunk slots in the raw data chunk cache of each file.
+        :param rdcc_w0: Chunk preemption policy of the raw data chunk cache.
+        """
+        self.rdcc_nbytes = rdcc_nbytes
+        self.rdcc_nslots = rdcc_nslots
+        self.rdcc_w0 = rdcc_w0
+        self.file_cache_parms = {}
+        self.handles = {}
+        self.hits = 0
+        self.opens = 0
+        self.bytes_read = 0
+
+    def setCacheParameters(self, file_path: str, rdcc_nbytes: int = None, rdcc_nslots: int = None):
+        """
+        Set the raw data chunk cache of a single file. An already open handle is closed to apply the new values.
+
+        :param file_path: Path to the HDF5 file.
+        :param rdcc_nbytes: Size of the raw data chunk cache in bytes. If None, the pool default is used.
+        :param rdcc_nslots: Number of chunk slots. If None, the pool default is used.
+        """
+        file_path = poolKey(file_path)
+        self.file_cache_parms[file_path] = {"rdcc_nbytes": rdcc_nbytes or self.rdcc_nbytes,
+                                            "rdcc_nslots": rdcc_nslots or self.rdcc_nslots}
+        self.close(file_path)
+
+    def get(self, file_path: str):
+        """
+        Return an open handle for the file. The file is opened in read mode if it is not already open.
+
+        :param file_path: Path to the HDF5 file.
+
+        :return: h5py.File
+        """
+        file_path = poolKey(file_path)
+        h_file = self.handles.get(file_path)
+        if h_file is not None and h_file.id.valid:
+            self.hits += 1
+            return h_file
+        cache_parms = self.file_cache_parms.get(file_path, {})
+        h_file = h5.File(file_path, 'r',
+                         rdcc_nbytes=cache_parms.get("rdcc_nbytes", self.rdcc_nbytes),
+                         rdcc_nslots=cache_parms.get("rdcc_nslots", self.rdcc_nslots),
+                         rdcc_w0=self.rdcc_w0)
+        self.handles[file_path] = h_file
+        self.opens += 1
+        logger.debug(f"opened {file_path}")
+        return h_file
+
+    def dataset(self, file_path: str, dataset_name: str):
+        """
+        Return a dataset from the pooled handle of the file.
+
+        :param file_path: Path to the HDF5 file.
+        :param dataset_name: Name of the dataset.
+
+        :return: h5py.Dataset
+        """
+        return self.get(file_path)[dataset_name]
+
+    def read(self, file_path: str, dataset_name: str, selection=()):
+        """
+        Read a selection of a dataset through the pooled handle of the file.
+
+        :param file_path: Path to the HDF5 file.
+        :param dataset_name: Name of the dataset.
+        :param selection: Slicing applied to the dataset, e.g. np.s_[az, ra, :]. Default reads the whole dataset.
+
+        :return: numpy.ndarray or scalar
+        """
+        data = self.dataset(file_path, dataset_name)[selection]
+        self.bytes_read += np.asarray(data).nbytes
+        return data
+
+    def close(self, file_path: str = None):
+        """
+        Close one file or all files of the pool.
+
+        :param file_path: Path to the HDF5 file. If None, all files are closed.
+        """
+        if file_path is None:
+            file_paths = list(self.handles.keys())
+        else:
+            file_paths = [poolKey(file_path)]
+        for this_file_path in file_paths:
+            h_file = self.handles.pop(this_file_path, None)
+            if h_file is not None and h_file.id.valid:
+                h_file.close()
+                logger.debug(f"closed {this_file_path}")
+
+    def stats(self):
+        """
+        :return: dict with the number of open files, handle hits, file opens and bytes read.
+        """
+        return {"open_files": len(self.handles),
+                "hits": self.hits,
+                "opens": self.opens,
+                "bytes_read": self.bytes_read}
+
+    def resetStats(self):
+        self.hits = 0
+        self.opens = 0
+        self.bytes_read = 0
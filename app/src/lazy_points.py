@@ -0,0 +1,129 @@
+import copy
+import logging
+import h5py as h5
+import numpy as np
+from sarvey import objects as SarveyObjects
+
+logger = logging.getLogger(__name__)
+
+# datasets of the points file that are loaded eagerly, besides point_id and coord_xy
+POINT_DATASETS_OPTIONAL = ["coord_utm", "coord_lalo", "height", "slant_range", "loc_inc"]
+
+
+class PhaseAccessor:
+    """
+    This class gives indexed access to the phase matrix (points, images) of a points file without loading it.
+
+    If the dataset is stored contiguous and uncompressed, it is memory mapped. Otherwise, the requested rows
+    are read from the hdf5 file.
+    """
+
+    def __init__(self, file_path: str, dataset_name: str = "phase", h5_pool=None):
+        """
+        Initialize the PhaseAccessor class.
+
+        :param file_path: Path to the points file.
+        :param dataset_name: Name of the phase dataset.
+        :param h5_pool: Optional H5FilePool used for the hdf5 reads. If None, the file is opened on each read.
+        """
+        self.file_path = file_path
+        self.dataset_name = dataset_name
+        self.h5_pool = h5_pool
+        self.memmap = None
+        with h5.File(file_path, 'r') as h_file:
+            dataset = h_file[dataset_name]
+            self.shape = dataset.shape
+            self.dtype = dataset.dtype
+            offset = dataset.id.get_offset()
+            if dataset.chunks is None and dataset.compression is None and offset is not None:
+                self.memmap = np.memmap(file_path, dtype=self.dtype, mode='r', offset=offset, shape=self.shape)
+        logger.debug(f"phase of {file_path}: {self.shape}, memory mapped: {self.memmap is not None}")
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, selection):
+        if self.memmap is not None:
+            return np.array(self.memmap[selection])
+        if self.h5_pool is not None:
+            return self.h5_pool.read(self.file_path, self.dataset_name, selection)
+        with h5.File(self.file_path, 'r') as h_file:
+            return h_file[self.dataset_name][selection]
+
+    def __array__(self, dtype=None, copy=None):
+        logger.warning(f"loading the full phase matrix of {self.file_path} into memory")
+        phase = self[:, :]
+        return phase if dtype is None else phase.astype(dtype)
+
+    def readRows(self, idx):
+        """
+        Read a set of rows in one selection. The indices do not need to be sorted or unique.
+
+        :param idx: Row (point) indices.
+
+        :return: numpy.ndarray with shape (len(idx), images)
+        """
+        idx = np.asarray(idx, dtype=np.int64)
+        idx_unique, idx_inverse = np.unique(idx, return_inverse=True)
+        return self[idx_unique, :][idx_inverse]
+
+
+class LazyPoints(SarveyObjects.Points):
+    """
+    This class is a sarvey Points object that keeps the phase matrix on disk.
+
+    Coordinates and per-point scalars are loaded on open. The phase is a PhaseAccessor that reads rows on demand.
+    """
+
+    def __init__(self, *, file_path: str, logger, h5_pool=None):
+        super().__init__(file_path=file_path, logger=logger)
+        self.h5_pool = h5_pool
+
+    def open(self, input_path: str, other_file_path: str = None):
+        """
+        Read the ifg network, coordinates and per-point scalars. The phase stays on disk.
+
+        :param input_path: Path to the inputs directory with the geometry files.
+        :param other_file_path: Optional path to read instead of self.file_path.
+        """
+        path = self.file_path if other_file_path is None else other_file_path
+        self.ifg_net_obj.open(path=path)
+        with h5.File(path, 'r') as h_file:
+            self.point_id = h_file["point_id"][:]
+            self.coord_xy = h_file["coord_xy"][:]
+            for name in POINT_DATASETS_OPTIONAL:
+                setattr(self, name, h_file[name][:] if name in h_file else None)
+        self.phase = PhaseAccessor(path, h5_pool=self.h5_pool)
+        self.num_points = self.phase.shape[0]
+        if self.coord_utm is None or self.slant_range is None or self.loc_inc is None:
+            self.openExternalData(input_path=input_path)
+
+    def residentNbytes(self):
+        """
+        :return: int memory in bytes of the arrays loaded in memory. A phase kept on disk is not counted.
+        """
+        return sum(value.nbytes for value in vars(self).values() if isinstance(value, np.ndarray))
+
+    def subset(self, start: int, stop: int):
+        """
+        Return a shallow copy of the points [start:stop] with the phase loaded into memory.
+        Per-point arrays are sliced, everything else is shared.
+
+        :param start: First point index.
+        :param stop: Last point index (exclusive).
+
+        :return: LazyPoints
+        """
+        block = copy.copy(self)
+        for name, value in vars(self).items():
+            if isinstance(value, np.ndarray) and value.ndim > 0 and value.shape[0] == self.num_points:
+                setattr(block, name, value[start:stop])
+        block.phase = self.phase[start:stop, :]
+        # the block does not read from disk and can be sent to other processes
+        block.h5_pool = None
+        block.num_points = block.phase.shape[0]
+        return block
@@ -14,6 +14,7 @@ from app.src.widget.widget_pointlist_actions import connectPointsListWidgetSigna
 from app.src.widget.widget_setting_tab_network import connectNetworkType
 from app.src.widget.shortcuts import connectShortcuts
 from app.src.widget import set_canvas
+from app.src.widget.progress import ProgressDialog
 from app.src.widget.check_existing_data import checkExistingData
 
 
@@ -42,6 +43,7 @@ class MainWindow(QMainWindow):
         self.plot = Plot(data=self.data)
         self.plot.list_widget_clicked_points = self.points_widget.list_widget_clicked_points
         self.plot.status_bar = self.ui.statusBar()
+        self.plot.progress_dialog = lambda label: ProgressDialog(self.ui, label, cancelable=False)
         self.plot.combo_box_amplitude_dates = self.setting_widget.tab_map_combo_box_amplitude_dates
 
         set_canvas.setup(self)
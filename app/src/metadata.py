@@ -0,0 +1,143 @@
+import os
+import json
+import logging
+from datetime import datetime
+import numpy as np
+from .sidecar import fileIdentity, identityMatches
+
+logger = logging.getLogger(__name__)
+
+METADATA_FILE = "metadata.json"
+METADATA_VERSION = 2
+
+
+class DatasetMetadata:
+    """
+    This class is a snapshot of the dataset metadata: dates, baselines, interferogram network, dimensions,
+    wavelength, orbit and the identity of the files it was collected from.
+
+    It is collected once from slcStack.h5 and ifg_network.h5 and cached in a json sidecar.
+    """
+
+    def __init__(self):
+        self.wavelength = None
+        self.orbit_direction = None
+        self.slc_dimension = None
+        self.slc_dates = None  # yyyymmdd strings
+        self.slc_pbase = None
+        self.ifg_network_dates = None  # yyyy-mm-dd strings
+        self.ifg_network = None  # {dataset or attribute name of ifg_network.h5: value}
+        self.files = {}  # {file path: identity or None if missing}
+
+    @classmethod
+    def collect(cls, h5_pool, slc_stack_file: str, ifg_network_file: str = None, inventory: list = ()):
+        """
+        Read the metadata from the dataset files.
+
+        :param h5_pool: H5FilePool used to read the files.
+        :param slc_stack_file: Path to slcStack.h5.
+        :param ifg_network_file: Path to ifg_network.h5 or None if not available.
+        :param inventory: Paths of further files whose existence is recorded.
+
+        :return: DatasetMetadata
+        """
+        metadata = cls()
+        h_file = h5_pool.get(slc_stack_file)
+        metadata.wavelength = float(h_file.attrs['WAVELENGTH'])
+        orbit_direction = h_file.attrs["ORBIT_DIRECTION"]
+        if isinstance(orbit_direction, bytes):
+            orbit_direction = orbit_direction.decode('utf-8')
+        metadata.orbit_direction = orbit_direction.lower()
+        metadata.slc_dimension = [int(n) for n in h_file['slc'].shape]
+        metadata.slc_dates = [date.decode('utf-8') for date in h_file['date'][:]]
+        metadata.slc_pbase = [float(pbase) for pbase in h_file['bperp'][:]]
+        if ifg_network_file is not None:
+            metadata.ifg_network = _readIfgNetwork(h5_pool.get(ifg_network_file))
+            metadata.ifg_network_dates = metadata.ifg_network.get('dates')
+        for file_path in [slc_stack_file, ifg_network_file, *inventory]:
+            if file_path is not None:
+                metadata.files[os.path.abspath(file_path)] = \
+                    fileIdentity(file_path) if os.path.exists(file_path) else None
+        return metadata
+
+    def slcTbase(self, index=None):
+        """
+        :param index: Indices of the selected dates. Default selects all dates.
+
+        :return: numpy.ndarray, temporal baselines of the slc dates in years since the first date.
+        """
+        dates = [datetime.strptime(date, "%Y%m%d") for date in self.slc_dates]
+        tbase = np.array([(date - dates[0]).days / 365.25 for date in dates])
+        return tbase if index is None else tbase[index]
+
+    def isValid(self):
+        """
+        :return: True if every recorded file still exists, or is still missing, with the same size and mtime.
+        """
+        for file_path, identity in self.files.items():
+            if identity is None:
+                if os.path.exists(file_path):
+                    return False
+            elif not identityMatches(identity, file_path):
+                return False
+        return True
+
+    def toDict(self):
+        return dict(vars(self), version=METADATA_VERSION)
+
+    @classmethod
+    def fromDict(cls, values: dict):
+        metadata = cls()
+        for key in vars(metadata):
+            setattr(metadata, key, values[key])
+        return metadata
+
+
+def _readIfgNetwork(h_file):
+    """
+    Read the datasets and attributes of ifg_network.h5 into json serializable values.
+    """
+    values = {}
+    for name, value in [*h_file.attrs.items(), *((name, h_file[name][()]) for name in h_file)]:
+        value = np.asarray(value)
+        if value.dtype.kind in ('S', 'O'):
+            value = value.astype(str)
+        values[name] = value.tolist()
+    return values
+
+
+def loadMetadata(cache_file: str, h5_pool, slc_stack_file: str, ifg_network_file: str = None,
+                 inventory: list = ()):
+    """
+    Return the metadata snapshot from the sidecar if it is valid, collect and write it otherwise.
+
+    :param cache_file: Path to the json sidecar or None to not cache the snapshot.
+    :param h5_pool: H5FilePool used to read the files.
+    :param slc_stack_file: Path to slcStack.h5.
+    :param ifg_network_file: Path to ifg_network.h5 or None if not available.
+    :param inventory: Paths of further files whose existence is recorded.
+
+    :return: DatasetMetadata
+    """
+    files = {os.path.abspath(path) for path in [slc_stack_file, ifg_network_file, *inventory] if path is not None}
+    if cache_file is not None and os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'r') as f:
+                values = json.load(f)
+            if values.get("version") == METADATA_VERSION:
+                metadata = DatasetMetadata.fromDict(values)
+                if set(metadata.files) == files and metadata.isValid():
+                    logger.info(f"metadata read from {cache_file}")
+                    return metadata
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"cannot read {cache_file}: {e}")
+    metadata = DatasetMetadata.collect(h5_pool, slc_stack_file, ifg_network_file, inventory)
+    if cache_file is not None:
+        tmp_file = cache_file + ".tmp"
+        try:
+            with open(tmp_file, 'w') as f:
+                json.dump(metadata.toDict(), f)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            logger.warning(f"cannot write {cache_file}: {e}")
+    return metadata
@@ -0,0 +1,143 @@
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import h5py as h5
+import numpy as np
+from sarvey import utils as ut
+from .sidecar import fileIdentity, identityMatches, datasetDigest
+
+logger = logging.getLogger(__name__)
+
+P2_PARAMETERS_SUFFIX = "_parameters.h5"
+P2_PARAMETER_NAMES = ("velocity", "demerr", "coherence")
+# number of points estimated by one worker task
+P2_PARALLEL_BLOCK_SIZE = 20000
+# number of blocks per worker loaded and queued at once. Bounds the memory of the main process.
+P2_BLOCKS_IN_FLIGHT_PER_WORKER = 2
+
+
+def parametersFileName(p2_file: str):
+    """
+    :return: str name of the parameters sidecar of a p2 file, e.g. p2_coh80_ts_parameters.h5
+    """
+    return os.path.splitext(os.path.basename(p2_file))[0] + P2_PARAMETERS_SUFFIX
+
+
+def readParametersSidecar(sidecar_file: str, p2_file: str):
+    """
+    Read the velocity, DEM error and temporal coherence estimated for a p2 file.
+
+    The sidecar is used if size and modification time of the p2 file are unchanged. Otherwise, the content hash
+    of the phase is compared, so a copied or touched p2 file does not need a new estimation.
+
+    :param sidecar_file: Path to the parameters sidecar.
+    :param p2_file: Path to the p2 file.
+
+    :return: dict {velocity, demerr, coherence} or None if the sidecar is missing or outdated.
+    """
+    if not os.path.exists(sidecar_file):
+        return None
+    try:
+        with h5.File(sidecar_file, 'r') as h_file:
+            unchanged = identityMatches(h_file.attrs, p2_file)
+            if not unchanged and h_file.attrs.get("phase_digest") != datasetDigest(p2_file, 'phase'):
+                logger.warning(f"{sidecar_file} is outdated and is ignored.")
+                return None
+            parameters = {name: h_file[name][:] for name in P2_PARAMETER_NAMES}
+    except (OSError, KeyError) as e:
+        logger.warning(f"cannot read {sidecar_file}: {e}")
+        return None
+    if not unchanged:
+        logger.info(f"{p2_file} changed on disk but its phase is unchanged")
+        try:
+            with h5.File(sidecar_file, 'a') as h_file:
+                h_file.attrs.update(fileIdentity(p2_file))
+        except OSError as e:
+            logger.warning(f"cannot update {sidecar_file}: {e}")
+    return parameters
+
+
+def writeParametersSidecar(sidecar_file: str, p2_file: str, parameters: dict):
+    """
+    Write the velocity, DEM error and temporal coherence estimated for a p2 file.
+    The file is written to a temporary name first and renamed when complete.
+
+    :param sidecar_file: Path to the parameters sidecar.
+    :param p2_file: Path to the p2 file.
+    :param parameters: dict {velocity, demerr, coherence}
+    """
+    tmp_file = sidecar_file + ".tmp"
+    try:
+        with h5.File(tmp_file, 'w') as h_file:
+            for name in P2_PARAMETER_NAMES:
+                h_file.create_dataset(name, data=np.asarray(parameters[name]))
+            h_file.attrs.update(fileIdentity(p2_file))
+            h_file.attrs["phase_digest"] = datasetDigest(p2_file, 'phase')
+        os.replace(tmp_file, sidecar_file)
+    except OSError as e:
+        logger.warning(f"cannot write {sidecar_file}: {e}")
+        return
+    logger.info(f"p2 parameters written to {sidecar_file}")
+
+
+def _estimateBlock(block):
+    """
+    Estimate the parameters of one block of points in a worker process.
+    """
+    velocity, demerr, _, coherence, _, _ = ut.estimateParameters(obj=block, ifg_space=False)
+    return {"velocity": velocity, "demerr": demerr, "coherence": coherence}
+
+
+def estimateParameters(points, block_size: int = P2_PARALLEL_BLOCK_SIZE, num_workers: int = None, progress=None):
+    """
+    Estimate velocity, DEM error and temporal coherence of points block by block in a process pool.
+
+    The phase of a block is loaded only when the block is submitted and at most
+    P2_BLOCKS_IN_FLIGHT_PER_WORKER blocks per worker are queued, so the memory is bounded by the block size.
+    Results are written into the output arrays as the blocks complete.
+
+    :param points: LazyPoints instance.
+    :param block_size: Number of points per block.
+    :param num_workers: Number of worker processes. Default: number of cpus. With 1, the blocks are estimated
+                        in the calling process.
+    :param progress: Optional function called with (number of estimated points, number of points).
+
+    :return: dict {velocity, demerr, coherence}
+    """
+    num_workers = (os.cpu_count() or 1) if num_workers is None else num_workers
+    num_points = points.num_points
+    starts = list(range(0, num_points, block_size))
+    parameters = {name: np.full(num_points, np.nan, dtype=np.float64) for name in P2_PARAMETER_NAMES}
+    num_done = 0
+
+    def _store(start, result):
+        nonlocal num_done
+        stop = min(start + block_size, num_points)
+        for name in P2_PARAMETER_NAMES:
+            parameters[name][start:stop] = result[name]
+        num_done += stop - start
+        logger.info(f"estimating p2 parameters: {num_done}/{num_points} points")
+        if progress is not None:
+            progress(num_done, num_points)
+
+    if num_workers <= 1 or len(starts) <= 1:
+        for start in starts:
+            _store(start, _estimateBlock(points.subset(start, min(start + block_size, num_points))))
+        return parameters
+
+    # spawn: forking a process with a running Qt application is not safe
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=num_workers, mp_context=context) as executor:
+        pending = {}
+        next_block = 0
+        while next_block < len(starts) or pending:
+            while next_block < len(starts) and len(pending) < num_workers * P2_BLOCKS_IN_FLIGHT_PER_WORKER:
+                start = starts[next_block]
+                block = points.subset(start, min(start + block_size, num_points))
+                pending[executor.submit(_estimateBlock, block)] = start
+                next_block += 1
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                _store(pending.pop(future), future.result())
+    return parameters
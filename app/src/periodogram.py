@@ -0,0 +1,183 @@
+import sys
+import time
+import argparse
+import logging
+import numpy as np
+import scipy.fft
+from .coherence_search import TemporalCoherenceEngine
+
+logger = logging.getLogger(__name__)
+
+# number of samples per parameter of the periodogram grid. Powers of two keep the FFT fast
+PERIODOGRAM_NUM_SAMPLES = 1024
+# the periodogram costs about the same for any number of ifgs, the matrix product of the same grid grows with them.
+# The periodogram is faster above about this number of ifgs, for 256 as for 1024 samples (see benchmarkPeriodogram)
+PERIODOGRAM_BREAK_EVEN_IFGS = 2000
+# oversampling of the FFT grid and half width of the Gaussian kernel in grid points, see Greengard and Lee (2004).
+# 2 and 6 give about 6 correct digits
+NUFFT_OVERSAMPLING = 2
+NUFFT_SPREAD = 6
+
+
+def _spreadWeights(x, num_grid: int, spread: int, tau: float):
+    """
+    Grid positions and Gaussian weights of sources at x in [0, 2 * pi).
+
+    :return: tuple of numpy.ndarray (sources, 2 * spread) with the wrapped grid indices and the weights
+    """
+    nearest = np.floor(x * num_grid / (2 * np.pi)).astype(np.int64)
+    offsets = np.arange(-spread + 1, spread + 1)
+    grid_idx = nearest[:, np.newaxis] + offsets[np.newaxis, :]
+    distance = 2 * np.pi * grid_idx / num_grid - x[:, np.newaxis]
+    return np.mod(grid_idx, num_grid), np.exp(-distance ** 2 / (4 * tau))
+
+
+def nufftGrid(weights, freq_x, freq_y, x0: float, dx: float, num_x: int, y0: float, dy: float, num_y: int,
+              oversampling: int = NUFFT_OVERSAMPLING, spread: int = NUFFT_SPREAD):
+    """
+    Evaluate F[i, j] = sum_k weights[k] * exp(-1j * (freq_x[k] * (x0 + j * dx) + freq_y[k] * (y0 + i * dy)))
+    on a uniform grid with a type 1 non-uniform FFT (Gaussian gridding, Greengard and Lee 2004).
+
+    The sources are spread with a Gaussian kernel onto an oversampled uniform grid, which is transformed with one
+    FFT and divided by the transform of the kernel. The cost is O(num_x * num_y * log(num_x * num_y) + sources),
+    independent of the product of both.
+
+    :param weights: numpy.ndarray (sources,) of complex weights.
+    :param freq_x: numpy.ndarray (sources,) of the frequencies along x.
+    :param freq_y: numpy.ndarray (sources,) of the frequencies along y.
+    :param x0: First sample along x.
+    :param dx: Sample spacing along x.
+    :param num_x: Number of samples along x.
+    :param y0: First sample along y.
+    :param dy: Sample spacing along y.
+    :param num_y: Number of samples along y.
+    :param oversampling: Oversampling of the FFT grid.
+    :param spread: Half width of the kernel in grid points.
+
+    :return: numpy.ndarray (num_y, num_x) complex128
+    """
+    freq_x = np.asarray(freq_x, dtype=np.float64)
+    freq_y = np.asarray(freq_y, dtype=np.float64)
+    # shift the output to the modes -num/2 ... num/2 - 1 and the sources to [0, 2 * pi)
+    half_x, half_y = num_x // 2, num_y // 2
+    phase_x = np.mod(freq_x * dx, 2 * np.pi)
+    phase_y = np.mod(freq_y * dy, 2 * np.pi)
+    weights = (np.asarray(weights, dtype=np.complex128) * np.exp(-1j * (freq_x * x0 + freq_y * y0)) *
+               np.exp(-1j * (phase_x * half_x + phase_y * half_y)))
+
+    grid_x, grid_y = oversampling * num_x, oversampling * num_y
+    ratio = np.pi / (oversampling * (oversampling - 0.5)) * spread
+    tau_x, tau_y = ratio / num_x ** 2, ratio / num_y ** 2
+    idx_x, kernel_x = _spreadWeights(phase_x, grid_x, spread, tau_x)
+    idx_y, kernel_y = _spreadWeights(phase_y, grid_y, spread, tau_y)
+    flat_idx = (idx_y[:, :, np.newaxis] * grid_x + idx_x[:, np.newaxis, :]).ravel()
+    values = (weights[:, np.newaxis, np.newaxis] * kernel_y[:, :, np.newaxis] * kernel_x[:, np.newaxis, :]).ravel()
+    spread_grid = (np.bincount(flat_idx, weights=values.real, minlength=grid_x * grid_y) +
+                   1j * np.bincount(flat_idx, weights=values.imag, minlength=grid_x * grid_y))
+    # single precision keeps the error below 1e-5 and halves the time of the FFT
+    spectrum = scipy.fft.fft2(spread_grid.reshape(grid_y, grid_x).astype(np.complex64), workers=-1)
+    spectrum = spectrum.astype(np.complex128) / (grid_x * grid_y)
+
+    modes_x = np.arange(num_x) - half_x
+    modes_y = np.arange(num_y) - half_y
+    spectrum = spectrum[np.ix_(np.mod(modes_y, grid_y), np.mod(modes_x, grid_x))]
+    deconvolution_x = np.sqrt(np.pi / tau_x) * np.exp(modes_x ** 2 * tau_x)
+    deconvolution_y = np.sqrt(np.pi / tau_y) * np.exp(modes_y ** 2 * tau_y)
+    return spectrum * deconvolution_y[:, np.newaxis] * deconvolution_x[np.newaxis, :]
+
+
+def periodogramSearch(design_matrix, ifg_phase, demerr_range, vel_range):
+    """
+    Temporal coherence of a DEM error and velocity grid evaluated as the periodogram of exp(1j * ifg_phase) at the
+    design matrix frequencies with nufftGrid. It is faster than TemporalCoherenceEngine.gammaGrid on the same grid
+    only above about PERIODOGRAM_BREAK_EVEN_IFGS ifgs, below it is up to ten times slower.
+
+    :param design_matrix: numpy.ndarray (ifgs, 2) with the DEM error and velocity columns.
+    :param ifg_phase: numpy.ndarray (ifgs,) of the interferometric phase.
+    :param demerr_range: numpy.ndarray of uniformly spaced DEM error samples.
+    :param vel_range: numpy.ndarray of uniformly spaced velocity samples.
+
+    :return: tuple (demerr, velocity, temporal coherence, numpy.ndarray (velocity samples, demerr samples) float32)
+    """
+    obs = np.exp(1j * np.asarray(ifg_phase, dtype=np.float64))
+    step_demerr = (demerr_range[-1] - demerr_range[0]) / max(demerr_range.size - 1, 1)
+    step_vel = (vel_range[-1] - vel_range[0]) / max(vel_range.size - 1, 1)
+    gamma_grid = np.abs(nufftGrid(obs, design_matrix[:, 0], design_matrix[:, 1],
+                                  demerr_range[0], step_demerr, demerr_range.size,
+                                  vel_range[0], step_vel, vel_range.size)) / obs.size
+    gamma_grid = np.clip(gamma_grid, 0, 1).astype(np.float32)
+    idx_vel, idx_demerr = np.unravel_index(np.argmax(gamma_grid), gamma_grid.shape)
+    return demerr_range[idx_demerr], vel_range[idx_vel], float(gamma_grid[idx_vel, idx_demerr]), gamma_grid
+
+
+def benchmarkPeriodogram(num_ifgs: int = 200, num_samples: int = PERIODOGRAM_NUM_SAMPLES, num_trials: int = 5,
+                         seed: int = 0, demerr_bound: float = 150, vel_bound: float = 0.05, noise: float = 0.5):
+    """
+    Compare the periodogram with the matrix product of TemporalCoherenceEngine on the same grid for simulated arcs
+    with a Sentinel-1 like geometry.
+
+    :return: dict {method: (mean seconds per arc, max |gamma grid - exact|, max demerr error, max velocity error)}
+    """
+    rng = np.random.default_rng(seed)
+    wavelength = 0.0555
+    design_matrix = np.zeros((num_ifgs, 2))
+    design_matrix[:, 0] = -4 * np.pi / wavelength * rng.uniform(-200, 200, num_ifgs) / (850e3 * np.sin(0.6))
+    design_matrix[:, 1] = -4 * np.pi / wavelength * rng.uniform(-5, 5, num_ifgs)
+    demerr_range = np.linspace(-demerr_bound, demerr_bound, num_samples)
+    vel_range = np.linspace(-vel_bound, vel_bound, num_samples)
+    engine = TemporalCoherenceEngine()
+    engine.configure(design_matrix, demerr_range, vel_range)
+
+    results = {"periodogram": [], "grid": []}
+    for _ in range(num_trials):
+        demerr_true, vel_true = rng.uniform(-0.9, 0.9) * demerr_bound, rng.uniform(-0.9, 0.9) * vel_bound
+        ifg_phase = np.angle(np.exp(1j * (design_matrix @ [demerr_true, vel_true] +
+                                          rng.normal(0, noise, num_ifgs))))
+        start = time.perf_counter()
+        exact = engine.gammaGrid(ifg_phase)
+        idx_vel, idx_demerr = np.unravel_index(np.argmax(exact), exact.shape)
+        results["grid"].append((time.perf_counter() - start, 0., demerr_range[idx_demerr], vel_range[idx_vel]))
+        optimum = (demerr_range[idx_demerr], vel_range[idx_vel])
+
+        start = time.perf_counter()
+        demerr, vel, _, gamma_grid = periodogramSearch(design_matrix, ifg_phase, demerr_range, vel_range)
+        results["periodogram"].append((time.perf_counter() - start, float(np.max(np.abs(gamma_grid - exact))),
+                                       demerr, vel))
+        for method in results:
+            seconds, gamma_error, demerr, vel = results[method][-1]
+            results[method][-1] = (seconds, gamma_error, abs(demerr - optimum[0]), abs(vel - optimum[1]))
+    return {method: (float(np.mean([r[0] for r in values])), *[float(np.max([r[i] for r in values]))
+                                                              for i in range(1, 4)])
+            for method, values in results.items()}
+
+
+def main(iargs=None):
+    """
+    Benchmark the periodogram solver.
+
+    Example:
+        $ cd path/to/sarplotter/app
+        $ python -m src.periodogram --num_ifgs 300 --num_samples 1024
+    """
+    parser = argparse.ArgumentParser(description="Compare speed and accuracy of the periodogram solver of temporal "
+                                                 "unwrapping with the grid search on simulated arcs.")
+    parser.add_argument("--num_ifgs", type=int, default=200)
+    parser.add_argument("--num_samples", type=int, default=PERIODOGRAM_NUM_SAMPLES,
+                        help="samples per parameter of the grid")
+    parser.add_argument("--num_trials", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(iargs)
+
+    results = benchmarkPeriodogram(num_ifgs=args.num_ifgs, num_samples=args.num_samples,
+                                   num_trials=args.num_trials, seed=args.seed)
+    print(f"{args.num_ifgs} ifgs, {args.num_samples} x {args.num_samples} grid, {args.num_trials} arcs")
+    print(f"{'method':<12} {'ms per arc':>10} {'max gamma error':>16} {'max demerr error [m]':>21} "
+          f"{'max vel error [mm/yr]':>22}")
+    for method, (seconds, gamma_error, demerr_error, vel_error) in results.items():
+        print(f"{method:<12} {seconds * 1000:>10.1f} {gamma_error:>16.2e} {demerr_error:>21.3f} "
+              f"{vel_error * 1000:>22.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,7 @@ from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 import logging
 from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
+from matplotlib.widgets import RectangleSelector, PolygonSelector
 import numpy as np
 from .marker import Marker, LineMarker
 from .plot_timeseries  import TimeseriesPlot
@@ -85,8 +86,9 @@ class Plot:
         self.figure = None
         self.ax = None
         self.map_toolbar = None
-        self.initMainFigure()
         self.background_plot = None
+        self.background_view = None
+        self.initMainFigure()
         self.setupBackground()
         self.plotBackground()
         # markers
@@ -100,6 +102,13 @@ class Plot:
         self.p2_plot = None
 
         self.p2_cbar = None
+        # region of interest
+        self.roi_selector = None
+        self.roi_plot = None
+        self.roi_cbar = None
+        self.roi_result = None  # rasters of the last temporal unwrapping of a region
+        # function (label) returning a progress callback for long jobs, set by the main window
+        self.progress_dialog = None
 
         # amplitude plot
         self.combo_box_amplitude_dates = None
@@ -139,6 +148,7 @@ class Plot:
         self.map_toolbar.setFixedHeight(self.parms.mpl_toolbar_height)
         self.canvas.mpl_connect("button_press_event", lambda event: self.onClickMap(event))
         self.canvas.mpl_connect('motion_notify_event', lambda event: self.onHoverMap(event))
+        self.canvas.mpl_connect('draw_event', lambda event: self.updateBackgroundView())
         self.canvas.draw_idle()
 
     def setupAmplitudeList(self):
@@ -149,6 +159,8 @@ class Plot:
         if self.data.no_background is None:
             self.data.no_background = np.ones(self.data.slc_dimension[1:])
         self.background_plot = self.ax.imshow(self.data.no_background, cmap=self.parms.background_cmap)
+        # keep the view when the background extent changes to a window of the pyramid
+        self.ax.set_autoscale_on(False)
 
         if self.data.orbit_direction.lower().startswith('a'):
             self.ax.invert_yaxis()
@@ -170,12 +182,17 @@ class Plot:
         """
         Updates the background plot with data.mean_amplitude.
         If mean_amplitude data is not already loaded, it is read the data source.
+        If the background pyramid is available, only the visible window is read at the resolution of the view.
 
         """
-        if self.data.mean_amplitude is None:
-            self.data.mean_amplitude = self.data.readMeanAmplitude()
-        self.background_plot.set_data(self.data.mean_amplitude)
-        self.background_plot.set_clim(np.nanmin(self.data.mean_amplitude), np.nanmax(self.data.mean_amplitude))
+        if self.updateBackgroundView(force=True):
+            overview = self.data.readBackgroundOverview("mean amplitude")
+            self.background_plot.set_clim(np.nanmin(overview), np.nanmax(overview))
+        else:
+            if self.data.mean_amplitude is None:
+                self.data.mean_amplitude = self.data.readMeanAmplitude()
+            self._setFullBackground(self.data.mean_amplitude)
+            self.background_plot.set_clim(np.nanmin(self.data.mean_amplitude), np.nanmax(self.data.mean_amplitude))
         self.background_plot.set_cmap(self.parms.background_cmap)
         self.plotStretch(None, "mean amplitude")
         self.canvas.draw_idle()
@@ -184,22 +201,27 @@ class Plot:
         """
         Updates the background plot with one amplitude image.
         If amplitude data is not already loaded, it is read the data source.
+        If the background pyramid is available, only the visible window is read at the resolution of the view.
 
         """
         if ind is not None:
             self.parms.background_amplitude_ind = ind
 
-        if self.parms.background_amplitude_n_average == 0:
+        if self.updateBackgroundView(force=True):
+            slc_inds = self.amplitudeIndices()
+            amplitude = self.data.readBackgroundOverview("amplitude", slc_inds)
+        elif self.parms.background_amplitude_n_average == 0:
             amplitude, _ = self.data.readAmplitudeFromSlc(self.parms.background_amplitude_ind)
             slc_inds = [self.parms.background_amplitude_ind]
+            self._setFullBackground(amplitude)
         else:
             ind1 = self.parms.background_amplitude_ind
             ind2 = ind1 + self.parms.background_amplitude_n_average
             inds = np.sort([ind1, ind2])
             slc_inds = np.arange(inds[0], inds[1]+1)
             amplitude, slc_inds = self.data.readAmplitudeFromSlc(slc_inds)
+            self._setFullBackground(amplitude)
 
-        self.background_plot.set_data(amplitude)
         self.background_plot.set_clim(np.nanmin(amplitude), np.nanmax(amplitude))
         self.background_plot.set_cmap(self.parms.background_cmap)
         if self.plot_network.parms.plot_enable:
@@ -208,6 +230,16 @@ class Plot:
         self.plotStretch(None, "amplitude")
         self.canvas.draw_idle()
 
+    def amplitudeIndices(self):
+        """
+        :return: numpy.ndarray of the slc indices averaged for the amplitude background.
+        """
+        ind1 = self.parms.background_amplitude_ind
+        ind2 = ind1 + self.parms.background_amplitude_n_average
+        inds = np.sort([ind1, ind2])
+        slc_inds = np.arange(inds[0], inds[1] + 1)
+        return slc_inds[(slc_inds >= 0) & (slc_inds < len(self.data.slc_dates))]
+
     def plotAmplitudeWithLocalAverage(self, ind):
         if self.parms.background_type.lower() == "amplitude":
             self.parms.background_amplitude_n_average = ind
@@ -217,16 +249,68 @@ class Plot:
         """
         Updates the background plot with data.temporal_coherence.
         If temporal coherence data is not already loaded, it is read the data source.
+        If the background pyramid is available, only the visible window is read at the resolution of the view.
 
         """
-        if self.data.temporal_coherence is None:
-            self.data.readTemporalCoherence()
-        self.background_plot.set_data(self.data.temporal_coherence)
-        self.background_plot.set_clim(np.nanmin(self.data.temporal_coherence), np.nanmax(self.data.temporal_coherence))
+        if self.updateBackgroundView(force=True):
+            overview = self.data.readBackgroundOverview("temporal coherence")
+            self.background_plot.set_clim(np.nanmin(overview), np.nanmax(overview))
+        else:
+            if self.data.temporal_coherence is None:
+                self.data.readTemporalCoherence()
+            self._setFullBackground(self.data.temporal_coherence)
+            self.background_plot.set_clim(np.nanmin(self.data.temporal_coherence),
+                                          np.nanmax(self.data.temporal_coherence))
         self.background_plot.set_cmap(self.parms.background_cmap)
         self.plotStretch(None, "temporal coherence")
         self.canvas.draw_idle()
 
+    def updateBackgroundView(self, force=False):
+        """
+        Read the visible window of the background from the pyramid at the level matching the current zoom.
+        It is called on every draw and reads only if the view moved to another window or level.
+
+        :param force: Read even if the window and level did not change, e.g. when the background type changed.
+
+        :return: True if the background is served from the pyramid, False otherwise.
+        """
+        if self.background_plot is None:
+            return False
+        product = self.parms.background_type.lower()
+        pyramid = self.data.readBackgroundPyramid()
+        if pyramid is None or not pyramid.hasProduct(product):
+            return False
+
+        n_lines, n_pixels = self.data.slc_dimension[1:]
+        x_lim, y_lim = np.sort(self.ax.get_xlim()), np.sort(self.ax.get_ylim())
+        x0, x1 = np.clip([int(np.floor(x_lim[0] + 0.5)), int(np.ceil(x_lim[1] + 0.5))], 0, n_pixels)
+        y0, y1 = np.clip([int(np.floor(y_lim[0] + 0.5)), int(np.ceil(y_lim[1] + 0.5))], 0, n_lines)
+        if x1 <= x0 or y1 <= y0:
+            return True
+        bbox = self.ax.bbox
+        pixels_per_screen_pixel = min((x1 - x0) / max(bbox.width, 1), (y1 - y0) / max(bbox.height, 1))
+        factor = pyramid.selectFactor(product, pixels_per_screen_pixel)
+        ind = self.amplitudeIndices() if product == "amplitude" else None
+
+        view = (product, None if ind is None else tuple(ind), factor,
+                y0 // factor, -(-y1 // factor), x0 // factor, -(-x1 // factor))
+        if not force and view == self.background_view:
+            return True
+        image, (y0, y1, x0, x1) = self.data.readBackgroundWindow(product, factor, y0, y1, x0, x1, ind=ind)
+        self.background_view = view
+        self.background_plot.set_data(image)
+        self.background_plot.set_extent((x0 - 0.5, x1 - 0.5, y1 - 0.5, y0 - 0.5))
+        self.canvas.draw_idle()
+        return True
+
+    def _setFullBackground(self, image):
+        """
+        Show a full resolution array as background over the whole image extent.
+        """
+        self.background_view = None
+        self.background_plot.set_data(image)
+        self.background_plot.set_extent((-0.5, image.shape[1] - 0.5, image.shape[0] - 0.5, -0.5))
+
     def plotStretch(self, stretch=None, background=None):
         if not background or background == "none":
             return
@@ -265,7 +349,7 @@ class Plot:
         data.data_no_background has the same size as amplitude
 
         """
-        self.background_plot.set_data(self.data.no_background)
+        self._setFullBackground(self.data.no_background)
         self.background_plot.set_clim(0, 1)
         self.canvas.draw_idle()
 
@@ -348,6 +432,16 @@ class Plot:
         if not self.data.p1_file_exist:
             self.parms.snap_to_p2 = False
 
+    def readP2(self):
+        """
+        Read the P2 points. Estimating their parameters the first time shows a progress dialog.
+        """
+        if self.data.p2 is not None or self.progress_dialog is None:
+            self.data.readP2()
+            return
+        with self.progress_dialog("Estimating velocity, DEM error and coherence of the P2 points...") as progress:
+            self.data.readP2(progress=progress)
+
     def plotP2(self, status):
         """
         Plot second order (P2) points on the map.
@@ -366,7 +460,7 @@ class Plot:
             return
         clim = [0, 1]
         if self.data.p2 is None:
-            self.data.readP2()
+            self.readP2()
         if self.parms.p2_plot_type == 'velocity':
             color_data = self.data.p2_velocity
             color_data = self.data.convertMetrictUnit(color_data, unit0="m/yr", unit1=self.parms.vel_unit)
@@ -398,13 +492,19 @@ class Plot:
         self.canvas.draw_idle()
 
     def plotP2Cbar(self, label=""):
+        self.p2_cbar = self._mapColorbar(self.p2_plot, label)
+
+    def _mapColorbar(self, mappable, label=""):
+        """
+        Color bar of a layer of the map, styled with the cbar section of the config file.
+        """
         this_config = config["cbar"]
         cbar_pad = this_config.get("pad", 0.01)
         cbar_aspect = this_config.get("aspect", "aspect")
         cbar_shrink = this_config.get("shrink", "shrink")
         cbar_orientation = this_config.get("orientation", "horizontal")
         cbar_location = this_config.get("location", "top")
-        cbar = self.figure.colorbar(self.p2_plot, ax=self.ax, pad=cbar_pad, aspect=cbar_aspect,
+        cbar = self.figure.colorbar(mappable, ax=self.ax, pad=cbar_pad, aspect=cbar_aspect,
                                     shrink=cbar_shrink, orientation=cbar_orientation, location=cbar_location)
 
         this_config = config["cbar"]["ticks"]
@@ -420,8 +520,8 @@ class Plot:
         label_ha = this_config.get("ha", "left")
         label_rotation = this_config.get("rotation", 0)
         cbar.ax.text(label_x, label_y, label, va=label_va, ha=label_ha, rotation=label_rotation, transform=cbar.ax.transAxes)
-        self.p2_cbar = cbar
         self.canvas.draw_idle()
+        return cbar
 
     def plotPointCmap(self):
         """
@@ -447,7 +547,7 @@ class Plot:
         """
         if event.inaxes != self.ax:
             return
-        if self.map_toolbar.mode.name in ['ZOOM', 'PAN']:
+        if self.map_toolbar.mode.name in ['ZOOM', 'PAN'] or self.roi_selector is not None:
             return
         x, y, idx_p1, idx_p2 = self.snapClickedPoint(event.xdata, event.ydata)
         # handle left/right click
@@ -523,7 +623,7 @@ class Plot:
             return
         if self.map_toolbar.mode.name in ['ZOOM', 'PAN']:
             return
-        self.data.readP2()
+        self.readP2()
 
         x_hover, y_hover = round(event.xdata), round(event.ydata)
         if x_hover == self.hover_last_xy[0] and y_hover == self.hover_last_xy[1]:
@@ -548,10 +648,13 @@ class Plot:
         :type selected_indices: list[int]
         """
         self.plot_timeseries.plot_update = True
-        for index in selected_indices:
-            clicked_point = self.clicked_points_database[index]
-            self.plot_timeseries.plotTimeseries(clicked_point.idx_p2, clicked_point.ref_idx_p2,
-                                                clicked_point.default_ref)
+        clicked_points = [self.clicked_points_database[index] for index in selected_indices]
+        self.plot_timeseries.plotTimeseriesList([point.idx_p2 for point in clicked_points],
+                                                [point.ref_idx_p2 for point in clicked_points],
+                                                [point.default_ref for point in clicked_points])
+        if not clicked_points:
+            return
+        clicked_point = clicked_points[-1]
 
         self.last_left_clicked_x = clicked_point.x1
         self.last_left_clicked_y = clicked_point.y2
@@ -618,20 +721,34 @@ class Plot:
             snap_to_p1 = self.parms.snap_to_p1
         if snap_to_p2 is None:
             snap_to_p2 = self.parms.snap_to_p2
+        # exact hits are looked up in the pixel index, the KDTree is only queried to snap.
+        # While the KDTree is built in the background, the clicked pixel is not snapped.
         if snap_to_p1:
             self.data.readP1()
-            idx_p1 = self.data.p1_point_tree.query([x_clicked_round, y_clicked_round])[1]
-            y_snap_to_p1, x_snap_to_p1 = self.data.p1.coord_xy[idx_p1, :]
+            idx_p1 = self.data.p1_pixel_index.lookup(y_clicked_round, x_clicked_round)
+            if idx_p1 < 0:
+                idx_p1 = self.data.p1_point_tree.nearest(x_clicked_round, y_clicked_round)
+            if idx_p1 is None:
+                logger.info("P1 point tree is not ready yet, the point is not snapped")
+                y_snap_to_p1, x_snap_to_p1 = y_clicked_round, x_clicked_round
+            else:
+                y_snap_to_p1, x_snap_to_p1 = self.data.p1.coord_xy[idx_p1, :]
         if snap_to_p2:
-            self.data.readP2()
-            idx_p2 = self.data.p2_point_tree.query([x_clicked_round, y_clicked_round])[1]
-            y_snap_to_p2, x_snap_to_p2 = self.data.p2.coord_xy[idx_p2, :]
+            self.readP2()
+            idx_p2 = self.data.p2_pixel_index.lookup(y_clicked_round, x_clicked_round)
+            if idx_p2 < 0:
+                idx_p2 = self.data.p2_point_tree.nearest(x_clicked_round, y_clicked_round)
+            if idx_p2 is None:
+                logger.info("P2 point tree is not ready yet, the point is not snapped")
+                y_snap_to_p2, x_snap_to_p2 = y_clicked_round, x_clicked_round
+            else:
+                y_snap_to_p2, x_snap_to_p2 = self.data.p2.coord_xy[idx_p2, :]
 
         if self.plot_timeseries.parms.plot_enable:
-            self.data.readP2()
-            idx_closest_p2 = self.data.p2_point_tree.query([x_clicked_round, y_clicked_round])[1]
-            if np.all(self.data.p2.coord_xy[idx_closest_p2, :] == [y_clicked_round, x_clicked_round]):
-                idx_p2 = idx_closest_p2
+            self.readP2()
+            idx_exact_p2 = self.data.p2_pixel_index.lookup(y_clicked_round, x_clicked_round)
+            if idx_exact_p2 >= 0:
+                idx_p2 = idx_exact_p2
 
         # check snap to p1 and p2
         if snap_to_p1 and not snap_to_p2:
@@ -656,7 +773,7 @@ class Plot:
             ref_point_x, ref_point_y, ref_point_id = None, None, None
             max_x = self.data.n_pixels
             max_y = self.data.n_lines
-            max_id = max_x * max_y
+            max_id = self.data.point_id_codec.num_ids
 
             # inserted_text = self.points_widget.text_edit_list_point_add.toPlainText()
             # items = inserted_text.split(",")
@@ -664,7 +781,7 @@ class Plot:
             if self.parms.point_list_type == "id":
                 if len(item) in [1, 2]:
                     point_id = int(item[0])
-                    if point_id >= max_id:
+                    if not 0 <= point_id < max_id:
                         return
                     else:
                         text = f"{point_id}"
@@ -673,7 +790,7 @@ class Plot:
                     pass  # TODO: show some error message
                 if len(item) == 2:
                     ref_point_id = int(item[1])
-                    if ref_point_id >= max_id:
+                    if not 0 <= ref_point_id < max_id:
                         return
                     else:
                         text += f", {ref_point_id}"
@@ -912,19 +1029,70 @@ class Plot:
             self.p2_plot = None
             self.canvas.draw_idle()
 
+    def selectRoi(self, shape, callback):
+        """
+        Let the user draw a region of interest on the map. Clicks on the map do not select points meanwhile.
+
+        :param shape: "box" or "polygon". A polygon is closed by clicking on its first vertex.
+        :param callback: Function called with the numpy.ndarray (n, 2) of the (range, azimuth) vertices.
+        """
+        self.stopRoiSelection()
+
+        def _onSelect(vertices):
+            self.stopRoiSelection()
+            callback(np.asarray(vertices, dtype=np.float64))
+
+        if shape == "box":
+            def _onSelectBox(press, release):
+                x0, x1 = sorted([press.xdata, release.xdata])
+                y0, y1 = sorted([press.ydata, release.ydata])
+                _onSelect([(x0, y0), (x1, y0), (x1, y1), (x0, y1)])
+
+            self.roi_selector = RectangleSelector(self.ax, _onSelectBox, useblit=True, button=[1])
+        else:
+            self.roi_selector = PolygonSelector(self.ax, _onSelect, useblit=True)
+
+    def stopRoiSelection(self):
+        if self.roi_selector is not None:
+            self.roi_selector.set_active(False)
+            self.roi_selector.set_visible(False)
+            self.roi_selector = None
+            self.canvas.draw_idle()
+
+    def plotRoiRaster(self, image, bbox, label=""):
+        """
+        Show a raster of a region of interest, e.g. the velocity of its temporal unwrapping, over the background.
+
+        :param image: numpy.ndarray (y1 - y0, x1 - x0) with NaN where there is no value.
+        :param bbox: (y0, y1, x0, x1) of the raster in image coordinates.
+        :param label: Label of the color bar.
+        """
+        self.clearRoiRaster()
+        y0, y1, x0, x1 = bbox
+        self.roi_plot = self.ax.imshow(image, cmap=self.parms.p2_plot_cmap, interpolation='nearest',
+                                       extent=(x0 - 0.5, x1 - 0.5, y1 - 0.5, y0 - 0.5), zorder=0.5)
+        self.roi_cbar = self._mapColorbar(self.roi_plot, label)
+
+    def clearRoiRaster(self):
+        if self.roi_cbar is not None:
+            self.roi_cbar.remove()
+            self.roi_cbar = None
+        if self.roi_plot is not None:
+            self.roi_plot.remove()
+            self.roi_plot = None
+            self.canvas.draw_idle()
+
     def rangeAzimuthToId(self, x, y):
         if (x is None) or (y is None):
             return None
         else:
-            return self.data.point_id_image[y, x]
+            return self.data.point_id_codec.encode(x, y)
 
     def idToRangeAzimuth(self, point_id):
         if point_id is None:
             return None
         else:
-            x = np.mod(point_id, self.data.n_pixels)
-            y = point_id // self.data.n_pixels
-            return x, y
+            return self.data.point_id_codec.decode(point_id)
 
 
 class ClickedPoint:
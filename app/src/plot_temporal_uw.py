@@ -141,6 +141,9 @@ class TemporalUnwrappingPlot:
         self.ax_search_space.set_xlabel(self.parms.search_space_x_label)
         self.ax_search_space.set_ylabel(self.parms.search_space_y_label)
         self.ax_search_space.set_aspect("auto")
+        self.ax_search_space.set_title(f"resolution {tu.search_resolution[0]:.2g} m, "
+                                       f"{tu.search_resolution[1] * 1000:.2g} mm/yr, "
+                                       f"{tu.search_num_evaluations} evaluations", fontsize=self.parms.font_size)
 
         self.ax_search_space.plot(tu.dem_error,
                                   tu.velocity * 100,
@@ -94,7 +94,29 @@ class TimeseriesPlot:
     #     """
     #     self.data.readDates()
 
-    def plotTimeseries(self, idx: int, idx_ref: int, default_ref: bool=False):
+    def plotTimeseriesList(self, idx_list: list, idx_ref_list: list, default_ref_list: list):
+        """
+        Plot timeseries for several point indices. The phase of all points is read at once.
+
+        :param idx_list: Indices of the points.
+        :param idx_ref_list: Indices of the reference points.
+        :param default_ref_list: use default reference point from data, for each point
+
+        :return: None
+        """
+        if self.parms.plot_enable is False:
+            return
+        plotted = [k for k, (idx, idx_ref, default_ref) in enumerate(zip(idx_list, idx_ref_list, default_ref_list))
+                   if idx is not None and (default_ref is not False or idx_ref is not None)]
+        ts_data_phase = {}
+        if self.plot_update and plotted:
+            ts_data = self.data.readTsForIdxList([idx_list[k] for k in plotted], [idx_ref_list[k] for k in plotted],
+                                                 remove_topo_error=self.parms.remove_topo_error)
+            ts_data_phase = dict(zip(plotted, ts_data))
+        for k, (idx, idx_ref, default_ref) in enumerate(zip(idx_list, idx_ref_list, default_ref_list)):
+            self.plotTimeseries(idx, idx_ref, default_ref, ts_data_phase=ts_data_phase.get(k))
+
+    def plotTimeseries(self, idx: int, idx_ref: int, default_ref: bool=False, ts_data_phase=None):
         """
         Plot timeseries for a specific point index.
 
@@ -102,6 +124,7 @@ class TimeseriesPlot:
         :param idx_ref: Index for the reference point.
                         If provided, the difference between the idx and idx_ref timeseries is plotted.
         :param default_ref:  use default reference point from data
+        :param ts_data_phase: Phase timeseries of the point if already read. If None, it is read from data.
 
         :return: None
         """
@@ -120,7 +143,8 @@ class TimeseriesPlot:
             self.clear()
             self.plot_list = {}
 
-        ts_data_phase = self.data.readTsForIdx(idx, idx_ref, remove_topo_error=self.parms.remove_topo_error)
+        if ts_data_phase is None:
+            ts_data_phase = self.data.readTsForIdx(idx, idx_ref, remove_topo_error=self.parms.remove_topo_error)
         ts_data_distance = self.data.phaseToDistance(ts_data_phase, unit=self.parms.unit)
         this_ts_plot = self.ax.plot(self.data.slc_dates_ts,
                                     ts_data_distance,
@@ -0,0 +1,105 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# largest dense index image. Larger images use the sorted pixel keys
+PIXEL_INDEX_DENSE_NBYTES = 256 * 1024 ** 2
+
+
+class PointIdCodec:
+    """
+    This class converts pixel coordinates to point ids and back without allocating an id image.
+
+    The id of a pixel is its linear index in the image: id = azimuth * n_pixels + range.
+    """
+
+    def __init__(self, n_lines: int, n_pixels: int):
+        self.n_lines = int(n_lines)
+        self.n_pixels = int(n_pixels)
+        self.num_ids = self.n_lines * self.n_pixels
+
+    def encode(self, x, y):
+        """
+        :param x: Range (pixel) coordinate(s).
+        :param y: Azimuth (line) coordinate(s).
+
+        :return: int or numpy.ndarray of point ids
+        """
+        x = np.asarray(x, dtype=np.int64)
+        y = np.asarray(y, dtype=np.int64)
+        if np.any((x < 0) | (x >= self.n_pixels) | (y < 0) | (y >= self.n_lines)):
+            raise IndexError(f"pixel outside of the image ({self.n_pixels} x {self.n_lines})")
+        point_id = y * self.n_pixels + x
+        return int(point_id) if point_id.ndim == 0 else point_id
+
+    def decode(self, point_id):
+        """
+        :param point_id: Point id(s).
+
+        :return: tuple (x, y) of range and azimuth coordinate(s)
+        """
+        point_id = np.asarray(point_id, dtype=np.int64)
+        if np.any((point_id < 0) | (point_id >= self.num_ids)):
+            raise IndexError(f"point id outside of the image ({self.num_ids} ids)")
+        y, x = np.divmod(point_id, self.n_pixels)
+        if point_id.ndim == 0:
+            return int(x), int(y)
+        return x, y
+
+
+class PixelPointIndex:
+    """
+    This class maps image pixels (azimuth, range) to the index of the point located on them.
+
+    If the image is small enough, the index is a dense int32 image with -1 where no point is located.
+    Otherwise, the linear pixel ids of the points are sorted and searched.
+    """
+
+    def __init__(self, coord_xy, shape, max_dense_nbytes: int = PIXEL_INDEX_DENSE_NBYTES):
+        """
+        Initialize the PixelPointIndex class.
+
+        :param coord_xy: numpy.ndarray (points, 2) with azimuth and range of the points.
+        :param shape: (lines, pixels) of the image.
+        :param max_dense_nbytes: Largest size in bytes of the dense index image.
+        """
+        self.shape = (int(shape[0]), int(shape[1]))
+        keys = np.asarray(coord_xy[:, 0], dtype=np.int64) * self.shape[1] + np.asarray(coord_xy[:, 1], dtype=np.int64)
+        self.image = None
+        self.keys = None
+        self.indices = None
+        if self.shape[0] * self.shape[1] * 4 <= max_dense_nbytes:
+            self.image = np.full(self.shape, -1, dtype=np.int32)
+            self.image.flat[keys] = np.arange(keys.size, dtype=np.int32)
+        else:
+            order = np.argsort(keys, kind='stable')
+            self.keys = keys[order]
+            self.indices = order.astype(np.int32)
+
+    @property
+    def nbytes(self):
+        if self.image is not None:
+            return self.image.nbytes
+        return self.keys.nbytes + self.indices.nbytes
+
+    def lookup(self, az, ra):
+        """
+        Return the index of the point located on the pixel(s).
+
+        :param az: Azimuth (line) coordinate(s).
+        :param ra: Range (pixel) coordinate(s).
+
+        :return: int or numpy.ndarray of point indices, -1 where no point is located.
+        """
+        az = np.asarray(az, dtype=np.int64)
+        ra = np.asarray(ra, dtype=np.int64)
+        inside = (az >= 0) & (az < self.shape[0]) & (ra >= 0) & (ra < self.shape[1])
+        idx = np.full(az.shape, -1, dtype=np.int32)
+        if self.image is not None:
+            idx[inside] = self.image[az[inside], ra[inside]]
+        elif self.keys.size > 0:
+            keys = az[inside] * self.shape[1] + ra[inside]
+            pos = np.minimum(np.searchsorted(self.keys, keys), self.keys.size - 1)
+            idx[inside] = np.where(self.keys[pos] == keys, self.indices[pos], -1)
+        return int(idx) if idx.ndim == 0 else idx
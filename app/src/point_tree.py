@@ -0,0 +1,132 @@
+import os
+import json
+import pickle
+import hashlib
+import logging
+import threading
+import numpy as np
+from scipy.spatial import KDTree
+
+logger = logging.getLogger(__name__)
+
+POINT_TREE_SUFFIX = "_tree.pkl"
+
+
+def pointTreeFileName(points_file: str):
+    """
+    :return: str name of the persisted KDTree of a points file, e.g. p2_coh80_ts_tree.pkl
+    """
+    return os.path.splitext(os.path.basename(points_file))[0] + POINT_TREE_SUFFIX
+
+
+def coordDigest(coord):
+    """
+    :return: str sha256 of the coordinates as float64
+    """
+    return hashlib.sha256(np.ascontiguousarray(coord, dtype=np.float64).tobytes()).hexdigest()
+
+
+class PointTree:
+    """
+    This class builds the KDTree of point coordinates in a background thread.
+
+    The persisted file starts with a json header line holding the digest of the coordinates, followed by the
+    pickled tree. The tree is only unpickled if the digest matches the current coordinates. Otherwise, it is
+    built and written to the file for later sessions. Until it is ready, queries return None. If building fails,
+    queries fall back to a linear search.
+    """
+
+    def __init__(self, coord, points_file: str, tree_file: str = None):
+        """
+        Initialize the PointTree class and start building the tree.
+
+        :param coord: numpy.ndarray (points, 2) with the coordinates (x, y) of the points.
+        :param points_file: Path to the points file the coordinates are read from.
+        :param tree_file: Path of the persisted tree. If None, the tree is not persisted.
+        """
+        self.points_file = points_file
+        self.tree_file = tree_file
+        self.tree = None
+        self.error = None  # exception raised while building the tree
+        self.coord = coord
+        self.num_points = coord.shape[0]
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._build, daemon=True)
+        self._thread.start()
+
+    def _build(self):
+        try:
+            digest = coordDigest(self.coord)
+            self.tree = self._load(digest)
+            if self.tree is None:
+                self.tree = KDTree(self.coord)
+                logger.info(f"KDTree of {self.num_points} points built")
+                self._save(digest)
+        except Exception as e:
+            self.tree = None
+            self.error = e
+            logger.error(f"cannot build the KDTree of {self.points_file}, using a linear search: {e}")
+        finally:
+            self._ready.set()
+
+    def _load(self, digest: str):
+        if self.tree_file is None or not os.path.exists(self.tree_file):
+            return None
+        try:
+            with open(self.tree_file, 'rb') as f:
+                header = json.loads(f.readline())
+                if header.get("coord_digest") != digest:
+                    logger.warning(f"{self.tree_file} is outdated and is ignored.")
+                    return None
+                tree = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, AttributeError) as e:
+            logger.warning(f"cannot read {self.tree_file}: {e}")
+            return None
+        if not isinstance(tree, KDTree) or tree.n != self.num_points:
+            logger.warning(f"{self.tree_file} is invalid and is ignored.")
+            return None
+        logger.info(f"KDTree loaded from {self.tree_file}")
+        return tree
+
+    def _save(self, digest: str):
+        if self.tree_file is None:
+            return
+        tmp_file = self.tree_file + ".tmp"
+        try:
+            with open(tmp_file, 'wb') as f:
+                f.write(json.dumps({"coord_digest": digest, "num_points": self.num_points}).encode() + b"\n")
+                pickle.dump(self.tree, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, self.tree_file)
+        except OSError as e:
+            logger.warning(f"cannot write {self.tree_file}: {e}")
+
+    @property
+    def nbytes(self):
+        """
+        Estimated memory of the tree: a copy of the coordinates, the index array and the nodes.
+        """
+        return self.num_points * (2 * 2 * 8 + 8)
+
+    def ready(self):
+        return self._ready.is_set()
+
+    def wait(self, timeout: float = None):
+        """
+        Block until the tree is ready.
+
+        :return: KDTree or None if the timeout expired.
+        """
+        self._ready.wait(timeout)
+        return self.tree
+
+    def nearest(self, x, y):
+        """
+        Return the index of the point closest to (x, y).
+
+        :return: int or None if the tree is not ready yet.
+        """
+        if not self.ready():
+            return None
+        if self.tree is None:
+            return int(np.argmin((self.coord[:, 0] - x) ** 2 + (self.coord[:, 1] - y) ** 2))
+        return int(self.tree.query([x, y])[1])
@@ -0,0 +1,295 @@
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from types import SimpleNamespace
+import h5py as h5
+import numpy as np
+from matplotlib.path import Path
+from .window_reference import WindowReferenceCache
+from .unwraping_temporal import TemporalUnwrapping
+from .coherence_search import designExponentials, oneDimSearchBatch
+
+logger = logging.getLogger(__name__)
+
+ROI_TU_FILE = "roi_temporal_unwrapping.h5"
+ROI_TU_PRODUCTS = ("velocity", "demerr", "coherence")
+# number of tiles per worker read and queued at once. Bounds the memory of the main process.
+ROI_TILES_IN_FLIGHT_PER_WORKER = 2
+# memory of the DEM error exponentials of the pixels searched at once in grid mode
+ROI_SEARCH_BATCH_NBYTES = 64 * 1024 ** 2
+
+
+def roiMask(vertices, shape):
+    """
+    Pixels inside a polygon.
+
+    :param vertices: numpy.ndarray (n, 2) of the (range, azimuth) vertices. A box is a polygon with 4 vertices.
+    :param shape: (lines, pixels) of the image.
+
+    :return: tuple ((y0, y1, x0, x1) bounding box clipped to the image, numpy.ndarray (y1 - y0, x1 - x0) bool)
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    x0, y0 = (max(int(value), 0) for value in np.floor(vertices.min(axis=0) + 0.5))
+    x1 = min(int(np.floor(vertices[:, 0].max() + 0.5)) + 1, shape[1])
+    y1 = min(int(np.floor(vertices[:, 1].max() + 0.5)) + 1, shape[0])
+    if x1 <= x0 or y1 <= y0:
+        return (y0, y0, x0, x0), np.zeros((0, 0), dtype=bool)
+    yy, xx = np.mgrid[y0:y1, x0:x1]
+    # pixel centres on the outline count as inside
+    inside = Path(vertices).contains_points(np.column_stack([xx.ravel(), yy.ravel()]), radius=1e-9)
+    return (y0, y1, x0, x1), inside.reshape(yy.shape)
+
+
+class _NetworkData:
+    """
+    The attributes of Data that TemporalUnwrapping uses after reading the phase, sent to the worker processes.
+    """
+
+    def __init__(self, data):
+        self.wavelength = data.wavelength
+        self.slc_dates = data.slc_dates
+        self.ifg_network = SimpleNamespace(ifg_list=np.asarray(data.ifg_network.ifg_list),
+                                           pbase_ifg=np.asarray(data.ifg_network.pbase_ifg),
+                                           tbase_ifg=np.asarray(data.ifg_network.tbase_ifg))
+
+
+def _unwrapPixels(task):
+    """
+    Temporal unwrapping of the pixels of one tile in a worker process with the estimator of the single pixels.
+    The grid search is done in batches of pixels, the other search modes with TemporalUnwrapping.unwrapPhase per
+    pixel.
+
+    :param task: dict with ifg_phase (pixels, ifgs), geometry_factor (pixels,), data (_NetworkData) and parms,
+                 the attributes of unwraping_temporal.Parms.
+
+    :return: dict {velocity, demerr, coherence} of numpy.ndarray (pixels,)
+    """
+    tu = TemporalUnwrapping(task["data"])
+    for name, value in task["parms"].items():
+        setattr(tu.parms, name, value)
+    tu.pbase_ifg = task["data"].ifg_network.pbase_ifg
+    tu.tbase_ifg = task["data"].ifg_network.tbase_ifg
+    ifg_phase = task["ifg_phase"]
+    if tu.parms.search_mode == "grid":
+        return _unwrapPixelsGrid(tu, ifg_phase, task["geometry_factor"])
+    result = {name: np.empty(ifg_phase.shape[0], dtype=np.float32) for name in ROI_TU_PRODUCTS}
+    for i in range(ifg_phase.shape[0]):
+        tu.geometry_factor = task["geometry_factor"][i]
+        result["demerr"][i], result["velocity"][i], result["coherence"][i] = tu.unwrapPhase(ifg_phase[i])
+    return result
+
+
+def _unwrapPixelsGrid(tu, ifg_phase, geometry_factor):
+    """
+    TemporalUnwrapping.unwrapPhase in grid mode for many pixels. The design matrices of the pixels only differ by
+    the geometry factor in the DEM error column, so the velocity exponentials are shared and the pixels are searched
+    in batches with oneDimSearchBatch.
+
+    :return: dict {velocity, demerr, coherence} of numpy.ndarray (pixels,)
+    """
+    parms = tu.parms
+    demerr_range = np.linspace(parms.demerr_bound_min, parms.demerr_bound_max, parms.demerr_num_samples)
+    vel_range = np.linspace(parms.velocity_bound_min, parms.velocity_bound_max, parms.velocity_num_samples)
+    # as TemporalUnwrapping.temporalUnwrappingDesignMatrix, with one DEM error column per pixel
+    design_demerr = (- 4 * np.pi / tu.data.wavelength * tu.pbase_ifg)[np.newaxis, :] / geometry_factor[:, np.newaxis]
+    design_demerr = design_demerr.astype(np.float32)
+    design_vel = (- 4 * np.pi / tu.data.wavelength * tu.tbase_ifg).astype(np.float32)
+    exp_vel = designExponentials(design_vel, vel_range)
+    num_pixels, num_ifgs = ifg_phase.shape
+    batch_size = max(1, ROI_SEARCH_BATCH_NBYTES // (num_ifgs * demerr_range.size * np.dtype(np.complex64).itemsize))
+
+    result = {name: np.empty(num_pixels, dtype=np.float32) for name in ROI_TU_PRODUCTS}
+    for start in range(0, num_pixels, batch_size):
+        batch = np.s_[start:start + batch_size]
+        phase = ifg_phase[batch]
+        # TemporalUnwrapping.shiftPhase of every pixel
+        phase = np.angle(np.exp(1j * phase) * np.mean(np.conjugate(np.exp(1j * phase)), axis=1, keepdims=True))
+        if parms.remove_seasonal_before_temp_uw:
+            phase = np.array([tu._removeSeasonalBefore(pixel_phase) for pixel_phase in phase])
+        obs = np.exp(1j * phase.astype(np.float32)).astype(np.complex64)
+        idx_demerr, idx_vel, _ = oneDimSearchBatch(obs, designExponentials(design_demerr[batch], demerr_range),
+                                                   exp_vel)
+        demerr, vel = demerr_range[idx_demerr], vel_range[idx_vel]
+        result["demerr"][batch], result["velocity"][batch] = demerr, vel
+
+        if parms.remove_seasonal_after_temp_uw:
+            coherence = np.empty(phase.shape[0])
+            for i in range(phase.shape[0]):
+                tu.geometry_factor = geometry_factor[start + i]
+                tu.design_matrix = tu.temporalUnwrappingDesignMatrix()
+                tu.dem_error, tu.velocity = demerr[i], vel[i]
+                coherence[i] = tu._residualStage(phase[i])["temporal_coherence"]
+        else:
+            # coherence of the residual phase as in TemporalUnwrapping._residualStage
+            model_phase = design_demerr[batch] * demerr[:, np.newaxis] + design_vel[np.newaxis, :] * vel[:, np.newaxis]
+            coherence = np.abs(np.mean(np.exp(1j * (phase - model_phase)), axis=1))
+        result["coherence"][batch] = coherence
+    return result
+
+
+def _tiles(bbox, mask, tile_shape):
+    """
+    Tiles of the bounding box aligned to the chunks of the source, without the tiles outside of the polygon.
+    """
+    y0, y1, x0, x1 = bbox
+    tiles = []
+    for tile_y0 in range(y0 // tile_shape[0] * tile_shape[0], y1, tile_shape[0]):
+        for tile_x0 in range(x0 // tile_shape[1] * tile_shape[1], x1, tile_shape[1]):
+            tile = (max(tile_y0, y0), min(tile_y0 + tile_shape[0], y1),
+                    max(tile_x0, x0), min(tile_x0 + tile_shape[1], x1))
+            if mask[tile[0] - y0:tile[1] - y0, tile[2] - x0:tile[3] - x0].any():
+                tiles.append(tile)
+    return tiles
+
+
+def _readTilePhase(read_method, parms, tile, tile_mask, ifg_cpx_ref, window_reference, network, shape):
+    """
+    Referenced ifg phase of the pixels of a tile inside the polygon, as in TemporalUnwrapping.createIfgNetworkPhase.
+    The window reference is looked up in the same summed-area tables as for the single pixels.
+
+    :return: numpy.ndarray (pixels, ifgs) float32
+    """
+    y0, y1, x0, x1 = tile
+    if parms["reference_type"] == "window":
+        az, ra = np.nonzero(tile_mask)
+        ifg_cpx, ifg_cpx_window = window_reference.readPixels(
+            read_method, network.ifg_network, (network.network_type,), az + y0, ra + x0,
+            parms["window_size_azimuth"], parms["window_size_range"], shape,
+            num_ifgs=len(network.ifg_network.pbase_ifg))
+        ifg_cpx = ifg_cpx * np.conjugate(ifg_cpx_window)
+    else:
+        ifg_cpx = read_method(ra=x0, az=y0, ra2=x1, az2=y1)[tile_mask]
+        if ifg_cpx_ref is not None:
+            ifg_cpx = ifg_cpx * np.conjugate(ifg_cpx_ref)[np.newaxis, :]
+    return np.angle(ifg_cpx)
+
+
+def temporalUnwrapRoi(data, parms, vertices, reference=None, num_workers: int = None, progress=None):
+    """
+    Temporal unwrapping of every pixel inside a polygon, with the settings of TemporalUnwrapping.
+
+    The polygon is processed in tiles aligned to the chunks of the interferograms. The tiles are read and
+    referenced in this process and unwrapped in a process pool with the estimator of TemporalUnwrapping, including
+    the removal of the seasonal signal. At most ROI_TILES_IN_FLIGHT_PER_WORKER tiles per worker are queued.
+
+    :param data: Data instance.
+    :param parms: unwraping_temporal.Parms with the reference type, window size and search space.
+    :param vertices: numpy.ndarray (n, 2) of the (range, azimuth) vertices of the polygon.
+    :param reference: (range, azimuth) of the reference pixel for reference type 'arc', or None for no reference.
+    :param num_workers: Number of worker processes. Default: number of cpus. With 1, the tiles are unwrapped
+                        in the calling process.
+    :param progress: Optional function called with (number of unwrapped pixels, number of pixels). The
+                     processing is cancelled if it returns False.
+
+    :return: dict {velocity, demerr, coherence: numpy.ndarray (y1 - y0, x1 - x0) float32 with NaN outside of the
+             polygon, bbox: (y0, y1, x0, x1)} or None if cancelled
+    """
+    parms = dict(vars(parms))
+    shape = (data.n_lines, data.n_pixels)
+    bbox, mask = roiMask(vertices, shape)
+    y0, y1, x0, x1 = bbox
+    result = {name: np.full(mask.shape, np.nan, dtype=np.float32) for name in ROI_TU_PRODUCTS}
+    result["bbox"] = bbox
+    num_pixels = int(mask.sum())
+    if num_pixels == 0:
+        return result
+
+    if data.network_type == "ifg_stack":
+        read_method = data.readInterferogramPhaseForAzRa
+    else:
+        data.constructDynamicNetwork()
+        read_method = data.calculateInterferogramPhaseForAzRa
+    ifg_cpx_ref = None
+    if parms["reference_type"] == "arc" and reference is not None and None not in reference:
+        ifg_cpx_ref = read_method(int(reference[0]), int(reference[1]))
+    window_reference = WindowReferenceCache()
+    task_base = {"data": _NetworkData(data), "parms": parms}
+    tiles = _tiles(bbox, mask, data.interferogramTileShape())
+    num_done = 0
+
+    def _task(tile):
+        tile_mask = mask[tile[0] - y0:tile[1] - y0, tile[2] - x0:tile[3] - x0]
+        az, ra = np.nonzero(tile_mask)
+        ifg_phase = _readTilePhase(read_method, parms, tile, tile_mask, ifg_cpx_ref, window_reference, data, shape)
+        return dict(task_base, ifg_phase=ifg_phase,
+                    geometry_factor=data.readGeometryFactorForAzRa(ra + tile[2], az + tile[0]))
+
+    def _store(tile, tile_result):
+        nonlocal num_done
+        tile_mask = mask[tile[0] - y0:tile[1] - y0, tile[2] - x0:tile[3] - x0]
+        for name in ROI_TU_PRODUCTS:
+            result[name][tile[0] - y0:tile[1] - y0, tile[2] - x0:tile[3] - x0][tile_mask] = tile_result[name]
+        num_done += int(tile_mask.sum())
+        logger.info(f"temporal unwrapping of the region: {num_done}/{num_pixels} pixels")
+        return progress is None or progress(num_done, num_pixels) is not False
+
+    num_workers = (os.cpu_count() or 1) if num_workers is None else num_workers
+    if num_workers <= 1 or len(tiles) <= 1:
+        for tile in tiles:
+            if not _store(tile, _unwrapPixels(_task(tile))):
+                logger.info("temporal unwrapping of the region cancelled")
+                return None
+        return result
+
+    # spawn: forking a process with a running Qt application is not safe
+    context = multiprocessing.get_context("spawn")
+    executor = ProcessPoolExecutor(max_workers=num_workers, mp_context=context)
+    completed = False
+    try:
+        pending = {}
+        next_tile = 0
+        while next_tile < len(tiles) or pending:
+            while next_tile < len(tiles) and len(pending) < num_workers * ROI_TILES_IN_FLIGHT_PER_WORKER:
+                pending[executor.submit(_unwrapPixels, _task(tiles[next_tile]))] = tiles[next_tile]
+                next_tile += 1
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if not _store(pending.pop(future), future.result()):
+                    logger.info("temporal unwrapping of the region cancelled")
+                    return None
+        completed = True
+    finally:
+        # on cancel or error, drop the queued tiles and return without waiting for the running ones
+        executor.shutdown(wait=completed, cancel_futures=not completed)
+    return result
+
+
+def writeRoiRasters(file_path: str, result: dict, attrs: dict = None):
+    """
+    Write the rasters of temporalUnwrapRoi. The file is written to a temporary name first and renamed when complete.
+
+    :param file_path: Path to the output file.
+    :param result: dict returned by temporalUnwrapRoi.
+    :param attrs: Optional attributes, e.g. the reference and the search space.
+    """
+    tmp_file = file_path + ".tmp"
+    try:
+        with h5.File(tmp_file, 'w') as h_file:
+            for name in ROI_TU_PRODUCTS:
+                h_file.create_dataset(name, data=result[name])
+            h_file.attrs["bbox"] = np.asarray(result["bbox"], dtype=np.int64)
+            for key, value in (attrs or {}).items():
+                if value is not None:
+                    h_file.attrs[key] = value
+        os.replace(tmp_file, file_path)
+    except OSError as e:
+        logger.warning(f"cannot write {file_path}: {e}")
+        return
+    logger.info(f"temporal unwrapping of the region written to {file_path}")
+
+
+def readRoiRasters(file_path: str):
+    """
+    :return: dict {velocity, demerr, coherence, bbox} as returned by temporalUnwrapRoi or None if the file is missing
+    """
+    if not os.path.exists(file_path):
+        return None
+    try:
+        with h5.File(file_path, 'r') as h_file:
+            result = {name: h_file[name][:] for name in ROI_TU_PRODUCTS}
+            result["bbox"] = tuple(int(value) for value in h_file.attrs["bbox"])
+    except (OSError, KeyError) as e:
+        logger.warning(f"cannot read {file_path}: {e}")
+        return None
+    return result
@@ -0,0 +1,76 @@
+import os
+import hashlib
+import logging
+import h5py as h5
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# directory inside the sarvey processing directory where SARPlotter stores derived products
+CACHE_DIR_DEFAULT = "sarplotter_cache"
+
+
+def fileIdentity(file_path: str):
+    """
+    Describe a source file by its path, size and modification time.
+
+    :param file_path: Path to the source file.
+
+    :return: dict with source_file, source_size and source_mtime
+    """
+    stat = os.stat(file_path)
+    return {"source_file": os.path.abspath(file_path),
+            "source_size": int(stat.st_size),
+            "source_mtime": float(stat.st_mtime)}
+
+
+def identityMatches(attrs, file_path: str):
+    """
+    Check if the identity stored with a sidecar still matches the source file.
+
+    :param attrs: Mapping (e.g. hdf5 attributes or a dict loaded from json) with the stored identity.
+    :param file_path: Path to the source file.
+
+    :return: True if size and modification time of the source file are unchanged, False otherwise.
+    """
+    if not os.path.exists(file_path):
+        return False
+    identity = fileIdentity(file_path)
+    try:
+        return (int(attrs["source_size"]) == identity["source_size"] and
+                float(attrs["source_mtime"]) == identity["source_mtime"])
+    except KeyError:
+        return False
+
+
+def makeCacheDir(cache_path: str):
+    """
+    Create the directory for derived products.
+
+    :return: True if the directory exists or was created, False if it cannot be written.
+    """
+    try:
+        os.makedirs(cache_path, exist_ok=True)
+    except OSError as e:
+        logger.warning(f"cannot create {cache_path}: {e}")
+        return False
+    return os.access(cache_path, os.W_OK)
+
+
+def datasetDigest(file_path: str, dataset_name: str, block_rows: int = 100000):
+    """
+    Compute a content hash of a hdf5 dataset. The dataset is read in blocks of rows.
+
+    :param file_path: Path to the hdf5 file.
+    :param dataset_name: Name of the dataset.
+    :param block_rows: Number of rows read at once.
+
+    :return: str sha1 hex digest
+    """
+    digest = hashlib.sha1()
+    with h5.File(file_path, 'r') as h_file:
+        dataset = h_file[dataset_name]
+        digest.update(str((dataset.shape, dataset.dtype.str)).encode())
+        for start in range(0, dataset.shape[0], block_rows):
+            digest.update(np.ascontiguousarray(dataset[start:start + block_rows]).tobytes())
+    return digest.hexdigest()
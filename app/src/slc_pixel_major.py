@@ -0,0 +1,92 @@
+import os
+import sys
+import argparse
+import logging
+import h5py as h5
+import numpy as np
+from .sidecar import fileIdentity, identityMatches, makeCacheDir, CACHE_DIR_DEFAULT
+
+logger = logging.getLogger(__name__)
+
+SLC_PIXEL_MAJOR_FILE = "slcStack_pixel_major.h5"
+SLC_TILE_SIZE_DEFAULT = 32
+# number of tiles in range written at once during the transposition
+SLC_BLOCK_TILES_DEFAULT = 16
+
+
+def createPixelMajorSlcStack(slc_stack_file: str, out_file: str, tile_size: int = SLC_TILE_SIZE_DEFAULT,
+                             block_tiles: int = SLC_BLOCK_TILES_DEFAULT):
+    """
+    Write a time-contiguous copy of the slcStack.
+
+    The slcStack is stored date-major (date, azimuth, range), so the history of one pixel touches one chunk per date.
+    The copy is stored pixel-major (azimuth, range, date) as complex64 with chunks of tile_size x tile_size pixels
+    and all dates, so the history of one pixel is one chunk read.
+    The file is written to a temporary name first and renamed when complete.
+
+    :param slc_stack_file: Path to the slcStack.h5 file.
+    :param out_file: Path to the pixel-major file.
+    :param tile_size: Chunk size in azimuth and range.
+    :param block_tiles: Number of tiles in range transposed at once. Limits the memory used by the job.
+    """
+    tmp_file = out_file + ".tmp"
+    with h5.File(slc_stack_file, 'r') as h_src, h5.File(tmp_file, 'w') as h_dst:
+        slc = h_src['slc']
+        n_dates, n_az, n_ra = slc.shape
+        chunks = (min(tile_size, n_az), min(tile_size, n_ra), n_dates)
+        slc_out = h_dst.create_dataset('slc', shape=(n_az, n_ra, n_dates), dtype=np.complex64, chunks=chunks)
+        h_dst.create_dataset('date', data=h_src['date'][:])
+        block_ra = tile_size * block_tiles
+        for az in range(0, n_az, tile_size):
+            az2 = min(az + tile_size, n_az)
+            for ra in range(0, n_ra, block_ra):
+                ra2 = min(ra + block_ra, n_ra)
+                slc_out[az:az2, ra:ra2, :] = np.transpose(slc[:, az:az2, ra:ra2], (1, 2, 0)).astype(np.complex64)
+            logger.info(f"transposing slcStack: {az2}/{n_az} lines")
+        for key, value in fileIdentity(slc_stack_file).items():
+            h_dst.attrs[key] = value
+    os.replace(tmp_file, out_file)
+    logger.info(f"pixel-major slcStack written to {out_file}")
+
+
+def isPixelMajorSlcStackValid(out_file: str, slc_stack_file: str):
+    """
+    Check if the pixel-major file exists and was created from the current slcStack.
+
+    :return: True if it can be used in place of the slcStack, False otherwise.
+    """
+    if not os.path.exists(out_file):
+        return False
+    with h5.File(out_file, 'r') as h_file:
+        valid = identityMatches(h_file.attrs, slc_stack_file)
+    if not valid:
+        logger.warning(f"{out_file} is outdated and is ignored. Recreate it from {slc_stack_file}")
+    return valid
+
+
+def main(iargs=None):
+    """
+    Create the pixel-major slcStack of a sarvey processing directory.
+
+    Example:
+        $ cd path/to/sarvey/processing/directory/sbas
+        $ python -m src.slc_pixel_major .
+    """
+    parser = argparse.ArgumentParser(description="Write a time-contiguous (pixel-major) copy of the slcStack.")
+    parser.add_argument("data_path", help="sarvey processing directory")
+    parser.add_argument("--input_path", default=None, help="inputs directory. Default: data_path/inputs")
+    parser.add_argument("--tile_size", type=int, default=SLC_TILE_SIZE_DEFAULT, help="chunk size in azimuth and range")
+    args = parser.parse_args(iargs)
+    input_path = os.path.join(args.data_path, "inputs") if args.input_path is None else args.input_path
+    cache_path = os.path.join(args.data_path, CACHE_DIR_DEFAULT)
+    if not makeCacheDir(cache_path):
+        return 1
+    createPixelMajorSlcStack(os.path.join(input_path, "slcStack.h5"),
+                             os.path.join(cache_path, SLC_PIXEL_MAJOR_FILE),
+                             tile_size=args.tile_size)
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -1,5 +1,33 @@
+import logging
 import numpy as np
 from sarvey import unwrapping
+from .cache import LruCache, estimateNbytes
+from .window_reference import WindowReferenceCache
+from .coherence_search import TemporalCoherenceEngine, aliasingFreeNumSamples
+from .periodogram import periodogramSearch, PERIODOGRAM_NUM_SAMPLES
+
+logger = logging.getLogger(__name__)
+
+# memory budget of the results kept to redraw revisited pixels without reading and searching again
+TU_RESULT_CACHE_NBYTES = 256 * 1024 ** 2
+# attributes set by temporal_uw, stored in and restored from the result cache
+TU_RESULT_ATTRIBUTES = ("pbase_ifg", "tbase_ifg", "slant_range", "loc_inc", "geometry_factor", "design_matrix",
+                        "velocity", "dem_error", "ifg_phase", "model_phase", "velocity_phase", "dem_error_phase",
+                        "residual_phase", "residual_phase_dem", "residual_phase_velocity", "temporal_coherence",
+                        "velocity_range", "dem_error_range", "model_pbase_linspace", "model_tbase_lispace",
+                        "gamma_grid", "search_resolution", "search_num_evaluations")
+# stages of temporal_uw. A stage is recomputed only if its input or a stage before it changed
+TU_STAGES = ("read", "reference", "shift", "seasonal", "search", "residuals")
+# parameters of the search stage
+TU_SEARCH_PARMS = ("demerr_bound_min", "demerr_bound_max", "demerr_num_samples", "velocity_bound_min",
+                   "velocity_bound_max", "velocity_num_samples", "search_mode", "refine_num_peaks",
+                   "refine_num_levels", "refine_factor", "periodogram_num_samples")
+TU_READ_ATTRIBUTES = ("pbase_ifg", "tbase_ifg", "slant_range", "loc_inc", "geometry_factor")
+TU_SEARCH_ATTRIBUTES = ("design_matrix", "dem_error_range", "velocity_range", "dem_error", "velocity", "gamma_grid",
+                        "search_resolution", "search_num_evaluations")
+TU_RESIDUAL_ATTRIBUTES = ("model_phase", "dem_error_phase", "velocity_phase", "model_pbase_linspace",
+                          "model_tbase_lispace", "residual_phase", "residual_phase_dem", "residual_phase_velocity",
+                          "temporal_coherence")
 
 
 class Parms:
@@ -15,6 +43,11 @@ class Parms:
         self.velocity_num_samples = 100
         self.remove_seasonal_before_temp_uw = False
         self.remove_seasonal_after_temp_uw = False
+        self.search_mode = 'grid'  # 'grid', 'coarse_to_fine' or 'periodogram'
+        self.refine_num_peaks = 3
+        self.refine_num_levels = 3
+        self.refine_factor = 4
+        self.periodogram_num_samples = PERIODOGRAM_NUM_SAMPLES
 
 
 class TemporalUnwrapping:
@@ -28,6 +61,9 @@ class TemporalUnwrapping:
         self.ra = None
         self.slant_range = None
         self.loc_inc = None
+        self.geometry_factor = None
+        self.window_reference = WindowReferenceCache()
+        self.coherence_engine = TemporalCoherenceEngine()
         self.design_matrix = None
         self.velocity = None
         self.dem_error = None
@@ -44,58 +80,74 @@ class TemporalUnwrapping:
         self.model_pbase_linspace = None
         self.model_tbase_lispace = None
         self.gamma_grid = None
+        self.search_resolution = None  # (demerr step, velocity step) of the estimated optimum
+        self.search_num_evaluations = None
+        # {(pixels, parameters, network): result attributes}
+        self.results = LruCache(TU_RESULT_CACHE_NBYTES)
+        # {stage: (key, output)} of the last temporal_uw and the number of times each stage was computed
+        self.stages = {}
+        self.stage_runs = dict.fromkeys(TU_STAGES, 0)
 
     def readGeometry(self, ra: int, az: int):
         self.slant_range = self.data.readSlantRangeForAzRa(ra, az)
         loc_inc_deg = self.data.readIncidenceAngleForAzRa(ra, az)
         self.loc_inc = loc_inc_deg * np.pi / 180
+        self.geometry_factor = self.data.readGeometryFactorForAzRa(ra, az)
 
     def temporalUnwrappingDesignMatrix(self, perp_base=None, temp_base=None):
         pbase_ifg = self.pbase_ifg if perp_base is None else perp_base
         tbase_ifg = self.tbase_ifg if temp_base is None else temp_base
         design_matrix = np.zeros((pbase_ifg.size, 2), dtype=np.float32)
-        design_matrix[:, 0] = (- 4 * np.pi / self.data.wavelength * pbase_ifg
-                               / (self.slant_range * np.sin(self.loc_inc)))
+        design_matrix[:, 0] = - 4 * np.pi / self.data.wavelength * pbase_ifg / self.geometry_factor
         design_matrix[:, 1] = - 4 * np.pi / self.data.wavelength * tbase_ifg
         return design_matrix
 
-    def readCpxArc(self, ra: int = None, az: int = None, ra_ref: int = None, az_ref: int = None):
-        self.readGeometry(ra, az)
+    def _readMethod(self):
         if self.data.network_type == "ifg_stack":
-            read_method = self.data.readInterferogramPhaseForAzRa
-        else:
-            self.data.constructDynamicNetwork()
-            read_method = self.data.calculateInterferogramPhaseForAzRa
+            return self.data.readInterferogramPhaseForAzRa
+        self.data.constructDynamicNetwork()
+        return self.data.calculateInterferogramPhaseForAzRa
+
+    def readCpxArcPair(self, ra: int = None, az: int = None, ra_ref: int = None, az_ref: int = None):
+        """
+        :return: tuple (ifgs of the pixel, ifgs of the reference pixel or None without reference)
+        """
+        self.readGeometry(ra, az)
+        read_method = self._readMethod()
         self.pbase_ifg = self.data.ifg_network.pbase_ifg
         self.tbase_ifg = self.data.ifg_network.tbase_ifg
         ifg_cpx = read_method(ra, az)
+        ifg_cpx_ref = None
         if az_ref is not None and ra_ref is not None:
             ifg_cpx_ref = read_method(ra_ref, az_ref)
-            ifg_cpx = ifg_cpx * np.conjugate(ifg_cpx_ref)
-        return ifg_cpx
+        return ifg_cpx, ifg_cpx_ref
 
-    def readCpxWindow(self, ra: int = None, az: int = None, wds_ra: int = None, wds_az: int = None):
+    def readCpxWindowPair(self, ra: int = None, az: int = None, wds_ra: int = None, wds_az: int = None):
+        """
+        :return: tuple (ifgs of the pixel, mean ifgs of the window around it without the pixel)
+        """
         self.readGeometry(ra, az)
         if wds_ra is None:
             wds_ra = self.parms.window_size_range
         if wds_az is None:
             wds_az = self.parms.window_size_azimuth
-        if self.data.network_type == "ifg_stack":
-            read_method = self.data.readInterferogramPhaseForAzRa
-        else:
-            self.data.constructDynamicNetwork()
-            read_method = self.data.calculateInterferogramPhaseForAzRa
+        read_method = self._readMethod()
         self.pbase_ifg = self.data.ifg_network.pbase_ifg
         self.tbase_ifg = self.data.ifg_network.tbase_ifg
-        ifg_cpx = read_method(ra, az)
-        ifg_cpx_window = read_method(ra=ra - wds_ra // 2,
-                                     az=az - wds_az // 2,
-                                     ra2=ra + wds_ra // 2 + 1,
-                                     az2=az + wds_az // 2 + 1).reshape((wds_ra * wds_az, -1))
-        ifg_cpx_window_neighbors = np.delete(ifg_cpx_window, (wds_ra * wds_az) // 2, axis=0)
-        ifg_cpx_ref = np.mean(ifg_cpx_window_neighbors, axis=0)
-        ifg_cpx = ifg_cpx * np.conjugate(ifg_cpx_ref)
-        return ifg_cpx
+        # centre and window mean are looked up in the cached summed-area tables of the ifgs
+        return self.window_reference.read(read_method, self.data.ifg_network, (self.data.network_type,), az, ra,
+                                          wds_az, wds_ra, (self.data.n_lines, self.data.n_pixels),
+                                          num_ifgs=len(self.pbase_ifg))
+
+    def readCpxArc(self, ra: int = None, az: int = None, ra_ref: int = None, az_ref: int = None):
+        return self.referenceCpx(*self.readCpxArcPair(ra, az, ra_ref, az_ref))
+
+    def readCpxWindow(self, ra: int = None, az: int = None, wds_ra: int = None, wds_az: int = None):
+        return self.referenceCpx(*self.readCpxWindowPair(ra, az, wds_ra, wds_az))
+
+    @staticmethod
+    def referenceCpx(ifg_cpx, ifg_cpx_ref):
+        return ifg_cpx if ifg_cpx_ref is None else ifg_cpx * np.conjugate(ifg_cpx_ref)
 
     def createIfgNetworkPhase(self, ra: int, az: int, ra_ref: int = None, az_ref: int = None):
         if self.parms.reference_type == 'window':
@@ -104,27 +156,129 @@ class TemporalUnwrapping:
             ifg_phase = np.angle(self.readCpxArc(ra, az, ra_ref, az_ref))
         return ifg_phase
 
+    def currentNetwork(self):
+        """
+        :return: the ifg network temporal unwrapping reads from, constructed if it is dynamic
+        """
+        if self.data.network_type != "ifg_stack":
+            self.data.constructDynamicNetwork()
+        return self.data.ifg_network
+
+    def networkKey(self):
+        """
+        :return: key of the current network. Networks with the same key are identical.
+        """
+        if self.data.network_type == "ifg_stack":
+            return ("ifg_stack",)
+        return self.data.ifg_dynamic_network.parameterKey()
+
+    def resultKey(self, ra: int, az: int, ra_ref: int = None, az_ref: int = None, network_key=None):
+        """
+        Key of a result in the result cache: the pixels, every parameter and the network.
+        """
+        if self.parms.reference_type == 'window':
+            ra_ref, az_ref = None, None
+        return (ra, az, ra_ref, az_ref, tuple(sorted(vars(self.parms).items())), network_key)
+
+    def resultCacheStats(self):
+        """
+        :return: dict with the number of entries, used and maximum bytes, hits, misses and hit rate of the results
+        """
+        return self.results.stats()
+
     def temporal_uw(self, ra: int, az: int, ra_ref: int = None, az_ref: int = None):
-        ifg_phase = self.createIfgNetworkPhase(ra, az, ra_ref, az_ref)
-        ifg_phase = self.shiftPhase(ifg_phase)
+        """
+        Temporal unwrapping of a pixel. Results of pixels already unwrapped with the same parameters and network are
+        restored from the result cache without reading or searching.
+        """
+        self.currentNetwork()
+        key = self.resultKey(ra, az, ra_ref, az_ref, self.networkKey())
+        result = self.results.get(key)
+        if result is not None:
+            for name in TU_RESULT_ATTRIBUTES:
+                setattr(self, name, result[name])
+            return
+        self._temporalUnwrap(ra, az, ra_ref, az_ref)
+        values = [getattr(self, name) for name in TU_RESULT_ATTRIBUTES]
+        self.results.put(key, dict(zip(TU_RESULT_ATTRIBUTES, values)), nbytes=estimateNbytes(values))
+        logger.debug(f"temporal unwrapping result cache: {self.resultCacheStats()}")
+
+    def _stage(self, name: str, key, compute):
+        """
+        Return the output of a stage. It is computed only if the key differs from the key of the last output.
+        The key of a stage contains the key of the stage before it, so a changed input invalidates all stages after
+        the stage it enters.
+        """
+        if name in self.stages and self.stages[name][0] == key:
+            return self.stages[name][1]
+        output = compute()
+        self.stages[name] = (key, output)
+        self.stage_runs[name] += 1
+        return output
+
+    def _setAttributes(self, values: dict):
+        for name, value in values.items():
+            setattr(self, name, value)
+
+    def _temporalUnwrap(self, ra: int, az: int, ra_ref: int = None, az_ref: int = None):
+        """
+        Run the stages read -> reference -> shift -> seasonal -> search -> residuals. Changing the search space only
+        recomputes search and residuals, changing the seasonal flags only the stages from the flag on.
+        """
+        parms = self.parms
+        self.currentNetwork()
+        if parms.reference_type == 'window':
+            read_key = (self.networkKey(), ra, az, 'window', parms.window_size_azimuth, parms.window_size_range)
+        else:
+            read_key = (self.networkKey(), ra, az, 'arc', ra_ref, az_ref)
+        read = self._stage("read", read_key, lambda: self._readStage(ra, az, ra_ref, az_ref))
+        self._setAttributes({name: read[name] for name in TU_READ_ATTRIBUTES})
+
+        ifg_phase = self._stage("reference", read_key,
+                                lambda: np.angle(self.referenceCpx(read["ifg_cpx"], read["ifg_cpx_ref"])))
+        ifg_phase = self._stage("shift", read_key, lambda: self.shiftPhase(ifg_phase))
+        seasonal_key = (read_key, parms.remove_seasonal_before_temp_uw)
+        ifg_phase = self._stage("seasonal", seasonal_key, lambda: self._removeSeasonalBefore(ifg_phase))
+        self.ifg_phase = ifg_phase
+
+        search_key = (seasonal_key,) + tuple(getattr(parms, name) for name in TU_SEARCH_PARMS)
+        self._setAttributes(self._stage("search", search_key, lambda: self._searchStage(ifg_phase)))
+        residual_key = (search_key, parms.remove_seasonal_after_temp_uw)
+        self._setAttributes(self._stage("residuals", residual_key, lambda: self._residualStage(ifg_phase)))
+
+    def _readStage(self, ra: int, az: int, ra_ref: int, az_ref: int):
+        if self.parms.reference_type == 'window':
+            ifg_cpx, ifg_cpx_ref = self.readCpxWindowPair(ra, az)
+        else:
+            ifg_cpx, ifg_cpx_ref = self.readCpxArcPair(ra, az, ra_ref, az_ref)
+        output = {name: getattr(self, name) for name in TU_READ_ATTRIBUTES}
+        output.update(ifg_cpx=ifg_cpx, ifg_cpx_ref=ifg_cpx_ref)
+        return output
+
+    def _seasonalDates(self):
+        # TODO: get slc_dates from ifg_network when network dynamically created to avoid inconsistencies
+        return np.array([
+            [(self.data.slc_dates[ifg_date[0]] - self.data.slc_dates[0]).days / 365.25,
+             (self.data.slc_dates[ifg_date[1]] - self.data.slc_dates[0]).days / 365.25]
+            for ifg_date in self.data.ifg_network.ifg_list])
 
+    def _removeSeasonalBefore(self, ifg_phase):
         if self.parms.remove_seasonal_before_temp_uw:  # remove seasonal phase
-            # TODO: add ifg_dates to the self.data.ifg_network
-            dates = np.array([
-                [(self.data.slc_dates[ifg_date[0]] - self.data.slc_dates[0]).days / 365.25,
-                 (self.data.slc_dates[ifg_date[1]] - self.data.slc_dates[0]).days / 365.25]
-                for ifg_date in self.data.ifg_network.ifg_list])
-            seas_phase, ifg_phase = self.estimateAnnual(dates, ifg_phase)
+            seas_phase, ifg_phase = self.estimateAnnual(self._seasonalDates(), ifg_phase)
+        return ifg_phase
 
-        self.design_matrix = self.temporalUnwrappingDesignMatrix()
-        self.dem_error_range = np.linspace(self.parms.demerr_bound_min, self.parms.demerr_bound_max, self.parms.demerr_num_samples)
-        self.velocity_range = np.linspace(self.parms.velocity_bound_min, self.parms.velocity_bound_max, self.parms.velocity_num_samples)
+    def _searchStage(self, ifg_phase):
+        """
+        Search the optimum and compute the search space image.
 
-        demerr, vel, gamma = unwrapping.oneDimSearchTemporalCoherence(
-            demerr_range=self.dem_error_range,
-            vel_range=self.velocity_range,
-            obs_phase=ifg_phase,
-            design_mat=self.design_matrix)
+        :return: dict of TU_SEARCH_ATTRIBUTES
+        """
+        demerr, vel, gamma, gamma_grid = self.searchOptimum(ifg_phase)
+        if self.parms.search_mode == 'coarse_to_fine':
+            gamma_grid = self.coherence_engine.renderSearchSpace(self.dem_error_range, self.velocity_range)
+        elif gamma_grid is None:
+            gamma_grid = self.searchSpaceGamma(self.dem_error_range, self.velocity_range, self.design_matrix,
+                                               ifg_phase)
 
         # demerr_grid, vel_grid = np.meshgrid(demerr_range, vel_range)
         # demerr, vel, gamma = unwrapping.gridSearchTemporalCoherence(
@@ -141,42 +295,109 @@ class TemporalUnwrapping:
         # demerr = opt_res.x[0] * demerr_range.max()
         # vel = opt_res.x[1] * vel_range.max()
 
+        self.dem_error = demerr
+        self.velocity = vel
+        self.gamma_grid = gamma_grid
+        return {name: getattr(self, name) for name in TU_SEARCH_ATTRIBUTES}
+
+    def searchOptimum(self, ifg_phase):
+        """
+        Search the DEM error and velocity of the highest temporal coherence with the search mode of the parameters.
+        Sets design_matrix, dem_error_range, velocity_range, search_resolution and search_num_evaluations.
+
+        :return: tuple (demerr, velocity, temporal coherence, search space image if the search computed it or None)
+        """
+        self.design_matrix = self.temporalUnwrappingDesignMatrix()
+        self.dem_error_range = np.linspace(self.parms.demerr_bound_min, self.parms.demerr_bound_max, self.parms.demerr_num_samples)
+        self.velocity_range = np.linspace(self.parms.velocity_bound_min, self.parms.velocity_bound_max, self.parms.velocity_num_samples)
+
+        gamma_grid = None
+        if self.parms.search_mode == 'coarse_to_fine':
+            demerr, vel, gamma = self.coarseToFineSearch(ifg_phase)
+        elif self.parms.search_mode == 'periodogram':
+            # the periodogram grid replaces the grid of the sliders, also in the search space image
+            self.dem_error_range = np.linspace(self.parms.demerr_bound_min, self.parms.demerr_bound_max,
+                                               self.parms.periodogram_num_samples)
+            self.velocity_range = np.linspace(self.parms.velocity_bound_min, self.parms.velocity_bound_max,
+                                              self.parms.periodogram_num_samples)
+            demerr, vel, gamma, gamma_grid = periodogramSearch(self.design_matrix, ifg_phase, self.dem_error_range,
+                                                               self.velocity_range)
+            self.search_resolution = (np.ptp(self.dem_error_range) / (self.dem_error_range.size - 1),
+                                      np.ptp(self.velocity_range) / (self.velocity_range.size - 1))
+            self.search_num_evaluations = gamma_grid.size
+        else:
+            self.coherence_engine.configure(self.design_matrix, self.dem_error_range, self.velocity_range)
+            demerr, vel, gamma = self.coherence_engine.oneDimSearch(ifg_phase)
+            self.search_resolution = (np.ptp(self.dem_error_range) / max(self.dem_error_range.size - 1, 1),
+                                      np.ptp(self.velocity_range) / max(self.velocity_range.size - 1, 1))
+            self.search_num_evaluations = self.dem_error_range.size * self.velocity_range.size
+        return demerr, vel, gamma, gamma_grid
+
+    def unwrapPhase(self, ifg_phase):
+        """
+        Temporal unwrapping of the referenced phase of a pixel without the search space image, e.g. for the pixels of
+        a region. Baselines and geometry_factor of the pixel must be set.
+
+        :param ifg_phase: numpy.ndarray (ifgs,) of the referenced interferometric phase.
+
+        :return: tuple (demerr, velocity, temporal coherence)
+        """
+        ifg_phase = self._removeSeasonalBefore(self.shiftPhase(ifg_phase))
+        self.dem_error, self.velocity, _, _ = self.searchOptimum(ifg_phase)
+        return self.dem_error, self.velocity, self._residualStage(ifg_phase)["temporal_coherence"]
+
+    def _residualStage(self, ifg_phase):
+        """
+        Model and residual phase of the optimum.
+
+        :return: dict of TU_RESIDUAL_ATTRIBUTES
+        """
+        demerr, vel = self.dem_error, self.velocity
         model_phase, demerror_phase, vel_phase, model_pbase_linspace, model_tbase_lispace = (
             self.modelPhase(demerr, vel, self.pbase_ifg, self.tbase_ifg))
         res_phase, res_phase_dem, res_phase_vel = self.residualPhase(ifg_phase, self.design_matrix, demerr, vel)
-        gamma_grid = self.searchSpaceGamma(self.dem_error_range, self.velocity_range, self.design_matrix, ifg_phase)
 
         if self.parms.remove_seasonal_after_temp_uw:  # remove seasonal phase
-            # TODO: get slc_dates from ifg_network when network dynamically created to avoid inconsistencies
-            dates = np.array([
-                [(self.data.slc_dates[ifg_date[0]] - self.data.slc_dates[0]).days / 365.25,
-                 (self.data.slc_dates[ifg_date[1]] - self.data.slc_dates[0]).days / 365.25]
-                for ifg_date in self.data.ifg_network.ifg_list])
-            seas_phase, res_phase = self.estimateAnnual(dates, res_phase)
+            seas_phase, res_phase = self.estimateAnnual(self._seasonalDates(), res_phase)
 
         temporal_coherence = np.abs(np.mean(np.exp(1j * res_phase), axis=0))
-        self.velocity = vel
-        self.dem_error = demerr
-        self.temporal_coherence = temporal_coherence
-        self.ifg_phase = ifg_phase
-        self.residual_phase = res_phase
-        self.residual_phase_dem = res_phase_dem
-        self.residual_phase_velocity = res_phase_vel
-        self.model_phase = model_phase
-        self.velocity_phase = vel_phase
-        self.dem_error_phase = demerror_phase
-        self.model_pbase_linspace = model_pbase_linspace
-        self.model_tbase_lispace = model_tbase_lispace
-        self.gamma_grid = gamma_grid
-        return
+        return {"model_phase": model_phase,
+                "dem_error_phase": demerror_phase,
+                "velocity_phase": vel_phase,
+                "model_pbase_linspace": model_pbase_linspace,
+                "model_tbase_lispace": model_tbase_lispace,
+                "residual_phase": res_phase,
+                "residual_phase_dem": res_phase_dem,
+                "residual_phase_velocity": res_phase_vel,
+                "temporal_coherence": temporal_coherence}
+
+    def coarseToFineSearch(self, ifg_phase):
+        """
+        Search a coarse grid that cannot miss a peak and refine its best local maxima. The number of samples of the
+        coarse grid only depends on the bounds and the baselines, the resolution on the refinement parameters.
+        """
+        demerr_num_samples = aliasingFreeNumSamples(self.design_matrix[:, 0], self.parms.demerr_bound_min,
+                                                    self.parms.demerr_bound_max)
+        vel_num_samples = aliasingFreeNumSamples(self.design_matrix[:, 1], self.parms.velocity_bound_min,
+                                                 self.parms.velocity_bound_max)
+        self.coherence_engine.configure(
+            self.design_matrix,
+            np.linspace(self.parms.demerr_bound_min, self.parms.demerr_bound_max, demerr_num_samples),
+            np.linspace(self.parms.velocity_bound_min, self.parms.velocity_bound_max, vel_num_samples))
+        demerr, vel, gamma = self.coherence_engine.coarseToFineSearch(ifg_phase,
+                                                                      num_peaks=self.parms.refine_num_peaks,
+                                                                      num_levels=self.parms.refine_num_levels,
+                                                                      refine_factor=self.parms.refine_factor)
+        self.search_resolution = self.coherence_engine.resolution
+        self.search_num_evaluations = self.coherence_engine.num_evaluations
+        return demerr, vel, gamma
 
     def searchSpaceGamma(self, demerr_range, vel_range, design_matrix, ifg_phase):
-        grid_demerr_range, grid_vel_range = np.meshgrid(demerr_range, vel_range)
-        gamma_grid = np.array([1 - unwrapping.objFuncTemporalCoherence(
-            np.array([grid_demerr_range.flatten()[i], grid_vel_range.flatten()[i]]),
-            design_matrix, ifg_phase, 1, 1) for i in range(grid_demerr_range.flatten().shape[0])])
-        gamma_grid = gamma_grid.reshape(grid_demerr_range.shape)
-        return gamma_grid
+        """
+        Temporal coherence of the search space with shape (velocity samples, demerr samples).
+        """
+        self.coherence_engine.configure(design_matrix, demerr_range, vel_range)
+        return self.coherence_engine.gammaGrid(ifg_phase)
 
     def residualPhase(self, ifg_phase, design_matrix, demerr, vel):
         res_phase_dem = np.angle(np.exp(1j * ifg_phase) * np.conjugate(np.exp(1j * design_matrix[:, 0] * demerr)))
@@ -1,14 +1,25 @@
 
+import os
+import logging
 from PySide6.QtGui import QKeySequence, QAction
 from app.src.widget.widget_setting_tab_network import showNetworkWidget
 from app.src.widget.widget_setting_tab_ts import showTimeSeriesWidget
 from app.src.widget.widget_setting_tab_tempuw import showTemporalUnwrapWidget
 from app.src.widget import screenshot
+from app.src.widget.progress import ProgressDialog
+from app.src.sidecar import makeCacheDir
+from app.src.roi_unwrapping import temporalUnwrapRoi, writeRoiRasters, readRoiRasters, ROI_TU_FILE
+
+logger = logging.getLogger(__name__)
+
+# products of the temporal unwrapping of a region and the labels of their color bars
+ROI_TU_LABELS = {"velocity": "velocity [cm/yr]", "demerr": "DEM error [m]", "coherence": "temporal coherence"}
 
 def connectMenuBarActions(main_window):
     menubar = main_window.ui.menuBar()
     file_menu = menubar.addMenu("File")
     window_menu = menubar.addMenu("Window")
+    tools_menu = menubar.addMenu("Tools")
 
     save_window_action = QAction("Save Snapshot", main_window)
     save_window_action.setShortcut(QKeySequence("Ctrl+S"))
@@ -22,6 +33,11 @@ def connectMenuBarActions(main_window):
         lambda: screenshot.screenShotPretty(main_window))
     file_menu.addAction(save_pretty_window_action)
 
+    create_pyramid_action = QAction("Create Background Pyramid", main_window)
+    create_pyramid_action.triggered.connect(
+        lambda: _createBackgroundPyramid(main_window))
+    file_menu.addAction(create_pyramid_action)
+
     setting_doc_action = QAction("Main Settings", main_window)
     setting_doc_action.setCheckable(True)
     setting_doc_action.setShortcut(QKeySequence("Ctrl+T"))
@@ -52,6 +68,23 @@ def connectMenuBarActions(main_window):
     network_action.triggered.connect(lambda status: showNetworkWidget(main_window, status))
     window_menu.addAction(network_action)
 
+    roi_box_action = QAction("Temporal Unwrap Box", main_window)
+    roi_box_action.triggered.connect(lambda: _temporalUnwrapRoi(main_window, "box"))
+    tools_menu.addAction(roi_box_action)
+
+    roi_polygon_action = QAction("Temporal Unwrap Polygon", main_window)
+    roi_polygon_action.triggered.connect(lambda: _temporalUnwrapRoi(main_window, "polygon"))
+    tools_menu.addAction(roi_polygon_action)
+
+    for product, label in ROI_TU_LABELS.items():
+        roi_show_action = QAction(f"Show Region {label.split(' [')[0].title()}", main_window)
+        roi_show_action.triggered.connect(lambda _=None, product=product: _showRoiRaster(main_window, product))
+        tools_menu.addAction(roi_show_action)
+
+    roi_hide_action = QAction("Hide Region Result", main_window)
+    roi_hide_action.triggered.connect(lambda: main_window.plot.clearRoiRaster())
+    tools_menu.addAction(roi_hide_action)
+
     return menubar
 
 
@@ -71,6 +104,59 @@ def checkMenuAction(main_window, menu_name, action_name, status):
         action.setChecked(status)
 
 
+def _createBackgroundPyramid(main_window):
+    """write the background overview pyramid with a progress dialog and redraw the background from it"""
+    with ProgressDialog(main_window.ui, "Creating the background pyramid...") as progress:
+        completed = main_window.data.createBackgroundPyramid(progress=progress)
+    if not completed:
+        main_window.ui.statusBar().showMessage("Background pyramid not created")
+        return
+    main_window.plot.plotBackground()
+
+
+def _temporalUnwrapRoi(main_window, shape):
+    """draw a box or polygon on the map and unwrap every pixel inside it"""
+    main_window.ui.statusBar().showMessage(
+        "Draw the region on the map" + (", close the polygon on its first vertex" if shape == "polygon" else ""))
+    main_window.plot.selectRoi(shape, lambda vertices: _runTemporalUnwrapRoi(main_window, vertices))
+
+
+def _runTemporalUnwrapRoi(main_window, vertices):
+    """run the temporal unwrapping of a region with a progress dialog, write and show the rasters"""
+    plot = main_window.plot
+    data = main_window.data
+    tu_parms = plot.plot_temporal_unwrapping.tu.parms
+    reference = (plot.last_right_clicked_x_ref, plot.last_right_clicked_y_ref)
+
+    with ProgressDialog(main_window.ui, "Temporal unwrapping of the region...") as progress:
+        result = temporalUnwrapRoi(data, tu_parms, vertices, reference=reference, num_workers=data.num_workers,
+                                   progress=progress)
+    if result is None:
+        main_window.ui.statusBar().showMessage("Temporal unwrapping of the region cancelled")
+        return
+    plot.roi_result = result
+    if makeCacheDir(data.cache_path):
+        writeRoiRasters(os.path.join(data.cache_path, ROI_TU_FILE), result,
+                        attrs={"reference_type": tu_parms.reference_type,
+                               "reference": None if None in reference else reference,
+                               "network_type": data.network_type})
+    _showRoiRaster(main_window, "velocity")
+
+
+def _showRoiRaster(main_window, product):
+    """show a raster of the last temporal unwrapping of a region over the map background"""
+    plot = main_window.plot
+    result = plot.roi_result
+    if result is None:
+        result = readRoiRasters(os.path.join(main_window.data.cache_path, ROI_TU_FILE))
+        if result is None:
+            main_window.ui.statusBar().showMessage("No temporal unwrapping of a region found")
+            return
+        plot.roi_result = result
+    image = result[product] * 100 if product == "velocity" else result[product]
+    plot.plotRoiRaster(image, result["bbox"], label=ROI_TU_LABELS[product])
+
+
 def _showSettingWidget(main_window):
     main_window._toggleDock(main_window.ui.dock_widget_setting)
 
@@ -0,0 +1,44 @@
+from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QApplication, QProgressDialog
+
+
+class ProgressDialog:
+    """
+    Modal progress dialog for long jobs in the GUI thread.
+
+    The instance is the progress callback of the job: it is called with (number done, total), processes the
+    pending events to keep the window responsive and returns False once the job is cancelled. The dialog is only
+    created on the first call, so jobs that finish without reporting progress do not flash a dialog.
+    """
+
+    def __init__(self, parent, label: str, cancelable: bool = True):
+        """
+        :param parent: Parent widget.
+        :param label: Text of the dialog.
+        :param cancelable: If False, the dialog has no cancel button.
+        """
+        self.parent = parent
+        self.label = label
+        self.cancelable = cancelable
+        self.dialog = None
+
+    def __call__(self, num_done: int, num_total: int):
+        if self.dialog is None:
+            self.dialog = QProgressDialog(self.label, "Cancel" if self.cancelable else None, 0, num_total,
+                                          self.parent)
+            self.dialog.setWindowModality(Qt.WindowModal)
+            self.dialog.setMinimumDuration(0)
+        self.dialog.setMaximum(num_total)
+        self.dialog.setValue(num_done)
+        QApplication.processEvents()
+        return not self.dialog.wasCanceled()
+
+    def close(self):
+        if self.dialog is not None:
+            self.dialog.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
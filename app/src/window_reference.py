@@ -0,0 +1,149 @@
+import logging
+import numpy as np
+from .cache import LruCache
+
+logger = logging.getLogger(__name__)
+
+# largest size in pixels of the tiles with one summed-area table
+WINDOW_TILE_SIZE = 32
+# smaller tiles are not worth a table, the windows are read directly instead
+WINDOW_TILE_SIZE_MIN = 4
+# pixels read around a tile. Windows up to 2 * margin + 1 pixels are served from the tile
+WINDOW_TILE_MARGIN = 8
+# memory of one summed-area table. The tile size shrinks with the number of ifgs to stay below it
+WINDOW_TABLE_NBYTES = 4 * 1024 ** 2
+WINDOW_CACHE_NBYTES = 512 * 1024 ** 2
+
+
+def summedAreaTable(ifg_cpx, dtype=np.complex128):
+    """
+    Integral image of complex interferograms over the first two axes.
+
+    :param ifg_cpx: numpy.ndarray (lines, pixels, ifgs)
+    :param dtype: Data type of the table. The sums are accumulated in complex128 in any case.
+
+    :return: numpy.ndarray (lines + 1, pixels + 1, ifgs) with sat[i, j] = sum(ifg_cpx[:i, :j])
+    """
+    sat = np.zeros((ifg_cpx.shape[0] + 1, ifg_cpx.shape[1] + 1) + ifg_cpx.shape[2:], dtype=np.complex128)
+    np.cumsum(ifg_cpx, axis=0, dtype=np.complex128, out=sat[1:, 1:])
+    np.cumsum(sat[1:, 1:], axis=1, out=sat[1:, 1:])
+    return sat if sat.dtype == dtype else sat.astype(dtype)
+
+
+def _rectangleSum(sat, y0: int, y1: int, x0: int, x1: int):
+    # differences of complex64 tables are taken in complex128
+    return (sat[y1, x1].astype(np.complex128) - sat[y0, x1] - sat[y1, x0] + sat[y0, x0])
+
+
+class WindowReferenceCache:
+    """
+    This class computes the window reference of temporal unwrapping from cached summed-area tables.
+
+    The image is divided into tiles. For each tile, the interferograms of the tile and a margin around it are read
+    once and integrated. The centre pixel and the mean of any window around it are then a few lookups per ifg.
+    The tables are stored as complex64 and the tiles get smaller with more ifgs, so a table stays below
+    table_nbytes and the first lookup in a tile does not read much more than the window itself.
+    """
+
+    def __init__(self, max_nbytes: int = WINDOW_CACHE_NBYTES, tile_size: int = WINDOW_TILE_SIZE,
+                 margin: int = WINDOW_TILE_MARGIN, table_nbytes: int = WINDOW_TABLE_NBYTES):
+        """
+        Initialize the WindowReferenceCache class.
+
+        :param max_nbytes: Memory budget of all summed-area tables in bytes.
+        :param tile_size: Largest size of the tiles in pixels.
+        :param margin: Pixels read around a tile.
+        :param table_nbytes: Memory budget of one summed-area table in bytes.
+        """
+        self.tile_size = tile_size
+        self.margin = margin
+        self.table_nbytes = table_nbytes
+        self.tables = LruCache(max_nbytes)
+
+    def tileSize(self, num_ifgs: int):
+        """
+        :return: Size of the tiles for num_ifgs interferograms or None if the windows are read directly.
+        """
+        side = int(np.sqrt(self.table_nbytes / (num_ifgs * np.dtype(np.complex64).itemsize)))
+        tile_size = min(side - 2 * self.margin - 1, self.tile_size)
+        return tile_size if tile_size >= WINDOW_TILE_SIZE_MIN else None
+
+    def clear(self):
+        self.tables.clear()
+
+    def _table(self, read_method, network, key, tile_size: int, tile_az: int, tile_ra: int, shape):
+        """
+        Return the summed-area table of a tile and the image coordinates of its first pixel.
+        """
+        cache_key = key + (tile_size, tile_az, tile_ra)
+        entry = self.tables.get(cache_key)
+        if entry is None or entry[0] is not network:
+            az0 = max(tile_az * tile_size - self.margin, 0)
+            ra0 = max(tile_ra * tile_size - self.margin, 0)
+            az1 = min((tile_az + 1) * tile_size + self.margin, shape[0])
+            ra1 = min((tile_ra + 1) * tile_size + self.margin, shape[1])
+            sat = summedAreaTable(read_method(ra=ra0, az=az0, ra2=ra1, az2=az1), dtype=np.complex64)
+            entry = (network, sat, az0, ra0)
+            self.tables.put(cache_key, entry, nbytes=sat.nbytes)
+        return entry[1], entry[2], entry[3]
+
+    def read(self, read_method, network, key: tuple, az: int, ra: int, wds_az: int, wds_ra: int, shape,
+             num_ifgs: int):
+        """
+        Return the interferograms of the centre pixel and the mean of the window around it without the centre.
+        The window is clipped at the image border.
+
+        :param read_method: Function reading the interferograms of a window (ra, az, ra2, az2) as
+                            (lines, pixels, ifgs).
+        :param network: Interferogram network the tables are computed for. Tables of other networks are not used.
+        :param key: Tuple identifying the source of the interferograms, e.g. the network type.
+        :param az: Azimuth coordinate of the centre.
+        :param ra: Range coordinate of the centre.
+        :param wds_az: Window size in azimuth.
+        :param wds_ra: Window size in range.
+        :param shape: (lines, pixels) of the image.
+        :param num_ifgs: Number of interferograms of the network.
+
+        :return: tuple of numpy.ndarray (ifgs,) with centre and window mean
+        """
+        centre, window_mean = self.readPixels(read_method, network, key, np.array([az]), np.array([ra]), wds_az,
+                                              wds_ra, shape, num_ifgs)
+        return centre[0], window_mean[0]
+
+    def readPixels(self, read_method, network, key: tuple, az, ra, wds_az: int, wds_ra: int, shape, num_ifgs: int):
+        """
+        read() for many pixels, e.g. the pixels of a region. The pixels of a tile are looked up together.
+
+        :param az: numpy.ndarray (pixels,) of the azimuth coordinates of the centres.
+        :param ra: numpy.ndarray (pixels,) of the range coordinates of the centres.
+
+        :return: tuple of numpy.ndarray (pixels, ifgs) with centres and window means
+        """
+        az = np.asarray(az, dtype=np.int64)
+        ra = np.asarray(ra, dtype=np.int64)
+        y0, y1 = np.maximum(az - wds_az // 2, 0), np.minimum(az + wds_az // 2 + 1, shape[0])
+        x0, x1 = np.maximum(ra - wds_ra // 2, 0), np.minimum(ra + wds_ra // 2 + 1, shape[1])
+        num_neighbors = np.maximum((y1 - y0) * (x1 - x0) - 1, 1)
+        centre = np.empty((az.size, num_ifgs), dtype=np.complex128)
+        window_sum = np.empty((az.size, num_ifgs), dtype=np.complex128)
+        tile_size = self.tileSize(num_ifgs)
+        if tile_size is None or wds_az // 2 > self.margin or wds_ra // 2 > self.margin:
+            # too many ifgs for a table or window larger than the tile margin: one read serves the centre and window
+            for i in range(az.size):
+                window = read_method(ra=int(x0[i]), az=int(y0[i]), ra2=int(x1[i]), az2=int(y1[i]))
+                window = window.astype(np.complex128)
+                centre[i] = window[az[i] - y0[i], ra[i] - x0[i]]
+                window_sum[i] = window.sum(axis=(0, 1))
+        else:
+            tiles, tile_index = np.unique(np.column_stack([az // tile_size, ra // tile_size]), axis=0,
+                                          return_inverse=True)
+            for i, (tile_az, tile_ra) in enumerate(tiles):
+                pixels = np.nonzero(tile_index.ravel() == i)[0]
+                sat, az_origin, ra_origin = self._table(read_method, network, key, tile_size, int(tile_az),
+                                                        int(tile_ra), shape)
+                p_az, p_ra = az[pixels] - az_origin, ra[pixels] - ra_origin
+                centre[pixels] = _rectangleSum(sat, p_az, p_az + 1, p_ra, p_ra + 1)
+                window_sum[pixels] = _rectangleSum(sat, y0[pixels] - az_origin, y1[pixels] - az_origin,
+                                                   x0[pixels] - ra_origin, x1[pixels] - ra_origin)
+        window_mean = (window_sum - centre) / num_neighbors[:, np.newaxis]
+        return centre.astype(np.complex64), window_mean.astype(np.complex64)
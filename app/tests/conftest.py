@@ -0,0 +1,66 @@
+import os
+import sys
+
+# the modules are imported as the package src, as in main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import types
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+
+
+class SimulatedData:
+    """
+    The attributes and read methods of Data used by temporal unwrapping, for a small simulated ifg stack.
+    """
+
+    def __init__(self, n_lines: int = 24, n_pixels: int = 30, num_slc: int = 16, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.n_lines, self.n_pixels = n_lines, n_pixels
+        self.wavelength = 0.0555
+        self.network_type = "ifg_stack"
+        self.slc_dates = [datetime(2020, 1, 1) + timedelta(days=24 * i) for i in range(num_slc)]
+        ifg_list = np.array([(i, j) for i in range(num_slc) for j in range(i + 1, min(i + 4, num_slc))])
+        slc_pbase = rng.uniform(-150, 150, num_slc)
+        slc_tbase = np.array([(date - self.slc_dates[0]).days / 365.25 for date in self.slc_dates])
+        self.ifg_network = types.SimpleNamespace(ifg_list=ifg_list,
+                                                 pbase_ifg=slc_pbase[ifg_list[:, 1]] - slc_pbase[ifg_list[:, 0]],
+                                                 tbase_ifg=slc_tbase[ifg_list[:, 1]] - slc_tbase[ifg_list[:, 0]])
+        yy, xx = np.mgrid[0:n_lines, 0:n_pixels]
+        self.factor = (8e5 + 100 * xx + 10 * yy).astype(np.float32)
+        velocity = 0.02 * np.sin(xx / 9) + 0.001 * yy
+        demerr = 20 * np.cos(yy / 7)
+        design_demerr = -4 * np.pi / self.wavelength * self.ifg_network.pbase_ifg
+        design_vel = -4 * np.pi / self.wavelength * self.ifg_network.tbase_ifg
+        phase = (design_demerr * (demerr / self.factor)[..., np.newaxis] + design_vel * velocity[..., np.newaxis] +
+                 rng.normal(0, 0.3, (n_lines, n_pixels, ifg_list.shape[0])))
+        self.ifgs = np.exp(1j * phase).astype(np.complex64)
+
+    def readInterferogramPhaseForAzRa(self, ra, az, ra2=None, az2=None):
+        if ra2 is None and az2 is None:
+            return self.ifgs[az, ra].copy()
+        return self.ifgs[az:az2, ra:ra2].copy()
+
+    # the simulated stack stands for every network
+    calculateInterferogramPhaseForAzRa = readInterferogramPhaseForAzRa
+
+    def readSlantRangeForAzRa(self, ra, az):
+        return self.factor[az, ra] / np.float32(np.sin(np.deg2rad(35)))
+
+    def readIncidenceAngleForAzRa(self, ra, az):
+        return np.float32(35)
+
+    def readGeometryFactorForAzRa(self, ra, az):
+        return self.factor[az, ra]
+
+    def interferogramTileShape(self):
+        return 8, 8
+
+    def constructDynamicNetwork(self):
+        pass
+
+
+@pytest.fixture
+def simulated_data():
+    return SimulatedData()
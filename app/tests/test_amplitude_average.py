@@ -0,0 +1,58 @@
+import warnings
+import numpy as np
+import pytest
+from src.amplitude_average import RunningAmplitudeAverage
+
+
+@pytest.fixture
+def frames():
+    return np.random.default_rng(0).gamma(2., 50., size=(40, 6, 7)).astype(np.float32)
+
+
+def testSlidingWindowMatchesTheMean(frames):
+    averager = RunningAmplitudeAverage()
+    for start in list(range(0, 30)) + [12, 3, 25]:
+        ind = np.arange(start, start + 10)
+        np.testing.assert_allclose(averager.average(ind, lambda i: frames[i]), frames[ind].mean(axis=0), rtol=1e-6)
+
+
+def testSteppingReadsTheEnteringAndLeavingDates(frames):
+    averager = RunningAmplitudeAverage()
+    averager.average(np.arange(0, 10), lambda i: frames[i])
+    assert averager.n_reads == 10
+    averager.average(np.arange(1, 11), lambda i: frames[i])
+    assert averager.n_reads == 12
+    # a jump that would need more reads than the window is rebuilt
+    averager.average(np.arange(20, 30), lambda i: frames[i])
+    assert averager.n_reads == 22
+    assert averager.sum.shape == frames.shape[1:]
+
+
+def testKeyChangeResets(frames):
+    averager = RunningAmplitudeAverage()
+    averager.average([0, 1], lambda i: frames[i], key="full")
+    average = averager.average([0, 1], lambda i: frames[i][:2, :2], key=(2, 0, 2, 0, 2))
+    np.testing.assert_allclose(average, frames[:2, :2, :2].mean(axis=0), rtol=1e-6)
+    with pytest.raises(ValueError):
+        averager.average([], lambda i: frames[i])
+
+
+
+def testNanFramesDoNotSpoilTheSum(frames):
+    frames[5, 2, 3] = np.nan
+    frames[5:15, 0, 0] = np.nan
+    averager = RunningAmplitudeAverage()
+    for start in range(0, 20):
+        ind = np.arange(start, start + 10)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # mean of the window with only NaN
+            expected = np.nanmean(frames[ind], axis=0)
+        np.testing.assert_allclose(averager.average(ind, lambda i: frames[i]), expected, rtol=1e-6)
+    assert np.isnan(averager.average(np.arange(6, 15), lambda i: frames[i])[0, 0])
+    # the last NaN frame leaves the window in a step without a rebuild
+    averager.average(np.arange(14, 24), lambda i: frames[i])
+    n_reads = averager.n_reads
+    np.testing.assert_allclose(averager.average(np.arange(15, 25), lambda i: frames[i]),
+                               frames[15:25].mean(axis=0), rtol=1e-6)
+    assert averager.n_reads == n_reads + 2
+    assert averager.count.min() == 10
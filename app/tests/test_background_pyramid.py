@@ -0,0 +1,48 @@
+import os
+import types
+import h5py as h5
+import numpy as np
+from src.h5_pool import H5FilePool
+from src.background_pyramid import BackgroundPyramid, createBackgroundPyramid, downsample
+
+
+def _data(tmp_path):
+    rng = np.random.default_rng(0)
+    slc = (rng.normal(size=(4, 13, 10)) + 1j * rng.normal(size=(4, 13, 10))).astype(np.complex64)
+    slc_stack_file = str(tmp_path / "slcStack.h5")
+    with h5.File(slc_stack_file, 'w') as h_file:
+        h_file.create_dataset('slc', data=slc)
+    mean_amplitude = np.abs(slc).mean(axis=0)
+    data = types.SimpleNamespace(slc_dimension=slc.shape, slc_stack_file=slc_stack_file, slc_stack_file_exist=True,
+                                 mean_amplitude_file_exist=False, h5_pool=H5FilePool(),
+                                 readMeanAmplitude=lambda: mean_amplitude, readTemporalCoherence=lambda: None)
+    return data, slc, mean_amplitude
+
+
+def testDownsampleAveragesBlocksAtTheBorder():
+    image = np.arange(15, dtype=np.float32).reshape(3, 5)
+    np.testing.assert_allclose(downsample(image, 2), [[3, 5, 6.5], [10.5, 12.5, 14]])
+
+
+def testPyramidLevels(tmp_path):
+    data, slc, mean_amplitude = _data(tmp_path)
+    out_file = str(tmp_path / "pyramid.h5")
+    assert createBackgroundPyramid(data, out_file, n_levels=2)
+    pyramid = BackgroundPyramid(out_file, data.h5_pool, {"mean amplitude": data.slc_stack_file,
+                                                         "amplitude": data.slc_stack_file})
+    assert pyramid.factors("mean amplitude") == [1, 2, 4]
+    assert pyramid.factors("amplitude") == [2, 4]
+    np.testing.assert_allclose(pyramid.readWindow("mean amplitude", 4, 0, 4, 0, 3), downsample(mean_amplitude, 4))
+    np.testing.assert_allclose(pyramid.readWindow("amplitude", 2, 0, 7, 0, 5, ind=[3, 1]),
+                               downsample(np.abs(slc[[1, 3]]), 2), rtol=1e-6)
+
+
+def testCancelledPyramidLeavesNoFile(tmp_path):
+    data, _, _ = _data(tmp_path)
+    out_file = str(tmp_path / "pyramid.h5")
+    calls = []
+    assert not createBackgroundPyramid(data, out_file, n_levels=2,
+                                       progress=lambda num_done, num_dates: calls.append(num_done) or num_done < 2)
+    assert calls == [1, 2]
+    assert not os.path.exists(out_file)
+    assert not os.path.exists(out_file + ".tmp")
@@ -0,0 +1,74 @@
+import h5py as h5
+import numpy as np
+import pytest
+from src.h5_pool import H5FilePool
+from src.cache import ChunkCache, LruCache
+
+
+@pytest.fixture
+def stack(tmp_path):
+    rng = np.random.default_rng(0)
+    ifgs = (rng.normal(size=(21, 19, 5)) + 1j * rng.normal(size=(21, 19, 5))).astype(np.complex64)
+    file_path = str(tmp_path / "ifg_stack.h5")
+    with h5.File(file_path, 'w') as h_file:
+        h_file.create_dataset('ifgs', data=ifgs, chunks=(8, 8, 5))
+    return file_path, ifgs
+
+
+def testReadPixelAndWindowMatchTheFile(stack):
+    file_path, ifgs = stack
+    cache = ChunkCache(H5FilePool(), max_nbytes=64 * 1024 ** 2)
+    assert cache.tileShape(file_path, 'ifgs') == (8, 8)
+    for az, ra in [(0, 0), (7, 8), (20, 18), (13, 5)]:
+        np.testing.assert_array_equal(cache.readPixel(file_path, 'ifgs', az, ra), ifgs[az, ra])
+    # windows across tile borders and clipped at the image border
+    np.testing.assert_array_equal(cache.readWindow(file_path, 'ifgs', 5, 6, 17, 18), ifgs[5:17, 6:18])
+    np.testing.assert_array_equal(cache.readWindow(file_path, 'ifgs', -2, 15, 3, 25), ifgs[0:3, 15:19])
+
+
+def testChangingAReadPixelKeepsTheCache(stack):
+    file_path, ifgs = stack
+    cache = ChunkCache(H5FilePool(), max_nbytes=64 * 1024 ** 2)
+    ts = cache.readPixel(file_path, 'ifgs', 3, 4)
+    ts *= np.conjugate(ts.mean())
+    np.testing.assert_array_equal(cache.readPixel(file_path, 'ifgs', 3, 4), ifgs[3, 4])
+    with pytest.raises(ValueError):
+        cache.readTile(file_path, 'ifgs', 0, 0)[0, 0] = 0
+
+
+def testClearedFileIsTiledWithItsNewChunks(stack):
+    file_path, ifgs = stack
+    pool = H5FilePool()
+    cache = ChunkCache(pool, max_nbytes=64 * 1024 ** 2)
+    cache.readPixel(file_path, 'ifgs', 3, 4)
+    cache.clear(file_path)
+    pool.close(file_path)
+    with h5.File(file_path, 'w') as h_file:
+        h_file.create_dataset('ifgs', data=ifgs[::-1], chunks=(4, 16, 5))
+    assert cache.tileShape(file_path, 'ifgs') == (4, 16)
+    np.testing.assert_array_equal(cache.readWindow(file_path, 'ifgs', 2, 3, 19, 18), ifgs[::-1][2:19, 3:18])
+
+
+def testTilesAreEvictedByBytes(stack):
+    file_path, _ = stack
+    tile_nbytes = 8 * 8 * 5 * 8
+    cache = ChunkCache(H5FilePool(), max_nbytes=2 * tile_nbytes)
+    for tile_az, tile_ra in [(0, 0), (0, 1), (1, 0)]:
+        cache.readTile(file_path, 'ifgs', tile_az, tile_ra)
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["nbytes"] == 2 * tile_nbytes
+    cache.readTile(file_path, 'ifgs', 0, 0)
+    assert cache.stats()["hits"] == 0
+
+
+def testLruCacheEvictsLeastRecentlyUsed():
+    cache = LruCache(max_nbytes=3)
+    for key in "abc":
+        cache.put(key, key, nbytes=1)
+    cache.get("a")
+    cache.put("d", "d", nbytes=1)
+    assert "b" not in cache
+    assert list(cache.entries) == ["c", "a", "d"]
+    cache.put("e", "e", nbytes=4)
+    assert "e" not in cache
+    assert cache.nbytes == 3
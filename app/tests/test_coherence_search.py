@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from src.coherence_search import TemporalCoherenceEngine, aliasingFreeNumSamples
+
+
+@pytest.fixture
+def arc():
+    rng = np.random.default_rng(1)
+    num_ifgs = 80
+    design_matrix = np.zeros((num_ifgs, 2))
+    design_matrix[:, 0] = -4 * np.pi / 0.0555 * rng.uniform(-150, 150, num_ifgs) / (850e3 * np.sin(0.6))
+    design_matrix[:, 1] = -4 * np.pi / 0.0555 * rng.uniform(-2, 2, num_ifgs)
+    ifg_phase = np.angle(np.exp(1j * (design_matrix @ [12.3, 0.0071] + rng.normal(0, 0.4, num_ifgs))))
+    return design_matrix, ifg_phase
+
+
+def _directGamma(design_matrix, ifg_phase, demerr, vel):
+    return np.abs(np.mean(np.exp(1j * (ifg_phase - design_matrix @ [demerr, vel]))))
+
+
+def testGammaGridMatchesTheDirectSum(arc):
+    design_matrix, ifg_phase = arc
+    demerr_range, vel_range = np.linspace(-50, 50, 21), np.linspace(-0.05, 0.05, 31)
+    engine = TemporalCoherenceEngine()
+    engine.configure(design_matrix, demerr_range, vel_range)
+    expected = np.array([[_directGamma(design_matrix, ifg_phase, demerr, vel) for demerr in demerr_range]
+                         for vel in vel_range])
+    np.testing.assert_allclose(engine.gammaGrid(ifg_phase), expected, atol=1e-5)
+
+
+def testCoarseToFineFindsTheFineGridOptimum(arc):
+    design_matrix, ifg_phase = arc
+    bounds = (-50, 50, -0.05, 0.05)
+    engine = TemporalCoherenceEngine()
+    engine.configure(design_matrix,
+                     np.linspace(bounds[0], bounds[1], aliasingFreeNumSamples(design_matrix[:, 0], *bounds[:2])),
+                     np.linspace(bounds[2], bounds[3], aliasingFreeNumSamples(design_matrix[:, 1], *bounds[2:])))
+    demerr, vel, gamma = engine.coarseToFineSearch(ifg_phase)
+
+    fine = TemporalCoherenceEngine()
+    fine_demerr, fine_vel = np.linspace(bounds[0], bounds[1], 801), np.linspace(bounds[2], bounds[3], 801)
+    fine.configure(design_matrix, fine_demerr, fine_vel)
+    fine_gamma = fine.gammaGrid(ifg_phase)
+    idx_vel, idx_demerr = np.unravel_index(np.argmax(fine_gamma), fine_gamma.shape)
+    assert gamma >= fine_gamma[idx_vel, idx_demerr] - 1e-4
+    assert abs(demerr - fine_demerr[idx_demerr]) < 2 * np.ptp(fine_demerr) / 800
+    assert abs(vel - fine_vel[idx_vel]) < 2 * np.ptp(fine_vel) / 800
+    assert engine.num_evaluations < fine_gamma.size
+    assert engine.renderSearchSpace(fine_demerr[::8], fine_vel[::8]).shape == (101, 101)
+
+
+def testAliasingFreeNumSamples():
+    design_column = np.array([0.5, -2.0, 1.0])
+    # step of a quarter of the shortest period 2 * pi / 2
+    assert aliasingFreeNumSamples(design_column, 0, 100) == int(np.ceil(100 / (0.25 * np.pi))) + 1
+    assert aliasingFreeNumSamples(design_column, 0, 0.1) == 11
+    assert aliasingFreeNumSamples(np.zeros(3), 0, 100, min_samples=5) == 5
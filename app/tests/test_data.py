@@ -0,0 +1,108 @@
+import weakref
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import h5py as h5
+import numpy as np
+import pytest
+from src.h5_pool import H5FilePool
+
+pytest.importorskip("sarvey")
+from src.data import Data  # noqa: E402
+
+
+class _PhaseRows:
+    def __init__(self, phase):
+        self.phase = phase
+        self.shape = phase.shape
+        self.num_reads = 0
+
+    def readRows(self, idx):
+        self.num_reads += 1
+        return self.phase[np.asarray(idx)]
+
+
+@pytest.fixture
+def p2_data():
+    rng = np.random.default_rng(6)
+    num_points, num_images = 40, 12
+    data = Data.__new__(Data)
+    data.wavelength = 0.0555
+    data.p2 = SimpleNamespace(phase=_PhaseRows(rng.uniform(-np.pi, np.pi, (num_points, num_images))),
+                              slant_range=rng.uniform(8e5, 9e5, num_points),
+                              loc_inc=rng.uniform(0.5, 0.8, num_points),
+                              ifg_net_obj=SimpleNamespace(pbase=rng.uniform(-150, 150, num_images)))
+    data.p2_demerr = rng.uniform(-20, 20, num_points)
+    return data
+
+
+def _timeseries(data, idx, idx_ref):
+    def _phase(i):
+        if i is None:
+            return np.zeros(data.p2.phase.shape[1])
+        factor = data.p2.slant_range[i] * np.sin(data.p2.loc_inc[i])
+        return (data.p2.phase.phase[i] -
+                4 * np.pi / data.wavelength * data.p2.ifg_net_obj.pbase * data.p2_demerr[i] / factor)
+    return _phase(idx) - _phase(idx_ref)
+
+
+def testBatchedTimeseriesMatchSinglePoints(p2_data):
+    idx = [3, 17, None, 3, 39, 0]
+    idx_ref = [5, None, 5, 17, 5, None]
+    timeseries = p2_data.readTsForIdxList(idx, idx_ref)
+    assert timeseries.shape == (len(idx), p2_data.p2.phase.shape[1])
+    assert p2_data.p2.phase.num_reads == 1
+    for i, i_ref, row in zip(idx, idx_ref, timeseries):
+        np.testing.assert_allclose(row, _timeseries(p2_data, i, i_ref), atol=1e-9)
+    np.testing.assert_allclose(p2_data.readTsForIdx(17, 5), _timeseries(p2_data, 17, 5), atol=1e-9)
+    np.testing.assert_array_equal(p2_data.readTsForIdxList([None], [None]), np.zeros((1, 12)))
+
+
+def testBatchedTimeseriesWithoutTopographicCorrection(p2_data):
+    timeseries = p2_data.readTsForIdxList([1, 2], [2, 1], remove_topo_error=False)
+    phase = p2_data.p2.phase.phase
+    np.testing.assert_allclose(timeseries, [phase[1] - phase[2], phase[2] - phase[1]])
+
+
+class _Network:
+    def __init__(self, dates, ifg_list):
+        self.dates = dates
+        self.ifg_list = ifg_list
+
+
+@pytest.fixture
+def slc_data(tmp_path):
+    rng = np.random.default_rng(7)
+    slc = (rng.normal(size=(6, 9, 11)) + 1j * rng.normal(size=(6, 9, 11))).astype(np.complex64)
+    data = Data.__new__(Data)
+    data.slc_stack_file = str(tmp_path / "slcStack.h5")
+    with h5.File(data.slc_stack_file, "w") as h_file:
+        h_file["slc"] = slc
+    data.h5_pool = H5FilePool()
+    data.slc_pixel_major_file_exist = False
+    data.slc_dates = [datetime(2021, 1, 1) + timedelta(days=12 * i) for i in range(6)]
+    data.ifg_slc_indices = weakref.WeakKeyDictionary()
+    # a network of the dates 1, 2, 4 and 5 of the stack
+    data.ifg_network = _Network([data.slc_dates[i].strftime("%Y-%m-%d") for i in (1, 2, 4, 5)],
+                                np.array([[0, 1], [0, 2], [1, 3], [2, 3]]))
+    return data, slc, np.array([[1, 2], [1, 4], [2, 5], [4, 5]])
+
+
+def testInterferogramsOfAPixelAndAWindow(slc_data):
+    data, slc, ifg_dates = slc_data
+    expected = slc[ifg_dates[:, 0]] * np.conjugate(slc[ifg_dates[:, 1]])
+    np.testing.assert_allclose(data.calculateInterferogramPhaseForAzRa(7, 3), expected[:, 3, 7], rtol=1e-6)
+    window = data.calculateInterferogramPhaseForAzRa(2, 1, ra2=10, az2=8)
+    assert window.dtype == np.complex64
+    np.testing.assert_allclose(window, np.moveaxis(expected[:, 1:8, 2:10], 0, 2), rtol=1e-6)
+    out = np.empty_like(window)
+    assert data.calculateInterferogramPhaseForAzRa(2, 1, ra2=10, az2=8, out=out) is out
+    np.testing.assert_array_equal(out, window)
+
+
+def testFormInterferogramsOnTheLastAxis():
+    rng = np.random.default_rng(8)
+    slc = rng.normal(size=(3, 4, 5)) + 1j * rng.normal(size=(3, 4, 5))
+    ref, sec = np.array([0, 0, 3]), np.array([1, 4, 4])
+    ifgs = Data._formInterferograms(slc, ref, sec)
+    for k in range(ref.size):
+        np.testing.assert_allclose(ifgs[..., k], slc[..., ref[k]] * np.conjugate(slc[..., sec[k]]), rtol=1e-6)
@@ -0,0 +1,73 @@
+import csv
+import os
+import h5py as h5
+import numpy as np
+import pytest
+
+pytest.importorskip("sarvey")
+from src.extract_timeseries import main  # noqa: E402
+from src.p2_parameters import parametersFileName, writeParametersSidecar  # noqa: E402
+from src.sidecar import CACHE_DIR_DEFAULT  # noqa: E402
+
+DATES = [f"2020-01-{day:02d}" for day in range(1, 25, 2)]
+COORD_XY = np.array([[2, 3], [5, 1], [7, 6]])  # azimuth, range
+
+
+def _writeNetwork(h_file, num_images):
+    ifg_list = np.array([[i, i + 1] for i in range(num_images - 1)])
+    tbase = np.arange(num_images) * 2 / 365.25
+    pbase = np.linspace(-50, 50, num_images)
+    h_file.attrs["num_images"] = num_images
+    h_file.attrs["num_ifgs"] = ifg_list.shape[0]
+    h_file["ifg_list"] = ifg_list
+    h_file["tbase"] = tbase
+    h_file["pbase"] = pbase
+    h_file["tbase_ifg"] = tbase[ifg_list[:, 1]] - tbase[ifg_list[:, 0]]
+    h_file["pbase_ifg"] = pbase[ifg_list[:, 1]] - pbase[ifg_list[:, 0]]
+    h_file["dates"] = np.array([date.encode() for date in DATES])
+
+
+@pytest.fixture
+def sbas_dir(tmp_path):
+    num_images, num_points = len(DATES), COORD_XY.shape[0]
+    data_path = tmp_path / "sbas"
+    (data_path / "inputs").mkdir(parents=True)
+    with h5.File(data_path / "inputs" / "slcStack.h5", "w") as h_file:
+        h_file.attrs["WAVELENGTH"] = 0.0555
+        h_file.attrs["ORBIT_DIRECTION"] = "ASCENDING"
+        h_file["slc"] = np.zeros((num_images, 9, 8), dtype=np.complex64)
+        h_file["date"] = np.array([date.replace("-", "").encode() for date in DATES])
+        h_file["bperp"] = np.linspace(-50, 50, num_images)
+    with h5.File(data_path / "ifg_network.h5", "w") as h_file:
+        _writeNetwork(h_file, num_images)
+    p2_file = str(data_path / "p2_coh80_ts.h5")
+    phase = np.outer(np.arange(1, num_points + 1), np.linspace(0, 1, num_images)).astype(np.float32)
+    phase[2, 4] = np.nan  # the models cannot be fitted to this point
+    with h5.File(p2_file, "w") as h_file:
+        _writeNetwork(h_file, num_images)
+        h_file["point_id"] = np.arange(num_points)
+        h_file["coord_xy"] = COORD_XY
+        h_file["phase"] = phase
+        h_file["coord_utm"] = np.zeros((num_points, 2))
+        h_file["slant_range"] = np.full(num_points, 850e3)
+        h_file["loc_inc"] = np.full(num_points, 0.6)
+    (data_path / CACHE_DIR_DEFAULT).mkdir()
+    writeParametersSidecar(str(data_path / CACHE_DIR_DEFAULT / parametersFileName(p2_file)), p2_file,
+                           {name: np.zeros(num_points) for name in ("velocity", "demerr", "coherence")})
+    with open(tmp_path / "points.txt", "w") as f:
+        f.writelines(f"{ra}, {az}\n" for az, ra in COORD_XY)
+    return tmp_path
+
+
+def testRelativeDataPath(sbas_dir, monkeypatch):
+    monkeypatch.chdir(sbas_dir)
+    assert main([os.path.join(".", "sbas"), "points.txt", "-o", "ts.csv", "--point_type", "range_azimuth",
+                 "--fit", "poly-1"]) == 0
+    with open(sbas_dir / "ts.csv", newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0][5:] == DATES
+    assert [row[4] for row in rows[1:]] == ["timeseries", "poly-1"] * COORD_XY.shape[0]
+    values = np.array([[float(value) for value in row[5:]] for row in rows[1:]])
+    assert np.all(np.isfinite(values[:4]))
+    # the point with a NaN date is written, its fit is a NaN row
+    assert np.isnan(values[4, 4]) and np.isnan(values[5]).all()
@@ -0,0 +1,86 @@
+import h5py as h5
+import numpy as np
+import pytest
+from src.geometry import GeometryCache
+from src.h5_pool import H5FilePool
+
+
+@pytest.fixture
+def geometry_file(tmp_path):
+    rng = np.random.default_rng(0)
+    file_path = str(tmp_path / "geometryRadar.h5")
+    with h5.File(file_path, "w") as h_file:
+        h_file["slantRangeDistance"] = rng.uniform(8e5, 9e5, size=(37, 53)).astype(np.float32)
+        h_file["incidenceAngle"] = rng.uniform(30, 45, size=(37, 53)).astype(np.float32)
+    return file_path
+
+
+def _factorFromFile(file_path):
+    with h5.File(file_path, "r") as h_file:
+        slant_range = h_file["slantRangeDistance"][()]
+        incidence_angle = h_file["incidenceAngle"][()]
+    return (slant_range * np.sin(np.deg2rad(incidence_angle))).astype(np.float32)
+
+
+def testFactorIsTheSameBeforeAndAfterLoading(geometry_file):
+    factor = _factorFromFile(geometry_file)
+    az, ra = np.array([0, 5, 36, 20]), np.array([52, 0, 7, 20])
+    # keep the grid from loading, so the factor is read from the file
+    before = GeometryCache(geometry_file, H5FilePool())
+    before._thread = object()
+    np.testing.assert_array_equal(before.factorForAzRa(az, ra), factor[az, ra])
+    assert before.factorForAzRa(5, 0) == factor[5, 0]
+    geometry = GeometryCache(geometry_file, H5FilePool())
+    assert geometry.wait(timeout=10)
+    np.testing.assert_array_equal(geometry.factorForAzRa(az, ra), factor[az, ra])
+    assert geometry.nbytes == 2 * factor.nbytes
+
+
+def testDecimatedFactorIsInterpolated(geometry_file):
+    factor = _factorFromFile(geometry_file)
+    geometry = GeometryCache(geometry_file, H5FilePool(), decimation=4)
+    assert geometry.wait(timeout=10)
+    assert geometry.nbytes < factor.nbytes / 4
+    # kept lines and pixels are exact, including the last ones
+    np.testing.assert_allclose(geometry.factorForAzRa(np.array([0, 36, 8]), np.array([0, 52, 12])),
+                               factor[[0, 36, 8], [0, 52, 12]], rtol=1e-6)
+    az, ra = np.meshgrid(np.arange(37), np.arange(53), indexing="ij")
+    assert geometry.factorForAzRa(az, ra).shape == (37, 53)
+
+
+def testMissingDatasetFallsBackToFileReads(tmp_path):
+    file_path = str(tmp_path / "geometryRadar.h5")
+    with h5.File(file_path, "w") as h_file:
+        h_file["slantRangeDistance"] = np.full((4, 4), 8e5, dtype=np.float32)
+    geometry = GeometryCache(file_path, H5FilePool())
+    assert not geometry.wait(timeout=10)
+    assert geometry.error is not None
+    assert geometry.slantRange(1, 2) == np.float32(8e5)
+
+
+def testLoadedGeometryIsNotReadFromTheFile(geometry_file):
+    pool = H5FilePool()
+    geometry = GeometryCache(geometry_file, pool)
+    assert geometry.wait(timeout=10)
+    with h5.File(geometry_file, "r") as h_file:
+        slant_range = h_file["slantRangeDistance"][()]
+        incidence_angle = h_file["incidenceAngle"][()]
+    az, ra = np.array([3, 30, 11]), np.array([50, 2, 11])
+    np.testing.assert_array_equal(geometry.slantRange(az, ra), slant_range[az, ra])
+    np.testing.assert_array_equal(geometry.incidenceAngle(az, ra), incidence_angle[az, ra])
+    assert geometry.slantRange(4, 7) == slant_range[4, 7]
+    assert pool.stats()["bytes_read"] == 0
+
+
+@pytest.mark.parametrize("chunks", [(8, 8), None])
+def testScatteredPixelsAreReadPerChunk(tmp_path, chunks):
+    file_path = str(tmp_path / "geometryRadar.h5")
+    slant_range = np.arange(64 * 64, dtype=np.float32).reshape(64, 64)
+    with h5.File(file_path, "w") as h_file:
+        h_file.create_dataset("slantRangeDistance", data=slant_range, chunks=chunks)
+    pool = H5FilePool()
+    geometry = GeometryCache(file_path, pool)
+    az, ra = np.array([[1, 60], [62, 2]]), np.array([[1, 60], [3, 61]])
+    np.testing.assert_array_equal(geometry._readPixels("slantRangeDistance", az, ra), slant_range[az, ra])
+    # not the bounding box of the pixels
+    assert pool.stats()["bytes_read"] <= 4 * 64 * slant_range.itemsize
@@ -0,0 +1,35 @@
+import os
+import h5py as h5
+import numpy as np
+from src.h5_pool import H5FilePool
+from src.cache import ChunkCache
+
+
+def _writeStack(file_path):
+    with h5.File(file_path, 'w') as h_file:
+        h_file.create_dataset('ifgs', data=np.arange(8 * 8 * 3, dtype=np.float32).reshape(8, 8, 3), chunks=(4, 4, 3))
+
+
+def testSpellingsOfOneFileShareOneHandle(tmp_path, monkeypatch):
+    _writeStack(tmp_path / "ifg_stack.h5")
+    monkeypatch.chdir(tmp_path)
+    pool = H5FilePool()
+    for file_path in ("ifg_stack.h5", os.path.join(".", "ifg_stack.h5"), str(tmp_path / "ifg_stack.h5"),
+                      os.path.join(str(tmp_path), "sub", "..", "ifg_stack.h5")):
+        pool.read(file_path, 'ifgs', np.s_[0, 0, :])
+    assert pool.stats()["opens"] == 1
+    assert pool.stats()["open_files"] == 1
+    pool.close("ifg_stack.h5")
+    assert pool.stats()["open_files"] == 0
+
+
+def testChunkCacheKeysFollowThePool(tmp_path, monkeypatch):
+    _writeStack(tmp_path / "ifg_stack.h5")
+    monkeypatch.chdir(tmp_path)
+    cache = ChunkCache(H5FilePool(), max_nbytes=1024 ** 2)
+    cache.readPixel("ifg_stack.h5", 'ifgs', 1, 1)
+    cache.readPixel(str(tmp_path / "ifg_stack.h5"), 'ifgs', 2, 2)
+    assert cache.stats()["entries"] == 1
+    assert cache.stats()["hits"] == 1
+    cache.clear(str(tmp_path / "ifg_stack.h5"))
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,44 @@
+import h5py as h5
+import numpy as np
+import pytest
+from src.h5_pool import H5FilePool
+from src.metadata import loadMetadata
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    slc_stack_file = str(tmp_path / "slcStack.h5")
+    with h5.File(slc_stack_file, "w") as h_file:
+        h_file.attrs["WAVELENGTH"] = 0.0555
+        h_file.attrs["ORBIT_DIRECTION"] = "ASCENDING"
+        h_file["slc"] = np.zeros((3, 4, 5), dtype=np.complex64)
+        h_file["date"] = np.array([b"20200101", b"20200113", b"20200125"])
+        h_file["bperp"] = np.array([0., 12.5, -3.])
+    ifg_network_file = str(tmp_path / "ifg_network.h5")
+    with h5.File(ifg_network_file, "w") as h_file:
+        h_file.attrs["num_images"] = 3
+        h_file.attrs["num_ifgs"] = 2
+        h_file["ifg_list"] = np.array([[0, 1], [1, 2]])
+        h_file["pbase_ifg"] = np.array([12.5, -15.5])
+        h_file["tbase_ifg"] = np.array([12., 12.]) / 365.25
+        h_file["dates"] = np.array([b"2020-01-01", b"2020-01-13", b"2020-01-25"])
+    return slc_stack_file, ifg_network_file
+
+
+def testSnapshotHoldsTheIfgNetwork(tmp_path, dataset):
+    slc_stack_file, ifg_network_file = dataset
+    cache_file = str(tmp_path / "metadata.json")
+    collected = loadMetadata(cache_file, H5FilePool(), slc_stack_file, ifg_network_file=ifg_network_file)
+    loaded = loadMetadata(cache_file, H5FilePool(), slc_stack_file, ifg_network_file=ifg_network_file)
+    for metadata in (collected, loaded):
+        assert metadata.ifg_network["num_ifgs"] == 2
+        assert metadata.ifg_network["ifg_list"] == [[0, 1], [1, 2]]
+        np.testing.assert_allclose(metadata.ifg_network["pbase_ifg"], [12.5, -15.5])
+        assert metadata.ifg_network_dates == ["2020-01-01", "2020-01-13", "2020-01-25"]
+        np.testing.assert_allclose(metadata.slcTbase([0, 2]), [0., 24 / 365.25])
+
+
+def testSnapshotWithoutIfgNetwork(dataset):
+    metadata = loadMetadata(None, H5FilePool(), dataset[0])
+    assert metadata.ifg_network is None
+    assert metadata.ifg_network_dates is None
@@ -0,0 +1,38 @@
+import numpy as np
+from src.coherence_search import TemporalCoherenceEngine
+from src.periodogram import nufftGrid, periodogramSearch
+
+
+def _simulatedArc(num_ifgs=120, seed=2):
+    rng = np.random.default_rng(seed)
+    design_matrix = np.zeros((num_ifgs, 2))
+    design_matrix[:, 0] = -4 * np.pi / 0.0555 * rng.uniform(-200, 200, num_ifgs) / (850e3 * np.sin(0.6))
+    design_matrix[:, 1] = -4 * np.pi / 0.0555 * rng.uniform(-5, 5, num_ifgs)
+    ifg_phase = np.angle(np.exp(1j * (design_matrix @ [-41., -0.012] + rng.normal(0, 0.5, num_ifgs))))
+    return design_matrix, ifg_phase
+
+
+def testNufftGridMatchesTheDirectSum():
+    rng = np.random.default_rng(3)
+    weights = np.exp(1j * rng.uniform(-np.pi, np.pi, 50))
+    freq_x, freq_y = rng.uniform(-3, 3, 50), rng.uniform(-40, 40, 50)
+    x = 1.5 + 0.2 * np.arange(17)
+    y = -0.1 + 0.01 * np.arange(23)
+    expected = np.exp(-1j * (freq_y[np.newaxis, np.newaxis, :] * y[:, np.newaxis, np.newaxis] +
+                             freq_x[np.newaxis, np.newaxis, :] * x[np.newaxis, :, np.newaxis])) @ weights
+    grid = nufftGrid(weights, freq_x, freq_y, x[0], 0.2, x.size, y[0], 0.01, y.size)
+    np.testing.assert_allclose(grid, expected, atol=1e-4 * weights.size)
+
+
+def testPeriodogramMatchesTheGammaGrid():
+    design_matrix, ifg_phase = _simulatedArc()
+    demerr_range, vel_range = np.linspace(-150, 150, 256), np.linspace(-0.05, 0.05, 256)
+    engine = TemporalCoherenceEngine()
+    engine.configure(design_matrix, demerr_range, vel_range)
+    exact = engine.gammaGrid(ifg_phase)
+    demerr, vel, gamma, gamma_grid = periodogramSearch(design_matrix, ifg_phase, demerr_range, vel_range)
+    assert gamma_grid.shape == exact.shape
+    assert np.max(np.abs(gamma_grid - exact)) < 1e-4
+    idx_vel, idx_demerr = np.unravel_index(np.argmax(exact), exact.shape)
+    assert (demerr, vel) == (demerr_range[idx_demerr], vel_range[idx_vel])
+    assert abs(gamma - exact[idx_vel, idx_demerr]) < 1e-4
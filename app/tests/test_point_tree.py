@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from src import point_tree
+from src.point_tree import PointTree
+
+
+@pytest.fixture
+def coord():
+    return np.random.default_rng(0).uniform(0, 500, size=(2000, 2))
+
+
+def _linearNearest(coord, x, y):
+    return int(np.argmin(np.hypot(coord[:, 0] - x, coord[:, 1] - y)))
+
+
+def testNearestAndPersistedTree(tmp_path, coord):
+    tree_file = str(tmp_path / "p2_tree.pkl")
+    tree = PointTree(coord, "p2.h5", tree_file=tree_file)
+    tree.wait()
+    for x, y in [(0, 0), (250.3, 120.7), (499, 499)]:
+        assert tree.nearest(x, y) == _linearNearest(coord, x, y)
+    loaded = PointTree(coord, "p2.h5", tree_file=tree_file)
+    assert loaded.wait() is not None
+    assert loaded.nearest(250.3, 120.7) == _linearNearest(coord, 250.3, 120.7)
+
+
+def testPersistedTreeOfOtherCoordinatesIsRebuilt(tmp_path, coord, monkeypatch):
+    tree_file = str(tmp_path / "p2_tree.pkl")
+    PointTree(coord, "p2.h5", tree_file=tree_file).wait()
+    other = coord[::-1].copy()
+
+    def _noUnpickle(f):
+        raise AssertionError("the outdated tree must not be unpickled")
+
+    monkeypatch.setattr(point_tree.pickle, "load", _noUnpickle)
+    tree = PointTree(other, "p2.h5", tree_file=tree_file)
+    tree.wait()
+    assert tree.error is None
+    assert tree.nearest(10, 10) == _linearNearest(other, 10, 10)
+
+
+def testUnreadableTreeFileIsRebuilt(tmp_path, coord):
+    tree_file = tmp_path / "p2_tree.pkl"
+    tree_file.write_bytes(b"\x80\x05not a tree")
+    tree = PointTree(coord, "p2.h5", tree_file=str(tree_file))
+    tree.wait()
+    assert tree.error is None
+    assert tree.nearest(10, 10) == _linearNearest(coord, 10, 10)
+
+
+def testFailedBuildFallsBackToLinearSearch(coord, monkeypatch):
+    def _failingTree(data):
+        raise MemoryError("no memory for the tree")
+
+    monkeypatch.setattr(point_tree, "KDTree", _failingTree)
+    tree = PointTree(coord, "p2.h5")
+    tree.wait()
+    assert isinstance(tree.error, MemoryError)
+    assert tree.nearest(250.3, 120.7) == _linearNearest(coord, 250.3, 120.7)
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("sarvey")
+from src import roi_unwrapping  # noqa: E402
+from src.roi_unwrapping import temporalUnwrapRoi, roiMask  # noqa: E402
+from src.unwraping_temporal import TemporalUnwrapping  # noqa: E402
+
+VERTICES = np.array([(3.2, 4.6), (20, 2), (27, 19), (6, 21)])
+
+
+def _assertSameAsPixels(data, tu, result, reference):
+    y0, y1, x0, x1 = result["bbox"]
+    _, mask = roiMask(VERTICES, (data.n_lines, data.n_pixels))
+    assert np.isnan(result["velocity"][~mask]).all()
+    for az, ra in list(zip(*np.nonzero(mask)))[::7]:
+        tu.temporal_uw(ra + x0, az + y0, *reference)
+        assert result["demerr"][az, ra] == np.float32(tu.dem_error)
+        assert result["velocity"][az, ra] == np.float32(tu.velocity)
+        assert result["coherence"][az, ra] == pytest.approx(tu.temporal_coherence, abs=1e-6)
+
+
+@pytest.mark.parametrize("search_mode", ["grid", "coarse_to_fine", "periodogram"])
+@pytest.mark.parametrize("reference_type, reference", [("arc", (None, None)), ("arc", (15, 12)),
+                                                       ("window", (None, None))])
+def testRegionMatchesSinglePixels(simulated_data, search_mode, reference_type, reference):
+    tu = TemporalUnwrapping(simulated_data)
+    tu.parms.search_mode = search_mode
+    tu.parms.reference_type = reference_type
+    tu.parms.periodogram_num_samples = 128
+    result = temporalUnwrapRoi(simulated_data, tu.parms, VERTICES, reference=reference, num_workers=1)
+    _assertSameAsPixels(simulated_data, tu, result, reference)
+
+
+def testGridSearchInBatches(simulated_data, monkeypatch):
+    tu = TemporalUnwrapping(simulated_data)
+    whole = temporalUnwrapRoi(simulated_data, tu.parms, VERTICES, reference=(15, 12), num_workers=1)
+    # a few pixels per batch
+    monkeypatch.setattr(roi_unwrapping, "ROI_SEARCH_BATCH_NBYTES", 3 * 48 * tu.parms.demerr_num_samples * 8)
+    batched = temporalUnwrapRoi(simulated_data, tu.parms, VERTICES, reference=(15, 12), num_workers=1)
+    for name in ("velocity", "demerr", "coherence"):
+        np.testing.assert_array_equal(batched[name], whole[name])
+
+
+def testRegionRemovesTheSeasonalSignalLikeSinglePixels(simulated_data):
+    tu = TemporalUnwrapping(simulated_data)
+    tu.parms.remove_seasonal_before_temp_uw = True
+    tu.parms.remove_seasonal_after_temp_uw = True
+    result = temporalUnwrapRoi(simulated_data, tu.parms, VERTICES, reference=(15, 12), num_workers=1)
+    _assertSameAsPixels(simulated_data, tu, result, (15, 12))
+
+
+def testRegionInWorkerProcesses(simulated_data):
+    tu = TemporalUnwrapping(simulated_data)
+    serial = temporalUnwrapRoi(simulated_data, tu.parms, VERTICES, reference=(15, 12), num_workers=1)
+    parallel = temporalUnwrapRoi(simulated_data, tu.parms, VERTICES, reference=(15, 12), num_workers=2)
+    for name in ("velocity", "demerr", "coherence"):
+        np.testing.assert_array_equal(parallel[name], serial[name])
+
+
+def testCancelledRegion(simulated_data):
+    tu = TemporalUnwrapping(simulated_data)
+    calls = []
+    for num_workers in (1, 2):
+        result = temporalUnwrapRoi(simulated_data, tu.parms, VERTICES, num_workers=num_workers,
+                                   progress=lambda num_done, num_total: calls.append(num_done) or False)
+        assert result is None
+    assert len(calls) == 2
@@ -0,0 +1,98 @@
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+unwrapping = pytest.importorskip("sarvey.unwrapping")
+from src.unwraping_temporal import TemporalUnwrapping  # noqa: E402
+
+
+@pytest.fixture
+def tu():
+    rng = np.random.default_rng(4)
+    num_ifgs = 90
+    tu = TemporalUnwrapping(SimpleNamespace(wavelength=0.0555))
+    tu.pbase_ifg = rng.uniform(-150, 150, num_ifgs)
+    tu.tbase_ifg = rng.uniform(-2, 2, num_ifgs)
+    tu.geometry_factor = np.float32(850e3 * np.sin(0.6))
+    return tu
+
+
+def _ifgPhase(tu, demerr, vel, noise=0.2, seed=5):
+    design_matrix = tu.temporalUnwrappingDesignMatrix().astype(np.float64)
+    rng = np.random.default_rng(seed)
+    return np.angle(np.exp(1j * (design_matrix @ [demerr, vel] + rng.normal(0, noise, design_matrix.shape[0]))))
+
+
+def testGridModeIsTheSarveyEstimate(tu):
+    ifg_phase = _ifgPhase(tu, 17.2, -0.013)
+    search = tu._searchStage(ifg_phase)
+    expected = unwrapping.oneDimSearchTemporalCoherence(demerr_range=search["dem_error_range"],
+                                                        vel_range=search["velocity_range"], obs_phase=ifg_phase,
+                                                        design_mat=search["design_matrix"])
+    assert (search["dem_error"], search["velocity"]) == tuple(expected[:2])
+    assert search["gamma_grid"].shape == (tu.parms.velocity_num_samples, tu.parms.demerr_num_samples)
+
+
+@pytest.mark.parametrize("tbase_scale, seed", [(1, 5), (1, 6), (0.05, 7), (0.05, 8)])
+def testEngineOneDimSearchIsTheSarveyEstimate(tu, tbase_scale, seed):
+    # short temporal baselines make the DEM error peak the stronger one, so both search orders are covered
+    tu.tbase_ifg = tu.tbase_ifg * tbase_scale
+    ifg_phase = _ifgPhase(tu, 17.2, -0.013, noise=0.6, seed=seed)
+    design_matrix = tu.temporalUnwrappingDesignMatrix()
+    demerr_range = np.linspace(tu.parms.demerr_bound_min, tu.parms.demerr_bound_max, tu.parms.demerr_num_samples)
+    vel_range = np.linspace(tu.parms.velocity_bound_min, tu.parms.velocity_bound_max,
+                            tu.parms.velocity_num_samples)
+    tu.coherence_engine.configure(design_matrix, demerr_range, vel_range)
+    demerr, vel, gamma = tu.coherence_engine.oneDimSearch(ifg_phase)
+    expected = unwrapping.oneDimSearchTemporalCoherence(demerr_range=demerr_range, vel_range=vel_range,
+                                                        obs_phase=ifg_phase, design_mat=design_matrix)
+    assert (demerr, vel) == tuple(expected[:2])
+    assert gamma == pytest.approx(expected[2], abs=1e-5)
+
+
+@pytest.mark.parametrize("search_mode", ["coarse_to_fine", "periodogram"])
+def testSearchModesAgreeWithTheSarveyEstimate(tu, search_mode):
+    ifg_phase = _ifgPhase(tu, 17.2, -0.013)
+    grid = tu._searchStage(ifg_phase)
+    step_demerr, step_vel = grid["search_resolution"]
+    tu.parms.search_mode = search_mode
+    search = tu._searchStage(ifg_phase)
+    assert abs(search["dem_error"] - grid["dem_error"]) <= 1.5 * step_demerr
+    assert abs(search["velocity"] - grid["velocity"]) <= 1.5 * step_vel
+
+
+def testResultsAreCachedByTheNetworkParameters(simulated_data):
+    simulated_data.network_type = "sbas"
+    simulated_data.ifg_dynamic_network = SimpleNamespace(parameterKey=lambda: ("sbas", 3))
+    tu = TemporalUnwrapping(simulated_data)
+    tu.temporal_uw(10, 12, 15, 12)
+    velocity = tu.velocity
+    # the same network parameters, e.g. constructed again, restore the result
+    simulated_data.ifg_dynamic_network = SimpleNamespace(parameterKey=lambda: ("sbas", 3))
+    tu.temporal_uw(10, 12, 15, 12)
+    assert tu.velocity == velocity
+    assert tu.resultCacheStats()["hits"] == 1
+    assert tu.stage_runs["read"] == 1
+    simulated_data.ifg_dynamic_network = SimpleNamespace(parameterKey=lambda: ("sbas", 4))
+    tu.temporal_uw(10, 12, 15, 12)
+    assert tu.resultCacheStats()["misses"] == 2
+    assert tu.stage_runs["read"] == 2
+
+
+def testParameterChangesRerunOnlyTheLaterStages(simulated_data):
+    tu = TemporalUnwrapping(simulated_data)
+    tu.temporal_uw(10, 12, 15, 12)
+    assert set(tu.stage_runs.values()) == {1}
+
+    def rerunStages(name, value):
+        runs = dict(tu.stage_runs)
+        setattr(tu.parms, name, value)
+        tu.temporal_uw(10, 12, 15, 12)
+        return [stage for stage in runs if tu.stage_runs[stage] > runs[stage]]
+
+    assert rerunStages("velocity_num_samples", 120) == ["search", "residuals"]
+    assert rerunStages("remove_seasonal_after_temp_uw", True) == ["residuals"]
+    assert rerunStages("remove_seasonal_before_temp_uw", True) == ["seasonal", "search", "residuals"]
+    assert rerunStages("reference_type", "window") == list(tu.stage_runs)
+    # a pixel unwrapped before with the same parameters is restored from the result cache
+    assert rerunStages("reference_type", "arc") == []
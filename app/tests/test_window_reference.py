@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from src.window_reference import WindowReferenceCache, WINDOW_TILE_MARGIN
+
+
+@pytest.fixture
+def ifg_cpx():
+    rng = np.random.default_rng(0)
+    amplitude = rng.uniform(0.5, 2, size=(70, 90, 40))
+    return (amplitude * np.exp(1j * rng.uniform(-np.pi, np.pi, size=amplitude.shape))).astype(np.complex64)
+
+
+def _directWindow(ifg_cpx, az, ra, wds_az, wds_ra):
+    y0, y1 = max(az - wds_az // 2, 0), min(az + wds_az // 2 + 1, ifg_cpx.shape[0])
+    x0, x1 = max(ra - wds_ra // 2, 0), min(ra + wds_ra // 2 + 1, ifg_cpx.shape[1])
+    window = ifg_cpx[y0:y1, x0:x1].astype(np.complex128)
+    centre = ifg_cpx[az, ra]
+    return centre, (window.sum(axis=(0, 1)) - centre) / (window.shape[0] * window.shape[1] - 1)
+
+
+def testTablesMatchDirectWindows(ifg_cpx):
+    reads = []
+
+    def readMethod(ra, az, ra2, az2):
+        reads.append((az2 - az) * (ra2 - ra))
+        return ifg_cpx[az:az2, ra:ra2]
+
+    cache = WindowReferenceCache()
+    network = object()
+    for az, ra in [(0, 0), (35, 44), (69, 89), (33, 40), (12, 80)]:
+        centre, window_mean = cache.read(readMethod, network, ("ifg_stack",), az, ra, 7, 7, ifg_cpx.shape[:2],
+                                         num_ifgs=ifg_cpx.shape[2])
+        expected_centre, expected_mean = _directWindow(ifg_cpx, az, ra, 7, 7)
+        np.testing.assert_allclose(centre, expected_centre, atol=1e-4)
+        np.testing.assert_allclose(window_mean, expected_mean, atol=1e-4)
+    assert all(sat.dtype == np.complex64 for _, sat, _, _ in (value for value, _ in cache.tables.entries.values()))
+    # (35, 44) and (33, 40) share a tile
+    assert len(reads) == 4
+
+
+def testTileSizeShrinksWithTheNumberOfIfgs():
+    cache = WindowReferenceCache(table_nbytes=4 * 1024 ** 2)
+    assert cache.tileSize(40) == 32
+    assert 4 <= cache.tileSize(1000) < 32
+    side = cache.tileSize(1000) + 2 * WINDOW_TILE_MARGIN + 1
+    assert side ** 2 * 1000 * 8 <= 4 * 1024 ** 2
+    assert cache.tileSize(20000) is None
+
+
+def testManyIfgsAreReadDirectly(ifg_cpx):
+    reads = []
+
+    def readMethod(ra, az, ra2, az2):
+        reads.append((az2 - az, ra2 - ra))
+        return ifg_cpx[az:az2, ra:ra2]
+
+    cache = WindowReferenceCache(table_nbytes=1024)
+    centre, window_mean = cache.read(readMethod, object(), ("ifg_stack",), 35, 44, 7, 7, ifg_cpx.shape[:2],
+                                     num_ifgs=ifg_cpx.shape[2])
+    assert reads == [(7, 7)]
+    np.testing.assert_allclose(window_mean, _directWindow(ifg_cpx, 35, 44, 7, 7)[1], atol=1e-6)
+    assert len(cache.tables) == 0